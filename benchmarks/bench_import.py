@@ -0,0 +1,63 @@
+"""Cold import time of kirei and which heavy UI packages it pulls in.
+
+Runs `python -X importtime` in a fresh interpreter that imports kirei and
+constructs both applications, then fails if gradio / typer / inquirer /
+prompt_toolkit / rich got imported or the import took longer than the budget.
+
+usage: python -m benchmarks.bench_import [budget_ms]
+"""
+
+import re
+import subprocess
+import sys
+from typing import Dict, List
+
+_FORBIDDEN = ("gradio", "typer", "inquirer", "prompt_toolkit", "rich")
+
+_PROGRAM = "import kirei; kirei.CliApplication(); kirei.WebApplication()"
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+
+def _import_times() -> Dict[str, int]:
+    # 返回每个模块的累计导入耗时（微秒）
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROGRAM],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times: Dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            times[match.group(4)] = int(match.group(2))
+    return times
+
+
+def main():
+    budget_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    times = _import_times()
+    total_ms = times["kirei"] / 1000
+    print(f"import kirei: {total_ms:.1f} ms (budget {budget_ms:.0f} ms)")
+    top = sorted(
+        ((name, us) for name, us in times.items() if "." not in name),
+        key=lambda item: item[1],
+        reverse=True,
+    )[:10]
+    for name, us in top:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    errors: List[str] = []
+    leaked = [name for name in _FORBIDDEN if name in times]
+    if leaked:
+        errors.append(f"heavy packages imported eagerly: {', '.join(leaked)}")
+    if total_ms > budget_ms:
+        errors.append(f"import took {total_ms:.1f} ms, over budget")
+    for error in errors:
+        print(f"FAIL: {error}", file=sys.stderr)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Per-session overhead of a registered task.
+
+usage: python -m benchmarks.bench_session [rounds]
+"""
+
+import sys
+import timeit
+from decimal import Decimal
+
+from kirei.types import FuncParser
+from kirei.types.function import ContextInjectorCollection, MetricsRegistry
+
+
+def add(a: int, b: int, c: Decimal, d: str) -> Decimal:
+    return a + b + c
+
+
+_ARGS = ("1", "2", "3.5", "x")
+
+
+def _run_session(parsed_func):
+    with parsed_func.enter_session() as session:
+        for param, arg in zip(session.meta_data.non_injected_params, _ARGS):
+            param.fill(arg)
+        return session()
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    parser = FuncParser(ContextInjectorCollection())
+    for label, metrics in [("metrics off", None), ("metrics on", MetricsRegistry())]:
+        parsed_func = parser.parse(add, metrics=metrics)
+        _run_session(parsed_func)
+        elapsed = min(
+            timeit.repeat(lambda: _run_session(parsed_func), number=rounds, repeat=5)
+        )
+        print(
+            f"{label}: {elapsed / rounds * 1e6:.2f} us/session "
+            f"({rounds} sessions x 5 repeats)"
+        )
+
+
+if __name__ == "__main__":
+    main()
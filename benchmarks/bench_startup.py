@@ -0,0 +1,95 @@
+"""Startup time of applications with many registered tasks.
+
+Registers the same synthetic tasks with CliApplication and WebApplication,
+then builds the web ASGI app (gradio page and JSON API) with lazy and eager
+tabs. Both frontends sharing one TaskRegistry parse each task only once. gradio is imported before timing so only kirei's own work is measured.
+
+usage: python -m benchmarks.bench_startup [tasks]
+"""
+
+import sys
+import tempfile
+import time
+from decimal import Decimal
+from typing import Callable, List, Optional
+
+from kirei import (
+    CliApplication,
+    TaskRegistry,
+    TempDirPath,
+    WebApplication,
+    WebApplicationConfig,
+)
+from kirei.types import FuncParser
+from kirei.types.function import get_default_context_collection
+
+
+def _make_task(i: int) -> Callable:
+    def task(a: int, b: str, c: Decimal, tmp: TempDirPath) -> str:
+        return f"{a}{b}{c}"
+
+    task.__name__ = f"task_{i}"
+    return task
+
+
+def _timed(label: str, func: Callable[[], object]):
+    start = time.perf_counter()
+    func()
+    print(f"{label}: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+def _register_web(
+    tasks: List[Callable], lazy_tabs: bool, registry: Optional[TaskRegistry] = None
+) -> WebApplication:
+    app = WebApplication(
+        config=WebApplicationConfig(
+            artifact_dir=tempfile.mkdtemp(), lazy_tabs=lazy_tabs
+        ),
+        registry=registry,
+    )
+    for task in tasks:
+        app.register()(task)
+    return app
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    tasks = [_make_task(i) for i in range(count)]
+    print(f"{count} tasks")
+
+    def _register_cli():
+        app = CliApplication()
+        for task in tasks:
+            app.register()(task)
+
+    _timed("cli register", _register_cli)
+    _timed("web register", lambda: _register_web(tasks, True))
+    # 注册时不解析，第一次使用时才解析函数签名、创建 validator
+    parser = FuncParser(get_default_context_collection())
+    parsed_funcs = [parser.parse(task) for task in tasks]
+    _timed(
+        "parse + metadata (first use)",
+        lambda: [parsed_func.get_metadata() for parsed_func in parsed_funcs],
+    )
+
+    def _shared_registry():
+        registry = TaskRegistry()
+        cli = CliApplication(registry=registry)
+        for task in tasks:
+            cli.register()(task)
+        web = _register_web(tasks, True, registry)
+        for parsed_func in cli._name_task_mapping.values():
+            parsed_func.get_metadata()
+        for web_task in web._tasks:
+            web_task.parsed_func.get_metadata()
+
+    _timed("cli + web, shared registry, metadata of both", _shared_registry)
+
+    import gradio  # noqa: F401
+
+    _timed("web asgi (lazy tabs)", lambda: _register_web(tasks, True).asgi())
+    _timed("web asgi (eager tabs)", lambda: _register_web(tasks, False).asgi())
+
+
+if __name__ == "__main__":
+    main()
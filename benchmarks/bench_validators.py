@@ -0,0 +1,64 @@
+"""Validations per second of python chain, compiled (pydantic-core) and bulk
+column validators.
+
+usage: python -m benchmarks.bench_validators [rounds]
+"""
+
+import sys
+import tempfile
+import timeit
+from decimal import Decimal
+from pathlib import Path
+
+from typing_extensions import Annotated
+
+import kirei as kr
+from kirei.types.annotated import get_default_validator_provider
+from kirei.types.basic_types import StringConstraints
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    with tempfile.NamedTemporaryFile() as f:
+        cases = [
+            ("int", int, "12345"),
+            ("Decimal", Decimal, "3.1415"),
+            ("str", str, "hello"),
+            (
+                "str max_length",
+                Annotated[str, StringConstraints(max_length=8)],
+                "hello",
+            ),
+            ("Path", Path, "/tmp/a.txt"),
+            ("UserInputFilePath", kr.UserInputFilePath, f.name),
+        ]
+        providers = [
+            ("chain", get_default_validator_provider(compiled=False)),
+            ("compiled", get_default_validator_provider()),
+        ]
+        bulk_provider = providers[1][1]
+        print(
+            f"{'type':<20}"
+            + "".join(f"{name:>14}" for name, _ in providers)
+            + f"{'bulk':>14}"
+        )
+        for name, tp, value in cases:
+            row = f"{name:<20}"
+            for _, provider in providers:
+                validator = provider.get_validator(tp)
+                validator(value)
+                elapsed = min(
+                    timeit.repeat(lambda: validator(value), number=rounds, repeat=5)
+                )
+                row += f"{rounds / elapsed / 1e6:>10.2f} M/s"
+            bulk_validator = bulk_provider.get_bulk_validator(tp)
+            column = [value] * rounds
+            elapsed = min(
+                timeit.repeat(lambda: bulk_validator(column), number=1, repeat=5)
+            )
+            row += f"{rounds / elapsed / 1e6:>10.2f} M/s"
+            print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Runs many overlapping task sessions on one shared injector collection.
+
+usage: python -m benchmarks.stress_sessions [sessions]
+"""
+
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+import kirei as kr
+from kirei.types import FuncParser
+from kirei.types.function import get_default_context_collection
+
+_collection = get_default_context_collection()
+
+
+def touch(tmp: kr.TempDirPath, n: int) -> kr.OutputFilePath:
+    marker = tmp / "marker"
+    assert not marker.exists(), "temp dir shared between sessions"
+    marker.write_text(str(n))
+    return tmp
+
+
+_parsed_func = FuncParser(_collection).parse(touch)
+
+
+def _run_session(n: int) -> Path:
+    with _parsed_func.enter_session() as session:
+        session.meta_data.non_injected_params[0].fill(str(n))
+        return session()
+
+
+async def _run_nested_session(n: int) -> Path:
+    # 同一个 collection 在多个 asyncio task 中同时作为 context manager 使用
+    with _collection:
+        await asyncio.sleep(0)
+        return _run_session(n)
+
+
+def _check_failed_enter_exits_entered_contexts():
+    exited = []
+
+    @contextmanager
+    def ok_injector():
+        try:
+            yield lambda annotation: NotImplemented
+        finally:
+            exited.append("ok")
+
+    @contextmanager
+    def broken_injector():
+        raise RuntimeError("broken injector")
+        yield
+
+    collection = (
+        get_default_context_collection()
+        .register_context_injector(ok_injector, int)
+        .register_context_injector(broken_injector, str)
+    )
+    try:
+        with collection:
+            raise AssertionError("unreachable")
+    except RuntimeError:
+        pass
+    assert exited == ["ok"], exited
+
+
+def main():
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    with ThreadPoolExecutor(max_workers=64) as pool:
+        thread_dirs = list(pool.map(_run_session, range(sessions)))
+
+    async def _gather():
+        return await asyncio.gather(*[_run_nested_session(n) for n in range(sessions)])
+
+    async_dirs = asyncio.run(_gather())
+    dirs = thread_dirs + async_dirs
+    assert len(set(dirs)) == len(dirs), "temp dir shared between sessions"
+    assert not any(d.exists() for d in dirs), "temp dir leaked"
+    _check_failed_enter_exits_entered_contexts()
+    print(f"{len(dirs)} sessions ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,12 @@
+import asyncio
 import logging
 import time
 import kirei as kr
 
-app = kr.CliApplication()
-web_app = kr.WebApplication()
+# 两个前端共用同一个 registry，每个任务只解析一次，统计也合并在一起
+registry = kr.TaskRegistry()
+app = kr.CliApplication(registry=registry)
+web_app = kr.WebApplication(registry=registry)
 
 logging.basicConfig(level=logging.DEBUG)
 
@@ -20,9 +23,24 @@ def add(a: int, b: int):
     return a + b
 
 
+@web_app.register(job=kr.JobConfig(max_concurrency=1))
 @app.register()
-def long_time_operation():
-    time.sleep(5)
+def long_time_operation(progress: kr.JobProgress):
+    for i in range(5):
+        time.sleep(1)
+        progress.update((i + 1) / 5, f"step {i + 1}")
+
+
+@web_app.register()
+@app.register()
+async def async_echo(msg):
+    await asyncio.sleep(1)
+    return msg
+
+
+@web_app.register(batch=kr.BatchConfig(max_batch_size=8, max_wait=0.05))
+def batch_square(xs: list[int]) -> list[int]:
+    return [x * x for x in xs]
 
 
 @app.register()
@@ -36,7 +54,7 @@ def file_test(f: kr.UserInputFilePath):
     print(f)
 
 
-@web_app.register()
+@web_app.register(executor="process")
 @app.register()
 def csv_to_xlsx(f: kr.UserInputFilePath) -> kr.OutputFilePath:
     return f
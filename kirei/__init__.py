@@ -2,9 +2,28 @@ from kirei._app.cli import CliApplication as CliApplication
 from kirei._app.web import (
     WebApplication as WebApplication,
     WebApplicationConfig as WebApplicationConfig,
+    BatchConfig as BatchConfig,
+    JobConfig as JobConfig,
+    AdmissionConfig as AdmissionConfig,
 )
 from kirei.types import (
     UserInputFilePath as UserInputFilePath,
     OutputFilePath as OutputFilePath,
     TempDirPath as TempDirPath,
+    UserInputFileBuffer as UserInputFileBuffer,
+    UserInputFileChunks as UserInputFileChunks,
+    UserInputFileLines as UserInputFileLines,
+    OutputFileBytes as OutputFileBytes,
+    FileContent as FileContent,
+)
+from kirei.types.function import (
+    MemoryResultCache as MemoryResultCache,
+    DiskResultCache as DiskResultCache,
+    MetricsRegistry as MetricsRegistry,
+    ProfileConfig as ProfileConfig,
+    JobProgress as JobProgress,
+    CancellationToken as CancellationToken,
+    TaskCancelledError as TaskCancelledError,
+    TaskTimeoutError as TaskTimeoutError,
+    TaskRegistry as TaskRegistry,
 )
@@ -0,0 +1,50 @@
+import gettext
+from typing import Any, Dict, List, Sequence, Union, cast
+
+from kirei.types import ParsedFunc
+
+_ = gettext.gettext
+
+# 一行参数：按参数名的对象或按顺序的数组
+Row = Union[Dict[str, Any], list]
+
+
+def _extract(row: Row, names: List[str]) -> List[Any]:
+    if isinstance(row, list):
+        if len(row) != len(names):
+            raise ValueError(
+                _("需要 {} 个参数，实际为 {} 个").format(len(names), len(row))
+            )
+        return list(row)
+    missing = [name for name in names if name not in row]
+    if missing:
+        raise ValueError(_("缺少参数 {}").format(", ".join(missing)))
+    return [row[name] for name in names]
+
+
+def validate_rows(
+    parsed_func: ParsedFunc,
+    names: List[str],
+    rows: Sequence[Union[Row, Exception]],
+) -> List[Union[List[Any], Exception]]:
+    # 一批行按列整体校验，比逐行逐个参数校验快得多；某一列校验失败的行记为该行的错误
+    # 命令行的 batch 模式和 web 的 batch 接口共用
+    prepared: List[Union[List[Any], Exception]] = []
+    for row in rows:
+        if isinstance(row, Exception):
+            prepared.append(row)
+            continue
+        try:
+            prepared.append(_extract(row, names))
+        except ValueError as err:
+            prepared.append(err)
+    valid = [i for i, row in enumerate(prepared) if not isinstance(row, Exception)]
+    values = [cast(List[Any], prepared[i]) for i in valid]
+    results = [
+        parsed_func.bulk_validate(name, [row[col] for row in values])
+        for col, name in enumerate(names)
+    ]
+    for k, i in enumerate(valid):
+        err = next((res.errors[k] for res in results if res.errors[k]), None)
+        prepared[i] = err or [res.values[k] for res in results]
+    return prepared
@@ -0,0 +1,91 @@
+import gettext
+from pathlib import Path
+from typing import Any, Callable, Sequence, Union
+
+from kirei.types.function import ArtifactStore
+from kirei.types.function._artifact import link_or_copy
+from kirei.types.function._cache import is_output_file
+from kirei.types.function._file_content import (
+    content_filename,
+    get_file_content,
+    is_file_content_value,
+    write_content,
+)
+from kirei.types.function._func_parser import FuncParam
+from kirei.types.function._param_annotation import ParamAnnotation
+
+_ = gettext.gettext
+
+
+class InvalidParamError(ValueError):
+    def __init__(self, name: str, err: Exception):
+        super().__init__(_("参数 {} 校验失败: {}").format(name, err))
+        self.name = name
+
+
+def fill_params(
+    params: Sequence[FuncParam], values: Sequence[Any], *, validated: bool = False
+):
+    # 按顺序填入用户输入的参数；validated 时值已经由 ParsedFunc.bulk_validate 校验过
+    for param, value in zip(params, values):
+        if validated:
+            param.fill_validated(value)
+            continue
+        try:
+            param.fill(value)
+        except Exception as err:
+            raise InvalidParamError(param.name, err) from err
+
+
+def returns_file(annotation: ParamAnnotation) -> bool:
+    return is_output_file(annotation) or get_file_content(annotation) is not None
+
+
+def is_file_output(annotation: ParamAnnotation, res: Any) -> bool:
+    content = get_file_content(annotation)
+    if content is not None and is_file_content_value(res):
+        return True
+    return isinstance(res, Path) and is_output_file(annotation)
+
+
+def keep_output(
+    annotation: ParamAnnotation,
+    res: Any,
+    target: Union[ArtifactStore, Path],
+    prefix: str = "",
+) -> Any:
+    # 输出文件位于 session 的临时目录中，session 结束前保存到 artifact store 或目录中；
+    # 已经在 store 中的文件不再保存，内存中的文件内容直接写出
+    if not is_file_output(annotation, res):
+        return res
+    content = get_file_content(annotation)
+    if not isinstance(res, Path):
+        assert content is not None
+        if isinstance(target, ArtifactStore):
+            return target.put_content(res, content_filename(content)).path
+        return _save(target, prefix, content_filename(content), res, write_content)
+    if isinstance(target, ArtifactStore):
+        return res if res.parent.parent == target.root else target.put(res).path
+    # 输出可能就是用户输入的文件，不用硬链接，保存的文件和它互不影响
+    return _save(
+        target,
+        prefix,
+        res.name,
+        res,
+        lambda src, dst: link_or_copy(src, dst, hardlink=False),
+    )
+
+
+def _save(
+    target_dir: Path,
+    prefix: str,
+    filename: str,
+    res: Any,
+    write: Callable[[Any, Path], None],
+) -> Path:
+    target_dir.mkdir(parents=True, exist_ok=True)
+    target = target_dir / (f"{prefix}-{filename}" if prefix else filename)
+    # 之前运行留下的同名文件可能是别的文件的硬链接，先删除再写入，不修改它的内容
+    target.unlink(missing_ok=True)
+    write(res, target)
+    return target
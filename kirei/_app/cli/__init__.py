@@ -0,0 +1,204 @@
+from __future__ import annotations
+import asyncio
+from contextlib import contextmanager
+import gettext
+import inspect
+import logging
+from pathlib import Path
+import sys
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Iterator,
+    Optional,
+    Type,
+    TypeVar,
+    Union,
+)
+
+from kirei.types import Task_T, Application
+from kirei.types import ParsedFunc
+from kirei._app.cli._batch import BatchSummary as BatchSummary, run_batch
+from kirei.types.function import (
+    ContextManagerCreator,
+    ExecutorType,
+    InjectorLifetime,
+    InjectorMatcher,
+    MetricsRegistry,
+    ProfileConfig,
+    ResultCache,
+    TaskRegistry,
+)
+from kirei.types.function._func_parser import TaskSession
+
+
+_ = gettext.gettext
+_T = TypeVar("_T")
+
+
+_logger = logging.getLogger(__name__)
+
+
+class CliApplication(Application):
+    # typer、inquirer、prompt_toolkit、rich 只在真正运行交互界面时才导入，见 _console
+    def __init__(
+        self,
+        title: Optional[str] = None,
+        *,
+        metrics: Optional[MetricsRegistry] = None,
+        registry: Optional[TaskRegistry] = None,
+    ):
+        # 和其他前端共用 registry 时，同一个函数只解析一次，缓存和统计也是共用的
+        if registry is not None and metrics is not None:
+            raise TypeError("metrics should be set on the shared registry")
+        self._registry = (
+            registry if registry is not None else TaskRegistry(metrics=metrics)
+        )
+        # 这个前端显示的任务
+        self._name_task_mapping: Dict[str, ParsedFunc] = {}
+        self._title = title
+        self._is_running = True
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def metrics(self) -> Optional[MetricsRegistry]:
+        return self._registry.metrics
+
+    @property
+    def registry(self) -> TaskRegistry:
+        return self._registry
+
+    def _exit(self):
+        self._is_running = False
+
+    def register_injector(
+        self,
+        tp: Type,
+        match: Optional[InjectorMatcher] = None,
+        *,
+        lifetime: InjectorLifetime = "session",
+        lazy: bool = True,
+    ) -> Callable[[ContextManagerCreator], ContextManagerCreator]:
+        return self._registry.register_injector(tp, match, lifetime=lifetime, lazy=lazy)
+
+    def register(
+        self,
+        override_task_name: Optional[str] = None,
+        *,
+        cache: Optional[ResultCache] = None,
+        dedupe: bool = False,
+        profile: Union[bool, ProfileConfig, None] = None,
+        timeout: Optional[float] = None,
+    ) -> Callable[[Task_T], Task_T]:
+        # profile 为 None 时由环境变量 KIREI_PROFILE 决定是否开启
+        # timeout 单位为秒，超时后任务失败；同步任务需要通过 CancellationToken 配合中断
+        def decorator(func: Task_T) -> Task_T:
+            task_name = override_task_name or func.__name__
+            if task_name in self._name_task_mapping:
+                raise TypeError(_(f"Multiple task can not have same name: {task_name}"))
+            self._name_task_mapping[task_name] = self._registry.add(
+                func,
+                override_task_name,
+                cache=cache,
+                dedupe=dedupe,
+                profile=profile,
+                timeout=timeout,
+            )
+            return func
+
+        return decorator
+
+    def _get_task(self, task: Union[str, Callable]) -> ParsedFunc:
+        if isinstance(task, str):
+            if task not in self._name_task_mapping:
+                raise ValueError(_("任务 {} 不存在").format(task))
+            return self._name_task_mapping[task]
+        for parsed_func in self._name_task_mapping.values():
+            if parsed_func.func is task:
+                return parsed_func
+        raise ValueError(_("任务 {} 没有注册").format(task))
+
+    def run_batch(
+        self,
+        task: Union[str, Callable],
+        input_path: Union[str, Path],
+        output_path: Union[None, str, Path] = None,
+        *,
+        jobs: int = 1,
+        executor: ExecutorType = "thread",
+    ) -> BatchSummary:
+        # 非交互地对 jsonl/csv 中的每一行执行任务，结果和错误逐行写入 jsonl（默认为标准输出）
+        # 任务输出的文件会被复制（文件系统支持时使用 reflink，不使用硬链接）到结果文件所在的目录；
+        # app 作用域的 injector 在这次 batch 结束时销毁，和执行 batch 的 event loop 一起
+        parsed_func = self._get_task(task)
+        input_path = Path(input_path)
+        self._registry.start()
+        try:
+            if output_path is None:
+                return run_batch(
+                    parsed_func, input_path, sys.stdout, jobs=jobs, executor=executor
+                )
+            output_path = Path(output_path)
+            with output_path.open("w", encoding="utf-8") as out:
+                return run_batch(
+                    parsed_func,
+                    input_path,
+                    out,
+                    jobs=jobs,
+                    executor=executor,
+                    artifact_dir=output_path.parent,
+                )
+        finally:
+            self._registry.close()
+
+    def _run(self, res: Union[_T, Awaitable[_T]]) -> _T:
+        # 异步任务、injector 和 replier 的每一步都交给 cli 自己管理的 event loop 执行，
+        # 参数询问等同步交互则留在 loop 之外，避免和 prompt_toolkit 自己的 loop 冲突
+        if not inspect.isawaitable(res):
+            return res
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        future = asyncio.ensure_future(res, loop=self._loop)
+        try:
+            return self._loop.run_until_complete(future)
+        except KeyboardInterrupt:
+            # Ctrl-C 时取消正在执行的协程，并等待它处理完取消（执行 finally 等）
+            future.cancel()
+            try:
+                self._loop.run_until_complete(future)
+            except BaseException:
+                pass
+            raise
+
+    def _close_loop(self):
+        if self._loop is None:
+            return
+        self._loop.run_until_complete(self._loop.shutdown_asyncgens())
+        self._loop.close()
+        self._loop = None
+
+    @contextmanager
+    def _enter_session(self, task: ParsedFunc) -> Iterator[TaskSession]:
+        if not task.is_async:
+            with task.enter_session() as session:
+                yield session
+            return
+        context = task.enter_async_session()
+        session = self._run(context.__aenter__())
+        try:
+            yield session
+        except BaseException as err:
+            if not self._run(context.__aexit__(type(err), err, err.__traceback__)):
+                raise
+        else:
+            self._run(context.__aexit__(None, None, None))
+
+    def __call__(self):
+        from kirei._app.cli import _console
+
+        self._registry.start()
+        try:
+            _console.run(self)
+        finally:
+            self._registry.close()
@@ -0,0 +1,229 @@
+import asyncio
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+import csv
+from dataclasses import dataclass
+import gettext
+import itertools
+import json
+from pathlib import Path
+import threading
+from typing import (
+    IO,
+    Any,
+    AsyncIterator,
+    Deque,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from kirei._app._rows import Row, validate_rows
+from kirei._app._task_io import fill_params, keep_output
+from kirei.types import ParsedFunc
+from kirei.types.function import ExecutorType, ProcessTaskExecutor
+from kirei.types.function._func_parser import TaskSession
+
+_ = gettext.gettext
+
+# 每个 worker 最多预读的行数，限制同时驻留在内存中的行和结果
+_WINDOW_PER_WORKER = 2
+
+# 每次读取并按列校验的行数
+_CHUNK_SIZE = 256
+
+
+@dataclass(frozen=True)
+class BatchSummary:
+    total: int
+    succeeded: int
+    failed: int
+
+
+def _iter_rows(input_path: Path) -> Iterator[Tuple[int, Union[Row, Exception]]]:
+    # 逐行读取，单行格式错误只影响这一行
+    with input_path.open(newline="", encoding="utf-8") as f:
+        if input_path.suffix.lower() == ".csv":
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line_num, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as err:
+                yield line_num, err
+                continue
+            if not isinstance(row, (dict, list)):
+                yield line_num, ValueError(_("每一行必须是 JSON 对象或数组"))
+                continue
+            yield line_num, row
+
+
+def _iter_chunks(
+    rows: Iterator[Tuple[int, Union[Row, Exception]]]
+) -> Iterator[List[Tuple[int, Union[Row, Exception]]]]:
+    while chunk := list(itertools.islice(rows, _CHUNK_SIZE)):
+        yield chunk
+
+
+def _validate_chunk(
+    parsed_func: ParsedFunc,
+    names: List[str],
+    chunk: List[Tuple[int, Union[Row, Exception]]],
+) -> List[Tuple[int, Union[List[Any], Exception]]]:
+    rows = validate_rows(parsed_func, names, [row for _line_num, row in chunk])
+    return [(line_num, row) for (line_num, _row), row in zip(chunk, rows)]
+
+
+def _keep_output(session: TaskSession, res: Any, artifact_dir: Path, prefix: str):
+    annotation = session.meta_data.return_type_annotation
+    return keep_output(annotation, res, artifact_dir, prefix)
+
+
+@contextmanager
+def _running_loop() -> Iterator[asyncio.AbstractEventLoop]:
+    # 异步任务的所有行在同一个 event loop 中执行，app 作用域的异步资源在行之间可以继续使用
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(
+        target=loop.run_forever, name="kirei-batch-loop", daemon=True
+    )
+    thread.start()
+    try:
+        yield loop
+    finally:
+        asyncio.run_coroutine_threadsafe(loop.shutdown_asyncgens(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+async def _aenumerate(items: AsyncIterator[Any]) -> AsyncIterator[Tuple[int, Any]]:
+    i = 0
+    async for item in items:
+        yield i, item
+        i += 1
+
+
+async def _arun_row(
+    parsed_func: ParsedFunc,
+    values: List[Any],
+    executor: Optional[Executor],
+    artifact_dir: Path,
+    line_num: int,
+) -> Any:
+    async with parsed_func.enter_async_session() as session:
+        fill_params(session.meta_data.non_injected_params, values, validated=True)
+        if session.is_stream:
+            # 生成器任务的所有输出作为这一行的结果
+            return [
+                _keep_output(session, item, artifact_dir, f"{line_num}-{i}")
+                async for i, item in _aenumerate(session.astream())
+            ]
+        if executor is not None:
+            res = await asyncio.wrap_future(session.submit(executor))
+        else:
+            res = await session.acall()
+        return _keep_output(session, res, artifact_dir, str(line_num))
+
+
+def _run_row(
+    parsed_func: ParsedFunc,
+    values: List[Any],
+    executor: Optional[Executor],
+    artifact_dir: Path,
+    line_num: int,
+    loop: Optional[asyncio.AbstractEventLoop],
+) -> Any:
+    if loop is not None:
+        return asyncio.run_coroutine_threadsafe(
+            _arun_row(parsed_func, values, executor, artifact_dir, line_num), loop
+        ).result()
+    with parsed_func.enter_session() as session:
+        fill_params(session.meta_data.non_injected_params, values, validated=True)
+        if session.is_stream:
+            return [
+                _keep_output(session, item, artifact_dir, f"{line_num}-{i}")
+                for i, item in enumerate(session.stream())
+            ]
+        res = session.submit(executor).result() if executor is not None else session()
+        return _keep_output(session, res, artifact_dir, str(line_num))
+
+
+def _write_record(out: IO[str], line_num: int, future: "Future[Any]") -> bool:
+    try:
+        record = {"line": line_num, "ok": True, "result": future.result()}
+    except Exception as err:
+        record = {
+            "line": line_num,
+            "ok": False,
+            "error": str(err),
+            "error_type": type(err).__name__,
+        }
+    out.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+    return record["ok"]
+
+
+def run_batch(
+    parsed_func: ParsedFunc,
+    input_path: Path,
+    out: IO[str],
+    *,
+    jobs: int = 1,
+    executor: ExecutorType = "thread",
+    artifact_dir: Optional[Path] = None,
+) -> BatchSummary:
+    # 行的校验、注入在线程中执行，异步任务的行交给同一个 event loop 执行；
+    # executor="process" 时任务函数本身交给进程池执行
+    # 结果按输入顺序写出，同时在执行的行数不超过 jobs * _WINDOW_PER_WORKER，
+    # 预读并校验的行数不超过 _CHUNK_SIZE
+    if jobs < 1:
+        raise ValueError("jobs must be positive")
+    if executor == "process" and not parsed_func.supports_process:
+        raise ValueError(_("生成器任务或读取输入文件内容的任务不能在进程中执行"))
+    artifact_dir = artifact_dir or Path.cwd()
+    process_executor = (
+        ProcessTaskExecutor(max_workers=jobs).start() if executor == "process" else None
+    )
+    window = jobs * _WINDOW_PER_WORKER
+    names = [param.name for param in parsed_func.get_metadata().non_injected_params]
+    pending: Deque[Tuple[int, "Future[Any]"]] = deque()
+    total = succeeded = 0
+    try:
+        with (
+            _running_loop() if parsed_func.is_async else nullcontext()
+        ) as loop, ThreadPoolExecutor(
+            max_workers=jobs, thread_name_prefix="kirei-batch"
+        ) as pool:
+            for chunk in _iter_chunks(_iter_rows(input_path)):
+                for line_num, values in _validate_chunk(parsed_func, names, chunk):
+                    if isinstance(values, Exception):
+                        future: "Future[Any]" = Future()
+                        future.set_exception(values)
+                    else:
+                        future = pool.submit(
+                            _run_row,
+                            parsed_func,
+                            values,
+                            process_executor,
+                            artifact_dir,
+                            line_num,
+                            loop,
+                        )
+                    pending.append((line_num, future))
+                    while len(pending) >= window:
+                        total += 1
+                        succeeded += _write_record(out, *pending.popleft())
+            while pending:
+                total += 1
+                succeeded += _write_record(out, *pending.popleft())
+    finally:
+        if process_executor is not None:
+            process_executor.shutdown()
+        out.flush()
+    return BatchSummary(total, succeeded, total - succeeded)
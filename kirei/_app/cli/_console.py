@@ -0,0 +1,305 @@
+from __future__ import annotations
+from decimal import Decimal
+import gettext
+import io
+import logging
+import pathlib
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Iterator,
+    Optional,
+)
+import inquirer
+import prompt_toolkit as pt
+from prompt_toolkit import completion as ptc
+import rich
+
+import typer
+from rich.progress import Progress, SpinnerColumn, TextColumn
+from kirei.types import (
+    FuncParam,
+    ParsedFunc,
+    ParamInquirerCollection,
+    ReplierCollection,
+)
+from kirei.types.function._artifact import link_or_copy
+from kirei.types.function._file_content import (
+    content_filename,
+    get_file_content,
+    write_content,
+)
+from kirei.types.function._func_parser import TaskSession
+from kirei.types.function._metrics import measure
+from kirei.types.function._param_annotation import ParamAnnotation
+from kirei.types.basic_types import PathType
+
+if TYPE_CHECKING:
+    from kirei._app.cli import CliApplication
+
+
+_ = gettext.gettext
+_console = rich.console.Console()
+
+
+_logger = logging.getLogger(__name__)
+
+
+def _anystr_inquirer(
+    index: int, name: str, type_name: str, completer: Optional[ptc.Completer] = None
+) -> str:
+    return pt.prompt(
+        _("请输入第 {} 个参数，参数名称 {}, 参数类型: {} :").format(
+            index, name, type_name
+        ),
+        completer=completer,
+    )
+
+
+def _str_param_inquirer(param: FuncParam) -> str:
+    _USER_TYPE_HINT_MAPPING = {
+        int: _("整数"),
+        str: _("文本"),
+        Decimal: _("小数"),
+    }
+    return _anystr_inquirer(
+        param.index,
+        param.name,
+        _USER_TYPE_HINT_MAPPING[param.real_source_type],
+    )
+
+
+def _user_file_inquirer(param: FuncParam) -> str:
+    assert param.real_source_type is pathlib.Path
+    pt = param.get_tp_info(PathType)
+    if not pt:
+        return NotImplemented
+    elif pt.type != "user_input_file":
+        return NotImplemented
+    return _anystr_inquirer(
+        param.index,
+        param.name,
+        _("文件(需要输入文件路径)"),
+        completer=ptc.PathCompleter(),
+    )
+
+
+def _print_replier(param: ParamAnnotation, res: Any):
+    typer.secho(_("执行结果为: {}").format(res))
+
+
+def _file_replier(param: ParamAnnotation, res: pathlib.Path):
+    path_type = param.get_tp_info(PathType)
+    if not path_type:
+        return NotImplemented
+    if path_type.type != "out_file":
+        return NotImplemented
+    if not res.exists():
+        raise ValueError(_("任务输出路径的文件不存在"))
+    if not res.is_file():
+        raise ValueError(_("任务输出路径不是一个有效的文件"))
+    out_path = _prompt_out_path(res.name)
+    # 不用硬链接：保存的文件和任务的输出（可能是用户输入的文件）之后应该互不影响
+    link_or_copy(res, out_path, hardlink=False)
+    typer.secho("文件已经成功保存到: {}".format(out_path))
+
+
+def _file_content_replier(param: ParamAnnotation, res: Any):
+    content = get_file_content(param)
+    if content is None:
+        return NotImplemented
+    # 内存中的内容直接写到用户选择的位置
+    out_path = _prompt_out_path(content_filename(content))
+    write_content(res, out_path)
+    typer.secho("文件已经成功保存到: {}".format(out_path))
+
+
+def _prompt_out_path(filename: str) -> pathlib.Path:
+    while True:
+        out_path = pathlib.Path(
+            pt.prompt(
+                _("执行结果为文件，请输入要保存到的位置:"),
+                completer=ptc.PathCompleter(only_directories=True),
+            )
+        )
+        if out_path.is_dir() or out_path.parent.is_dir():
+            break
+        typer.secho(_("输入的路径不存在或不是一个有效的目录，请重新输入"))
+    if out_path.is_dir():
+        out_path = out_path / filename
+    return out_path
+
+
+_inquirer = (
+    ParamInquirerCollection()
+    .register_multi(_str_param_inquirer, [str, int, Decimal])
+    .register(_user_file_inquirer, pathlib.Path)
+)
+_replier = (
+    ReplierCollection()
+    .register_multi(_print_replier, [str, int, Decimal])
+    .register(_file_replier, pathlib.Path)
+    .register_multi(_file_content_replier, [bytes, bytearray, memoryview, io.BytesIO])
+)
+
+
+class CliConsole:
+    def __init__(self, app: CliApplication):
+        self._app = app
+
+    def _fill_param(self, param: FuncParam):
+        while True:
+            value = _inquirer(param)
+            try:
+                param.fill(value)
+                return
+            except Exception as err:
+                typer.secho(_("参数校验失败：{}".format(err)), fg=typer.colors.RED)
+                typer.secho("请重新输入", fg=typer.colors.YELLOW)
+
+    def _show_task_result(
+        self, task: ParsedFunc, annotation: ParamAnnotation, res: Any
+    ):
+        try:
+            with measure(task.metrics, "reply"):
+                self._app._run(_replier(annotation, res))
+        except Exception as err:
+            typer.secho(_("任务执行结果处理失败:{}".format(err)), fg=typer.colors.RED)
+
+    def _iter_stream(self, session: TaskSession) -> Iterator[Any]:
+        if not session.is_async:
+            yield from session.stream()
+            return
+        # 异步生成器的每一步交给 cli 的 event loop 执行
+        stream = session.astream()
+        try:
+            while True:
+                try:
+                    yield self._app._run(stream.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self._app._run(stream.aclose())  # type: ignore
+
+    def _stream_task(self, task: ParsedFunc, session: TaskSession):
+        # 生成器任务的输出逐个显示，不显示进度条，也不会累积在内存中
+        annotation = session.meta_data.return_type_annotation
+        try:
+            for item in self._iter_stream(session):
+                if isinstance(item, str):
+                    typer.echo(item)
+                else:
+                    self._show_task_result(task, annotation, item)
+        except Exception:
+            typer.secho(_("任务执行失败:以下是相关的错误信息"), fg=typer.colors.RED)
+            _console.print_exception(show_locals=True)
+            typer.secho(_("任务执行失败"), fg=typer.colors.RED)
+            return
+        typer.secho(_("任务执行完毕"), fg=typer.colors.GREEN)
+
+    def _execute_task(self, task: ParsedFunc):
+        try:
+            with self._app._enter_session(task) as session:
+                try:
+                    self._run_session(task, session)
+                except KeyboardInterrupt:
+                    session.cancel()
+                    raise
+        except KeyboardInterrupt:
+            # Ctrl-C 只取消当前任务并回到任务选择，注入的临时目录等在退出 session 时已经清理
+            typer.secho(_("任务已取消"), fg=typer.colors.YELLOW)
+
+    def _run_session(self, task: ParsedFunc, session: TaskSession):
+        for param in session.meta_data.non_injected_params:
+            self._fill_param(param)
+        typer.secho(
+            _("开始执行任务 {}").format(session.meta_data.name),
+            fg=typer.colors.GREEN,
+        )
+        if session.is_stream:
+            self._stream_task(task, session)
+            return
+        with Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            transient=True,
+        ) as progress:
+            try:
+                progress.add_task(_("正在执行任务 {}").format(session.meta_data.name))
+                res = self._app._run(session.acall()) if session.is_async else session()
+            except Exception:
+                typer.secho(_("任务执行失败:以下是相关的错误信息"), fg=typer.colors.RED)
+                _console.print_exception(show_locals=True)
+                typer.secho(_("任务执行失败"), fg=typer.colors.RED)
+                return
+        typer.secho(_("任务执行完毕"), fg=typer.colors.GREEN)
+        self._show_task_result(task, session.meta_data.return_type_annotation, res)
+        if session.profile_report is not None:
+            typer.secho(_("任务性能分析结果:"), fg=typer.colors.CYAN)
+            typer.echo(session.profile_report.format())
+
+    def main(self):
+        try:
+            exit_choice = _("退出")
+            while self._app._is_running:
+                task_name: str = inquirer.list_input(
+                    _("请选择你要执行的任务"),
+                    choices=[exit_choice, *self._app._name_task_mapping.keys()],
+                )
+                if task_name == exit_choice:
+                    self._app._exit()
+                    continue
+                task = self._app._name_task_mapping[task_name]
+                self._execute_task(task)
+        finally:
+            self._app._close_loop()
+
+
+def run(app: CliApplication):
+    # 不带子命令时进入交互模式；batch 子命令用于在脚本、定时任务中批量执行
+    cli = typer.Typer(add_completion=False)
+
+    @cli.callback(invoke_without_command=True)
+    def interactive(ctx: typer.Context):
+        if ctx.invoked_subcommand is None:
+            CliConsole(app).main()
+
+    @cli.command("batch")
+    def batch(
+        task: str = typer.Argument(..., help=_("要执行的任务名")),
+        input_path: pathlib.Path = typer.Argument(
+            ..., exists=True, dir_okay=False, help=_("输入文件，jsonl 或 csv")
+        ),
+        output: Optional[pathlib.Path] = typer.Option(
+            None, "--output", "-o", help=_("结果输出的 jsonl 文件，默认为标准输出")
+        ),
+        jobs: int = typer.Option(1, "--jobs", "-j", min=1, help=_("并行数")),
+        executor: str = typer.Option(
+            "thread", help=_("任务在线程(thread)还是进程(process)中执行")
+        ),
+    ):
+        if executor not in ("thread", "process"):
+            raise typer.BadParameter(_("executor 只能为 thread 或 process"))
+        # 只有任务不存在时是 TASK 参数的错误，其余的错误显示它们自己的信息
+        try:
+            app._get_task(task)
+        except ValueError as err:
+            raise typer.BadParameter(str(err), param_hint="TASK")
+        try:
+            summary = app.run_batch(
+                task, input_path, output, jobs=jobs, executor=executor  # type: ignore
+            )
+        except ValueError as err:
+            typer.secho(str(err), fg=typer.colors.RED, err=True)
+            raise typer.Exit(2)
+        typer.secho(
+            _("共 {} 行，成功 {} 行，失败 {} 行").format(
+                summary.total, summary.succeeded, summary.failed
+            ),
+            fg=typer.colors.GREEN if not summary.failed else typer.colors.YELLOW,
+            err=True,
+        )
+        if summary.failed:
+            raise typer.Exit(1)
+
+    cli()
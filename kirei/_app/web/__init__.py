@@ -1,28 +1,101 @@
-from ast import Call
+from contextlib import ExitStack, asynccontextmanager
+from dataclasses import dataclass
+import functools
 import gettext
 import logging
+import os
 from pathlib import Path
-from types import NotImplementedType
-from typing import Callable, List, Optional, Union, cast
-
-from pydantic import BaseModel, ConfigDict
-from kirei._app.web._component import (
-    InputComponentGeneratorCollection,
-    get_default_input_generator_collection,
-    get_default_output_generator_collection,
+import sys
+import tempfile
+from typing import TYPE_CHECKING, Callable, List, Optional, Type, Union
+
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+from kirei._app.web._admission import (
+    AdmissionConfig as AdmissionConfig,
+    Limiter,
+    TaskAdmission,
+)
+from kirei._app.web._batch import (
+    BatchConfig as BatchConfig,
+    MicroBatcher,
+    create_batch_runner,
+)
+from kirei._app.web._jobs import (
+    JobConfig as JobConfig,
+    JobQueue,
+    JobStore,
+    create_job_runner,
 )
-from kirei.types import Application, Task_T, Task
-import gradio as gr
+from kirei._app.web._metrics_server import MetricsServer
+from kirei.types import Application, Task_T
 
-from kirei.types.annotated import get_default_validator_provider
-from kirei.types import FuncParam, FuncParser, ParsedFunc
-from kirei.types.function import get_default_context_collection
+from kirei.types import ParsedFunc
+from kirei.types.function import (
+    ArtifactStore,
+    ContextManagerCreator,
+    ExecutorType,
+    InjectorLifetime,
+    InjectorMatcher,
+    MetricsRegistry,
+    ProfileConfig,
+    ProcessTaskExecutor,
+    ResultCache,
+    TaskRegistry,
+)
+
+if TYPE_CHECKING:
+    from kirei._app.web._api import ApiTask
 
 
 class WebApplicationConfig(BaseModel):
     model_config = ConfigDict(frozen=True)
     external_accessible: bool = False
     port: int = 8080
+    # 以下配置仅对 register(executor="process") 的任务生效，默认进程数为 cpu 核数
+    process_pool_size: Optional[int] = None
+    process_max_tasks_per_worker: Optional[int] = None
+    # 设置后在 127.0.0.1 的该端口上提供 prometheus 格式的 /metrics
+    metrics_port: Optional[int] = None
+    # 生成器任务输出字符串时，页面上只保留最后这么多个字符
+    stream_max_chars: int = 65536
+    # register(job=...) 的任务提交后在后台执行，job 保存在这个 sqlite 数据库中，重启后继续执行
+    job_db_path: Path = Path("kirei-jobs.sqlite3")
+    job_workers: int = Field(default=4, ge=1)
+    # 任务输出的文件保存在 artifact_dir 中，按最近访问时间淘汰；默认位于 gradio 的上传目录下，
+    # gradio 可以直接提供（支持 Range 的）下载而不需要再复制一份
+    artifact_dir: Optional[Path] = None
+    artifact_max_bytes: Optional[int] = Field(default=1024**3, ge=1)
+    artifact_ttl: Optional[float] = Field(default=24 * 3600, gt=0)
+    # 每个任务在 api_prefix 下提供 JSON 接口；headless 时只提供 JSON 接口，不提供 gradio 页面
+    api_prefix: str = "/api"
+    headless: bool = False
+    # 监听同一个端口的 worker 进程数，gradio 页面的状态保存在进程内，只有 headless 时可以大于 1
+    workers: int = Field(default=1, ge=1)
+    # 每个任务的标签页在第一次打开时才创建，任务很多时可以快速启动；
+    # 这时任务只能通过 JSON 接口调用，不能通过 gradio 自己的 API 调用
+    lazy_tabs: bool = True
+    # 所有任务（job 任务除外）同时执行的请求总数，等待的请求按 AdmissionConfig.priority 排序；
+    # 每个 worker 进程各自限制。max_queue 和 queue_timeout 是任务没有单独设置时的默认值
+    max_concurrency: Optional[int] = Field(default=None, ge=1)
+    max_queue: Optional[int] = Field(default=None, ge=0)
+    queue_timeout: Optional[float] = Field(default=None, gt=0)
+
+    @model_validator(mode="after")
+    def _check_workers(self):
+        if self.workers > 1 and not self.headless:
+            raise ValueError("workers > 1 requires headless=True")
+        if self.workers > 1 and self.metrics_port is not None:
+            raise ValueError("workers > 1 can not be used with metrics_port")
+        return self
+
+    def get_artifact_dir(self) -> Path:
+        if self.artifact_dir is not None:
+            return self.artifact_dir
+        # 和 gradio.utils.get_upload_folder 一致，这里不导入 gradio
+        upload_dir = os.environ.get("GRADIO_TEMP_DIR") or (
+            Path(tempfile.gettempdir()) / "gradio"
+        )
+        return Path(upload_dir).resolve() / "kirei-artifacts"
 
     @property
     def listen_addr(self):
@@ -31,64 +104,333 @@ class WebApplicationConfig(BaseModel):
 
 _ = gettext.gettext
 _logger = logging.getLogger(__name__)
-_context_collection = get_default_context_collection()
-_validator_provider = get_default_validator_provider()
-_func_parser = FuncParser(_context_collection, _validator_provider)
-_input_component_generator = get_default_input_generator_collection()
-_output_component_generator = get_default_output_generator_collection()
-
-_GrComponent = gr.components.Component
 
 
-def _generate_interface(parsed_func: ParsedFunc) -> gr.Interface:
-    metadata = parsed_func.get_metadata()
+@dataclass(frozen=True)
+class _WebTask:
+    parsed_func: ParsedFunc
+    executor: ExecutorType = "thread"
+    batch: Optional[BatchConfig] = None
+    job: Optional[JobConfig] = None
+    admission: Optional[AdmissionConfig] = None
 
-    input_components: List[_GrComponent] = []
-    for param in metadata.non_injected_params:
-        component = _input_component_generator(param)
-        input_components.append(component)
 
-    def _func(*args):
-        with parsed_func.enter_session() as session:
-            for param, arg in zip(session.meta_data.non_injected_params, args):
-                param.fill(arg)
-            res = session()
-            # HACK: gradio 不支持 pathlib.Path 类型，需要转换为 str
-            if isinstance(res, Path):
-                res = str(res)
-            return res
-
-    output_components = [_output_component_generator(metadata.return_type_annotation)]
+class WebApplication(Application):
+    def __init__(
+        self,
+        *,
+        config: Optional[WebApplicationConfig] = None,
+        metrics: Optional[MetricsRegistry] = None,
+        registry: Optional[TaskRegistry] = None,
+    ) -> None:
+        # 和其他前端共用 registry 时，同一个函数只解析一次，缓存、统计和 app 作用域的 injector 也是共用的
+        self._config = config or WebApplicationConfig()
+        self._tasks: List[_WebTask] = []
+        if registry is None:
+            # 没有传入 metrics 且没有配置 metrics_port 时不做任何统计
+            registry = TaskRegistry(
+                metrics=metrics
+                or (
+                    MetricsRegistry() if self._config.metrics_port is not None else None
+                )
+            )
+        elif metrics is not None:
+            raise TypeError("metrics should be set on the shared registry")
+        elif self._config.metrics_port is not None and registry.metrics is None:
+            raise TypeError("metrics_port requires a registry with metrics")
+        self._registry = registry
+        # registry 有 artifact store 时使用它，否则使用 web 自己的 store，不影响共用 registry 的其他前端
+        self._artifact_store = registry.artifact_store or ArtifactStore(
+            self._config.get_artifact_dir(),
+            max_bytes=self._config.artifact_max_bytes,
+            ttl=self._config.artifact_ttl,
+        )
 
-    return gr.Interface(
-        _func,
-        list(input_components),
-        outputs=list(output_components),
-        title=metadata.name,
-    )
+    @property
+    def metrics(self) -> Optional[MetricsRegistry]:
+        return self._registry.metrics
 
+    @property
+    def registry(self) -> TaskRegistry:
+        return self._registry
 
-class WebApplication(Application):
-    def __init__(self, *, config: Optional[WebApplicationConfig] = None) -> None:
-        self._config = config or WebApplicationConfig()
-        self._parsed_func: List[ParsedFunc] = []
+    def register_injector(
+        self,
+        tp: Type,
+        match: Optional[InjectorMatcher] = None,
+        *,
+        lifetime: InjectorLifetime = "session",
+        lazy: bool = True,
+    ) -> Callable[[ContextManagerCreator], ContextManagerCreator]:
+        return self._registry.register_injector(tp, match, lifetime=lifetime, lazy=lazy)
 
     def register(
-        self, override_name: Optional[str] = None
+        self,
+        override_name: Optional[str] = None,
+        *,
+        executor: ExecutorType = "thread",
+        batch: Union[bool, BatchConfig] = False,
+        cache: Optional[ResultCache] = None,
+        dedupe: bool = False,
+        profile: Union[bool, ProfileConfig, None] = None,
+        job: Union[bool, JobConfig] = False,
+        timeout: Optional[float] = None,
+        admission: Optional[AdmissionConfig] = None,
     ) -> Callable[[Task_T], Task_T]:
+        # executor="process" 的任务函数会在子进程中执行，需要能被 pickle（模块级函数）
+        # batch 任务的函数签名为 f(items: list[T]) -> list[R]，并发的单个请求会被合并成一批执行
+        # profile 开启后被采样的执行会额外输出性能分析结果和 .prof/.collapsed 文件
+        # 生成器任务的每个输出都会立即显示在页面上
+        # job 任务提交后立即返回 job id，可以随时用 job id 查询进度和结果
+        # timeout 单位为秒：异步任务会被取消，executor="process" 的任务会结束 worker 进程，
+        # 线程中执行的同步任务需要通过 CancellationToken 参数配合中断
+        # admission 限制这个任务同时执行和排队的请求数，超出时请求被立即拒绝
+        batch_config = BatchConfig() if batch is True else batch or None
+        job_config = JobConfig() if job is True else job or None
+
         def decorator(func: Task_T):
-            self._parsed_func.append(
-                _func_parser.parse(func, override_name=override_name)
+            task_name = override_name or func.__name__
+            if any(task.parsed_func.name == task_name for task in self._tasks):
+                raise TypeError(f"Multiple task can not have same name: {task_name}")
+            parsed_func = self._registry.add(
+                func,
+                override_name,
+                batch=batch_config is not None,
+                cache=cache,
+                dedupe=dedupe,
+                profile=profile,
+                timeout=timeout,
+            )
+            # 任务在第一次使用时才被解析，只有需要检查的任务在注册时解析
+            if executor == "process" and not parsed_func.supports_process:
+                raise TypeError(
+                    _("生成器任务或读取输入文件内容的任务 {} 不能在进程中执行").format(
+                        parsed_func.name
+                    )
+                )
+            if (
+                batch_config is not None
+                and len(parsed_func.get_metadata().non_injected_params) != 1
+            ):
+                raise TypeError(
+                    f"Batch task {parsed_func.name} can only have one non-injected param"
+                )
+            if job_config is not None and (
+                parsed_func.is_batch or parsed_func.is_stream
+            ):
+                raise TypeError(
+                    _("job 任务 {} 不能是生成器或批量任务").format(parsed_func.name)
+                )
+            self._tasks.append(
+                _WebTask(parsed_func, executor, batch_config, job_config, admission)
             )
             return func
 
         return decorator
 
+    def _create_process_executor(self) -> Optional[ProcessTaskExecutor]:
+        if not any(task.executor == "process" for task in self._tasks):
+            return None
+        return ProcessTaskExecutor(
+            max_workers=self._config.process_pool_size,
+            max_tasks_per_worker=self._config.process_max_tasks_per_worker,
+        )
+
+    def _create_job_queue(
+        self, process_executor: Optional[ProcessTaskExecutor]
+    ) -> Optional[JobQueue]:
+        job_tasks = [task for task in self._tasks if task.job is not None]
+        if not job_tasks:
+            return None
+        db_path = self._config.job_db_path.resolve()
+        queue = JobQueue(
+            JobStore(db_path),
+            self._config.job_workers,
+            db_path.with_name(db_path.stem + "-inputs"),
+        )
+        for task in job_tasks:
+            assert task.job is not None
+            executor = process_executor if task.executor == "process" else None
+            queue.register(
+                task.parsed_func.name,
+                create_job_runner(task.parsed_func, executor, self._artifact_store),
+                task.job,
+            )
+        _logger.info(_("job 数据库: {}").format(db_path))
+        return queue
+
+    def _start_metrics_server(self) -> Optional[MetricsServer]:
+        metrics = self._registry.metrics
+        if metrics is None or self._config.metrics_port is None:
+            return None
+        server = MetricsServer(metrics, self._config.metrics_port).start()
+        _logger.info(_("metrics 地址: http://127.0.0.1:{}/metrics").format(server.port))
+        return server
+
+    def _create_admissions(self) -> List[Optional[TaskAdmission]]:
+        # 页面和 JSON 接口共用同一个任务的额度
+        config = self._config
+        shared = (
+            Limiter(config.max_concurrency)
+            if config.max_concurrency is not None
+            else None
+        )
+        admissions: List[Optional[TaskAdmission]] = []
+        for task in self._tasks:
+            if task.job is not None or (
+                task.admission is None
+                and shared is None
+                and config.max_queue is None
+                and config.queue_timeout is None
+            ):
+                admissions.append(None)
+                continue
+            task_config = task.admission or AdmissionConfig()
+            if task_config.max_queue is None and config.max_queue is not None:
+                task_config = task_config.model_copy(
+                    update={"max_queue": config.max_queue}
+                )
+            admissions.append(
+                TaskAdmission(
+                    task.parsed_func.name,
+                    task_config,
+                    shared,
+                    config.queue_timeout,
+                    task.parsed_func.metrics,
+                )
+            )
+        return admissions
+
+    def _create_api_tasks(
+        self,
+        process_executor: Optional[ProcessTaskExecutor],
+        job_queue: Optional[JobQueue],
+    ) -> List["ApiTask"]:
+        # 页面和 JSON 接口共用同一个任务的 executor、MicroBatcher 和执行额度
+        from kirei._app.web._api import ApiTask
+
+        api_tasks = []
+        for task, admission in zip(self._tasks, self._create_admissions()):
+            executor = process_executor if task.executor == "process" else None
+            api_tasks.append(
+                ApiTask(
+                    task.parsed_func,
+                    executor,
+                    (
+                        MicroBatcher(
+                            create_batch_runner(task.parsed_func, executor), task.batch
+                        )
+                        if task.batch is not None
+                        else None
+                    ),
+                    job_queue if task.job is not None else None,
+                    admission,
+                )
+            )
+        return api_tasks
+
+    def _create_interface(self, api_tasks: List["ApiTask"]):
+        # gradio 导入很慢，只在真正启动 web 服务时才导入
+        from kirei._app.web._interface import (
+            generate_tabs,
+            render_interface,
+            render_job_interface,
+        )
+
+        tabs = []
+        for task in api_tasks:
+            if task.job_queue is not None:
+                render = functools.partial(
+                    render_job_interface, task.parsed_func, task.job_queue
+                )
+            else:
+                render = functools.partial(
+                    render_interface,
+                    task.parsed_func,
+                    task.executor,
+                    task.batcher,
+                    self._artifact_store,
+                    self._config.stream_max_chars,
+                    task.admission,
+                )
+            tabs.append((task.parsed_func.name, render))
+        return generate_tabs(tabs, self._config.lazy_tabs)
+
+    def asgi(self):
+        # 返回 ASGI 应用：api_prefix 下为 JSON 接口，headless=False 时根路径为 gradio 页面
+        # 可以交给任意 ASGI 服务器运行；workers > 1 时每个 worker 进程各自调用一次
+        from fastapi import FastAPI
+        from kirei._app.web._api import create_api_router
+
+        if self._config.workers > 1 and any(task.job for task in self._tasks):
+            raise TypeError(_("job 任务不支持多个 worker 进程"))
+        process_executor = self._create_process_executor()
+        job_queue = self._create_job_queue(process_executor)
+        api_tasks = self._create_api_tasks(process_executor, job_queue)
+
+        @asynccontextmanager
+        async def lifespan(_app):
+            # 线程、进程和端口只在服务真正启动时创建，只导入或构建应用时不会启动它们
+            with ExitStack() as stack:
+                self._registry.start()
+                stack.callback(self._registry.close)
+                metrics_server = self._start_metrics_server()
+                if metrics_server is not None:
+                    stack.callback(metrics_server.shutdown)
+                if process_executor is not None:
+                    stack.callback(process_executor.shutdown)
+                    process_executor.start()
+                if job_queue is not None:
+                    stack.callback(job_queue.shutdown)
+                    job_queue.start()
+                yield
+
+        app = FastAPI(title="kirei", lifespan=lifespan)
+        app.include_router(
+            create_api_router(
+                api_tasks,
+                self._artifact_store,
+                job_queue,
+            ),
+            prefix=self._config.api_prefix,
+        )
+        if not self._config.headless:
+            import gradio as gr
+
+            gr.mount_gradio_app(
+                app,
+                self._create_interface(api_tasks),
+                path="/",
+                allowed_paths=[str(self._artifact_store.root)],
+            )
+        return app
+
     def __call__(self):
-        interface = gr.TabbedInterface(
-            [_generate_interface(task) for task in self._parsed_func],
-            [task.get_metadata().name for task in self._parsed_func],
+        import uvicorn
+
+        if self._config.workers == 1:
+            uvicorn.run(
+                self.asgi(), host=self._config.listen_addr, port=self._config.port
+            )
+            return
+        # 多个 worker 进程共享同一个端口，每个进程重新导入启动脚本并调用 asgi()
+        uvicorn.run(
+            _get_import_string(self),
+            factory=True,
+            workers=self._config.workers,
+            host=self._config.listen_addr,
+            port=self._config.port,
         )
-        interface.launch(
-            server_name=self._config.listen_addr, server_port=self._config.port
+
+
+def _get_import_string(app: WebApplication) -> str:
+    # HACK: uvicorn 的 worker 进程只能通过导入路径得到应用，在启动脚本的全局变量中查找 app
+    main = sys.modules["__main__"]
+    name = next((key for key, value in vars(main).items() if value is app), None)
+    if name is None:
+        raise TypeError(
+            _("workers 大于 1 时 WebApplication 需要是启动脚本中的全局变量")
         )
+    spec = getattr(main, "__spec__", None)
+    module = spec.name if spec is not None else Path(main.__file__).stem
+    return f"{module}:{name}.asgi"
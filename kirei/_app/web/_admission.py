@@ -0,0 +1,221 @@
+import asyncio
+from contextlib import asynccontextmanager, nullcontext
+from dataclasses import dataclass
+import gettext
+import heapq
+import itertools
+import threading
+import time
+from typing import AsyncIterator, List, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict, Field
+
+from kirei.types.function import TaskMetrics
+
+_ = gettext.gettext
+
+
+class AdmissionConfig(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    # 这个任务同时执行的请求数，None 表示不限制
+    max_concurrency: Optional[int] = Field(default=None, ge=1)
+    # 等待执行的请求数达到 max_queue 时，新的请求立即被拒绝
+    max_queue: Optional[int] = Field(default=None, ge=0)
+    # 单位为秒，等待超过这个时间的请求被拒绝；None 时使用 WebApplicationConfig.queue_timeout
+    queue_timeout: Optional[float] = Field(default=None, gt=0)
+    # 等待 WebApplicationConfig.max_concurrency 的全局额度时，优先级高的任务先执行
+    priority: int = 0
+
+
+class AdmissionRejectedError(Exception):
+    pass
+
+
+class QueueFullError(AdmissionRejectedError):
+    pass
+
+
+class QueueTimeoutError(AdmissionRejectedError):
+    pass
+
+
+@dataclass(frozen=True)
+class AdmissionStats:
+    running: int
+    queued: int
+    admitted: int
+    rejected: int
+    # 单位为秒，已经开始执行的请求的排队时间
+    total_wait: float
+    last_wait: Optional[float]
+
+    @property
+    def mean_wait(self) -> Optional[float]:
+        return self.total_wait / self.admitted if self.admitted else None
+
+
+class Limiter:
+    # event loop 中的信号量；等待的请求按优先级、再按到达顺序取得额度
+    def __init__(self, limit: Optional[int]):
+        self._limit = limit
+        self._running = 0
+        self._queued = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    def try_acquire(self) -> bool:
+        if self._limit is None or (self._running < self._limit and not self._queued):
+            self._running += 1
+            return True
+        return False
+
+    async def acquire(self, priority: int = 0, timeout: Optional[float] = None):
+        if self.try_acquire():
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (-priority, next(self._seq), future))
+        self._queued += 1
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise QueueTimeoutError(timeout) from None
+        except BaseException:
+            # 被取消时额度可能已经转交给了这个请求
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+        finally:
+            self._queued -= 1
+
+    def release(self):
+        # 额度直接转交给下一个等待的请求
+        while self._waiters:
+            _priority, _seq, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._running -= 1
+
+
+class TaskAdmission:
+    # 任务的每个请求（页面和 JSON 接口共用）先取得任务自己的额度，再取得全局额度
+    def __init__(
+        self,
+        name: str,
+        config: AdmissionConfig,
+        shared: Optional[Limiter] = None,
+        queue_timeout: Optional[float] = None,
+        metrics: Optional[TaskMetrics] = None,
+    ):
+        self._name = name
+        self._config = config
+        self._limiter = Limiter(config.max_concurrency)
+        self._shared = shared
+        self._queue_timeout = config.queue_timeout or queue_timeout
+        self._metrics = metrics
+        self._lock = threading.Lock()
+        # 等待全局额度的请求也算作排队中
+        self._running = 0
+        self._queued = 0
+        self._admitted = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+        self._last_wait: Optional[float] = None
+
+    def stats(self) -> AdmissionStats:
+        with self._lock:
+            return AdmissionStats(
+                self._running,
+                self._queued,
+                self._admitted,
+                self._rejected,
+                self._total_wait,
+                self._last_wait,
+            )
+
+    def _remaining(self, deadline: Optional[float]) -> Optional[float]:
+        if deadline is None:
+            return None
+        return max(deadline - time.monotonic(), 0)
+
+    def _try_acquire(self) -> bool:
+        if not self._limiter.try_acquire():
+            return False
+        if self._shared is not None and not self._shared.try_acquire():
+            self._limiter.release()
+            return False
+        return True
+
+    async def _wait(self, deadline: Optional[float]):
+        await self._limiter.acquire(0, self._remaining(deadline))
+        if self._shared is None:
+            return
+        try:
+            await self._shared.acquire(self._config.priority, self._remaining(deadline))
+        except BaseException:
+            self._limiter.release()
+            raise
+
+    def _count_rejected(self, err: AdmissionRejectedError) -> AdmissionRejectedError:
+        with self._lock:
+            self._rejected += 1
+        return err
+
+    async def _acquire(self):
+        start = time.monotonic()
+        deadline = None if self._queue_timeout is None else start + self._queue_timeout
+        max_queue = self._config.max_queue
+        # 排队已满时只有可以立即执行的请求被接受
+        if max_queue is not None and self._queued >= max_queue:
+            if not self._try_acquire():
+                raise self._count_rejected(
+                    QueueFullError(
+                        _("任务 {} 排队的请求已满，请稍后再试").format(self._name)
+                    )
+                )
+        else:
+            with self._lock:
+                self._queued += 1
+            try:
+                await self._wait(deadline)
+            except QueueTimeoutError:
+                raise self._count_rejected(
+                    QueueTimeoutError(
+                        _("任务 {} 排队超过 {} 秒，请稍后再试").format(
+                            self._name, self._queue_timeout
+                        )
+                    )
+                ) from None
+            finally:
+                with self._lock:
+                    self._queued -= 1
+        wait = time.monotonic() - start
+        with self._lock:
+            self._running += 1
+            self._admitted += 1
+            self._total_wait += wait
+            self._last_wait = wait
+
+    def _release(self):
+        with self._lock:
+            self._running -= 1
+        if self._shared is not None:
+            self._shared.release()
+        self._limiter.release()
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        with self._metrics.track_queue() if self._metrics else nullcontext():
+            await self._acquire()
+        try:
+            yield
+        finally:
+            self._release()
@@ -0,0 +1,534 @@
+import asyncio
+from concurrent.futures import Executor
+from contextlib import AsyncExitStack, nullcontext
+import dataclasses
+import gettext
+import io
+import json
+import mimetypes
+from pathlib import Path
+import shutil
+import tempfile
+from urllib.parse import quote
+from typing import (
+    Any,
+    AsyncContextManager,
+    AsyncIterator,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from fastapi import APIRouter, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.datastructures import UploadFile
+
+from kirei._app._rows import validate_rows
+from kirei._app._task_io import (
+    InvalidParamError,
+    fill_params,
+    is_file_output,
+    keep_output,
+    returns_file,
+)
+from kirei._app.web._admission import (
+    QueueFullError,
+    QueueTimeoutError,
+    TaskAdmission,
+)
+from kirei._app.web._batch import MicroBatcher
+from kirei._app.web._jobs import JobQueue
+from kirei.types import ParsedFunc
+from kirei.types.function import ArtifactStore, TaskCancelledError, TaskTimeoutError
+from kirei.types.function._cache import is_output_file, is_user_input_file
+from kirei.types.function._file_content import (
+    content_filename,
+    get_file_content,
+    is_file_content_value,
+)
+from kirei.types.function._func_parser import FuncParam, TaskSession
+from kirei.types.function._metrics import measure
+from kirei.types.function._param_annotation import ParamAnnotation
+
+_ = gettext.gettext
+
+# batch 接口中同时执行的行数
+_BATCH_CONCURRENCY = 16
+
+# 按范围下载文件时每次读取的字节数
+_RANGE_CHUNK_SIZE = 64 * 1024
+
+
+@dataclasses.dataclass(frozen=True)
+class ApiTask:
+    parsed_func: ParsedFunc
+    executor: Optional[Executor] = None
+    batcher: Optional[MicroBatcher] = None
+    job_queue: Optional[JobQueue] = None
+    admission: Optional[TaskAdmission] = None
+
+    def admit(self) -> AsyncContextManager[None]:
+        return self.admission.admit() if self.admission is not None else nullcontext()
+
+
+class InvalidRequestError(Exception):
+    pass
+
+
+class _RangeNotSatisfiableError(Exception):
+    pass
+
+
+def _error(status_code: int, err: Exception) -> JSONResponse:
+    return JSONResponse(
+        {"error": str(err), "error_type": type(err).__name__}, status_code=status_code
+    )
+
+
+def _task_error(err: Exception) -> JSONResponse:
+    # 排队已满时客户端应该稍后重试；排队超时说明服务过载
+    if isinstance(err, QueueFullError):
+        return _error(429, err)
+    if isinstance(err, QueueTimeoutError):
+        return _error(503, err)
+    if isinstance(err, TaskTimeoutError):
+        return _error(504, err)
+    if isinstance(err, TaskCancelledError):
+        return _error(503, err)
+    return _error(500, err)
+
+
+def _type_name(annotation: ParamAnnotation) -> str:
+    if is_user_input_file(annotation):
+        return "file"
+    tp = annotation.real_source_type
+    return getattr(tp, "__name__", str(tp))
+
+
+def _admission_stats(admission: TaskAdmission) -> Dict[str, Any]:
+    stats = admission.stats()
+    return {**dataclasses.asdict(stats), "mean_wait": stats.mean_wait}
+
+
+def _describe(task: ApiTask) -> Dict[str, Any]:
+    metadata = task.parsed_func.get_metadata()
+    return {
+        "name": metadata.name,
+        "params": [
+            {"name": param.name, "type": _type_name(param.annotation)}
+            for param in metadata.non_injected_params
+        ],
+        "stream": task.parsed_func.is_stream,
+        "job": task.job_queue is not None,
+        # 当前排队和执行中的请求数、排队时间
+        "admission": (
+            _admission_stats(task.admission) if task.admission is not None else None
+        ),
+    }
+
+
+async def _save_upload(upload: UploadFile, target_dir: Path) -> Path:
+    # starlette 已经把上传的内容流式写入了临时文件，这里再写成一个有路径的文件交给任务
+    target = target_dir / Path(upload.filename or "upload").name
+    await upload.seek(0)
+    with target.open("wb") as f:
+        await asyncio.to_thread(shutil.copyfileobj, upload.file, f)
+    return target
+
+
+async def _read_args(
+    request: Request, params: List[FuncParam], upload_dir: Path
+) -> Dict[str, Any]:
+    # JSON 请求体中的值按参数名传入；上传文件时使用 multipart/form-data，文件字段名为参数名
+    # 文件参数只能通过上传提供，不能传入服务器上的路径
+    file_params = {
+        param.name for param in params if is_user_input_file(param.annotation)
+    }
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        args: Dict[str, Any] = {}
+        for name, value in form.items():
+            if isinstance(value, UploadFile):
+                if name not in file_params:
+                    raise InvalidRequestError(_("参数 {} 不是文件").format(name))
+                args[name] = await _save_upload(value, upload_dir)
+            elif name in file_params:
+                raise InvalidRequestError(_("参数 {} 需要上传文件").format(name))
+            else:
+                args[name] = value
+        return args
+    try:
+        body = await request.json() if await request.body() else {}
+    except ValueError as err:
+        raise InvalidRequestError(_("请求体不是有效的 JSON: {}").format(err))
+    if not isinstance(body, dict):
+        raise InvalidRequestError(_("请求体必须是 JSON 对象"))
+    uploaded = file_params & body.keys()
+    if uploaded:
+        raise InvalidRequestError(
+            _("文件参数 {} 需要通过 multipart/form-data 上传").format(
+                ", ".join(sorted(uploaded))
+            )
+        )
+    return body
+
+
+def _fill(params: List[FuncParam], args: Dict[str, Any]):
+    missing = [param.name for param in params if param.name not in args]
+    if missing:
+        raise InvalidRequestError(_("缺少参数 {}").format(", ".join(missing)))
+    try:
+        fill_params(params, [args[param.name] for param in params])
+    except InvalidParamError as err:
+        raise InvalidRequestError(str(err)) from err
+
+
+async def _execute(task: ApiTask, session: TaskSession) -> Any:
+    if task.executor is not None:
+        return await asyncio.wrap_future(session.submit(task.executor))
+    if session.is_async:
+        return await session.acall()
+    return await asyncio.to_thread(session)
+
+
+def _content_disposition(filename: str) -> Dict[str, str]:
+    return {"content-disposition": f"attachment; filename*=utf-8''{quote(filename)}"}
+
+
+class _Encoder:
+    # 把任务的输出转换为 JSON；文件保存到 artifact store，返回下载地址
+    def __init__(self, request: Request, store: ArtifactStore):
+        self._request = request
+        self._store = store
+
+    def artifact(self, path: Path) -> Dict[str, Any]:
+        artifact_id = path.parent.name
+        return {
+            "artifact_id": artifact_id,
+            "filename": path.name,
+            "url": str(self._request.url_for("get_artifact", artifact_id=artifact_id)),
+        }
+
+    def __call__(self, annotation: ParamAnnotation, res: Any) -> Any:
+        if is_file_output(annotation, res):
+            return self.artifact(keep_output(annotation, res, self._store))
+        return jsonable_encoder(res)
+
+
+def _file_response(annotation: ParamAnnotation, res: Any) -> Optional[Response]:
+    # 单次调用输出文件时直接返回文件内容；内存中的内容不经过磁盘
+    content = get_file_content(annotation)
+    if content is not None and is_file_content_value(res):
+        filename = content_filename(content)
+        body = res.getbuffer() if isinstance(res, io.BytesIO) else memoryview(res)
+        return Response(
+            body,  # type: ignore
+            media_type=content.media_type
+            or mimetypes.guess_type(filename)[0]
+            or "application/octet-stream",
+            headers=_content_disposition(filename),
+        )
+    if isinstance(res, Path) and is_output_file(annotation):
+        return FileResponse(res, filename=res.name)
+    return None
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    # 只支持单个范围（bytes=start-end、bytes=start-、bytes=-suffix），其他格式返回整个文件
+    unit, _sep, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if not first:
+            suffix = int(last)
+            if suffix <= 0 or size == 0:
+                raise _RangeNotSatisfiableError(header)
+            return max(size - suffix, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        raise _RangeNotSatisfiableError(header)
+    return start, min(end, size - 1)
+
+
+async def _iter_file(path: Path, start: int, length: int) -> AsyncIterator[bytes]:
+    with path.open("rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = await asyncio.to_thread(f.read, min(_RANGE_CHUNK_SIZE, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+def _artifact_response(request: Request, path: Path) -> Response:
+    # starlette 的 FileResponse 不处理 Range 请求头，断点续传和分段下载在这里返回 206
+    size = path.stat().st_size
+    header = request.headers.get("range")
+    try:
+        byte_range = _parse_range(header, size) if header else None
+    except _RangeNotSatisfiableError:
+        return Response(status_code=416, headers={"content-range": f"bytes */{size}"})
+    if byte_range is None:
+        return FileResponse(
+            path, filename=path.name, headers={"accept-ranges": "bytes"}
+        )
+    start, end = byte_range
+    return StreamingResponse(
+        _iter_file(path, start, end - start + 1),
+        status_code=206,
+        media_type=mimetypes.guess_type(path.name)[0] or "application/octet-stream",
+        headers={
+            **_content_disposition(path.name),
+            "accept-ranges": "bytes",
+            "content-range": f"bytes {start}-{end}/{size}",
+            "content-length": str(end - start + 1),
+        },
+    )
+
+
+def create_api_router(
+    tasks: List[ApiTask], store: ArtifactStore, job_queue: Optional[JobQueue] = None
+) -> APIRouter:
+    # 每个任务对应一个 JSON 接口，参数经过和页面相同的 validator 校验
+    router = APIRouter()
+    task_mapping = {task.parsed_func.name: task for task in tasks}
+
+    def _get_task(name: str) -> ApiTask:
+        task = task_mapping.get(name)
+        if task is None:
+            raise InvalidRequestError(_("任务 {} 不存在").format(name))
+        return task
+
+    @router.get("/tasks")
+    async def list_tasks():
+        return [_describe(task) for task in tasks]
+
+    async def _submit_job(task: ApiTask, request: Request) -> Response:
+        # 提交前先校验所有参数；全部通过后才把上传的文件保存到 job 自己的目录，job 执行时仍然存在
+        assert task.job_queue is not None
+        parsed_func = task.parsed_func
+        params = parsed_func.get_metadata().non_injected_params
+        with tempfile.TemporaryDirectory() as upload_dir:
+            args = await _read_args(request, params, Path(upload_dir))
+            missing = [param.name for param in params if param.name not in args]
+            if missing:
+                raise InvalidRequestError(_("缺少参数 {}").format(", ".join(missing)))
+            for param in params:
+                res = parsed_func.bulk_validate(param.name, [args[param.name]])
+                if res.has_error:
+                    raise InvalidRequestError(
+                        _("参数 {} 校验失败: {}").format(param.name, res.errors[0])
+                    )
+            values = [args[param.name] for param in params]
+            values = [
+                (
+                    str(task.job_queue.keep_input(value))
+                    if isinstance(value, Path)
+                    else value
+                )
+                for value in values
+            ]
+        job_id = task.job_queue.submit(parsed_func.name, values)
+        return JSONResponse({"job_id": job_id}, status_code=202)
+
+    async def _stream(
+        task: ApiTask, request: Request, stack: AsyncExitStack, session: TaskSession
+    ) -> AsyncIterator[bytes]:
+        # 每个输出为一行 JSON，执行失败时最后一行为错误信息
+        encoder = _Encoder(request, store)
+        annotation = session.meta_data.return_type_annotation
+        async with stack:
+            try:
+                async for item in session.astream():
+                    with measure(task.parsed_func.metrics, "reply"):
+                        line = json.dumps({"result": encoder(annotation, item)})
+                    yield line.encode() + b"\n"
+            except Exception as err:
+                line = json.dumps({"error": str(err), "error_type": type(err).__name__})
+                yield line.encode() + b"\n"
+
+    async def _call(task: ApiTask, request: Request) -> Response:
+        parsed_func = task.parsed_func
+        if task.batcher is not None:
+            return await _call_batcher(task, task.batcher, request)
+        async with AsyncExitStack() as stack:
+            upload_dir = stack.enter_context(tempfile.TemporaryDirectory())
+            # 生成器任务在输出结束后才释放执行额度
+            await stack.enter_async_context(task.admit())
+            session = await stack.enter_async_context(
+                parsed_func.enter_async_session(store)
+            )
+            params = session.meta_data.non_injected_params
+            _fill(params, await _read_args(request, params, Path(upload_dir)))
+            if session.is_stream:
+                # session 在输出结束后才关闭
+                response: Response = StreamingResponse(
+                    _stream(task, request, stack.pop_all(), session),
+                    media_type="application/x-ndjson",
+                )
+                return response
+            res = await _execute(task, session)
+            annotation = session.meta_data.return_type_annotation
+            with measure(parsed_func.metrics, "reply"):
+                return _file_response(annotation, res) or JSONResponse(
+                    {"result": _Encoder(request, store)(annotation, res)}
+                )
+
+    async def _call_batcher(
+        task: ApiTask, batcher: MicroBatcher, request: Request
+    ) -> Response:
+        # 单个请求只校验自己的参数，再由 MicroBatcher 和其他请求合并执行
+        parsed_func = task.parsed_func
+        param = parsed_func.get_metadata().non_injected_params[0]
+        with tempfile.TemporaryDirectory() as upload_dir:
+            args = await _read_args(request, [param], Path(upload_dir))
+            if param.name not in args:
+                raise InvalidRequestError(_("缺少参数 {}").format(param.name))
+            try:
+                item = parsed_func.validate_batch_item(args[param.name])
+            except Exception as err:
+                raise InvalidRequestError(
+                    _("参数 {} 校验失败: {}").format(param.name, err)
+                ) from err
+            async with task.admit():
+                res = await batcher.submit(item)
+        annotation = parsed_func.plan.return_type_annotation
+        with measure(parsed_func.metrics, "reply"):
+            return JSONResponse({"result": _Encoder(request, store)(annotation, res)})
+
+    @router.post("/tasks/{name}")
+    async def call_task(name: str, request: Request):
+        try:
+            task = _get_task(name)
+            if task.job_queue is not None:
+                return await _submit_job(task, request)
+            return await _call(task, request)
+        except InvalidRequestError as err:
+            return _error(404 if name not in task_mapping else 422, err)
+        except Exception as err:
+            return _task_error(err)
+
+    async def _run_row(
+        task: ApiTask, values: Union[List[Any], Exception], encoder: _Encoder
+    ) -> Dict[str, Any]:
+        if isinstance(values, Exception):
+            return {"ok": False, "error": str(values), "error_type": "ValidationError"}
+        parsed_func = task.parsed_func
+        annotation = parsed_func.plan.return_type_annotation
+        try:
+            async with task.admit():
+                if task.batcher is not None:
+                    res = await task.batcher.submit(values[0])
+                    return {"ok": True, "result": encoder(annotation, res)}
+                async with parsed_func.enter_async_session(store) as session:
+                    for param, value in zip(
+                        session.meta_data.non_injected_params, values
+                    ):
+                        param.fill_validated(value)
+                    res = await _execute(task, session)
+                    # 输出文件在 session 结束前保存到 artifact store
+                    return {"ok": True, "result": encoder(annotation, res)}
+        except Exception as err:
+            return {"ok": False, "error": str(err), "error_type": type(err).__name__}
+
+    @router.post("/tasks/{name}/batch")
+    async def call_task_batch(name: str, request: Request):
+        # 请求体为 {"items": [...]}，每一项为按参数名的对象或按顺序的数组；
+        # 参数按列整体校验，每一项的结果和错误按顺序返回
+        try:
+            task = _get_task(name)
+        except InvalidRequestError as err:
+            return _error(404, err)
+        parsed_func = task.parsed_func
+        params = parsed_func.get_metadata().non_injected_params
+        if parsed_func.is_stream or task.job_queue is not None:
+            return _error(
+                422, InvalidRequestError(_("生成器任务和 job 任务不支持 batch 接口"))
+            )
+        if any(is_user_input_file(param.annotation) for param in params):
+            return _error(
+                422, InvalidRequestError(_("有文件参数的任务不支持 batch 接口"))
+            )
+        try:
+            body = await request.json()
+        except ValueError as err:
+            return _error(422, err)
+        items = body.get("items") if isinstance(body, dict) else None
+        if not isinstance(items, list):
+            return _error(422, InvalidRequestError(_('请求体必须为 {"items": [...]}')))
+        names = [param.name for param in params]
+        items = [
+            (
+                item
+                if isinstance(item, (dict, list))
+                else ValueError(_("每一项必须是 JSON 对象或数组"))
+            )
+            for item in items
+        ]
+        if task.batcher is not None:
+            # batch 任务的每一项按单个元素校验，再由 MicroBatcher 合并执行
+            rows: List[Union[List[Any], Exception]] = []
+            for item in items:
+                try:
+                    if isinstance(item, Exception):
+                        raise item
+                    value = item[names[0]] if isinstance(item, dict) else item[0]
+                    rows.append([parsed_func.validate_batch_item(value)])
+                except Exception as err:
+                    rows.append(err)
+        else:
+            rows = validate_rows(parsed_func, names, items)
+        encoder = _Encoder(request, store)
+        semaphore = asyncio.Semaphore(_BATCH_CONCURRENCY)
+
+        async def _bounded(values: Union[List[Any], Exception]) -> Dict[str, Any]:
+            async with semaphore:
+                return await _run_row(task, values, encoder)
+
+        results = await asyncio.gather(*(_bounded(values) for values in rows))
+        return {"results": results}
+
+    def _job_result(request: Request, task_name: str, result: Any) -> Any:
+        # 输出文件和同步接口一样返回下载地址，不暴露服务器上的路径
+        task = task_mapping.get(task_name)
+        if task is None or not isinstance(result, str):
+            return result
+        annotation = task.parsed_func.plan.return_type_annotation
+        if not returns_file(annotation):
+            return result
+        path = Path(result)
+        if path.parent.parent != store.root:
+            return None
+        return _Encoder(request, store).artifact(path)
+
+    @router.get("/jobs/{job_id}")
+    async def get_job(job_id: str, request: Request):
+        record = job_queue.store.get(job_id) if job_queue is not None else None
+        if record is None:
+            return _error(404, InvalidRequestError(_("job {} 不存在").format(job_id)))
+        job = dataclasses.asdict(record)
+        if record.status == "succeeded":
+            job["result"] = _job_result(request, record.task, record.result)
+        return jsonable_encoder(job)
+
+    @router.get("/artifacts/{artifact_id}")
+    async def get_artifact(artifact_id: str, request: Request):
+        artifact = store.get(artifact_id)
+        if artifact is None:
+            return _error(
+                404, InvalidRequestError(_("文件 {} 不存在").format(artifact_id))
+            )
+        return _artifact_response(request, artifact.path)
+
+    return router
@@ -0,0 +1,82 @@
+import asyncio
+from concurrent.futures import Executor
+from typing import Any, Awaitable, Callable, List, Optional, Set, Tuple
+
+from pydantic import BaseModel, ConfigDict, Field
+
+from kirei.types import ParsedFunc
+
+
+class BatchConfig(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    max_batch_size: int = Field(default=16, ge=1)
+    # 单位为秒，凑不满一批时最多等待这么久就执行
+    max_wait: float = Field(default=0.01, ge=0)
+
+
+BatchRunner = Callable[[List[Any]], Awaitable[List[Any]]]
+
+
+def create_batch_runner(
+    parsed_func: ParsedFunc, executor: Optional[Executor] = None
+) -> BatchRunner:
+    async def run_batch(items: List[Any]) -> List[Any]:
+        async with parsed_func.enter_async_session() as session:
+            session.fill_batch(items)
+            if executor is not None:
+                return await asyncio.wrap_future(session.submit(executor))
+            elif session.is_async:
+                return await session.acall()
+            return await asyncio.to_thread(session)
+
+    return run_batch
+
+
+class MicroBatcher:
+    def __init__(self, run_batch: BatchRunner, config: BatchConfig):
+        self._run_batch = run_batch
+        self._config = config
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running: Set[asyncio.Task] = set()
+
+    async def submit(self, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self._config.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self._config.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch = self._pending[: self._config.max_batch_size]
+            self._pending = self._pending[self._config.max_batch_size :]
+            task = asyncio.ensure_future(self._execute(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _execute(self, batch: List[Tuple[Any, asyncio.Future]]):
+        try:
+            results = await self._run_batch([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(
+                    f"Batch task returned {len(results)} results for {len(batch)} items"
+                )
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as err:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(err)
+            return
+        for (_, future), res in zip(batch, results):
+            if not future.done():
+                future.set_result(res)
@@ -5,7 +5,7 @@ from typing import Callable, Dict, List, Type, Union
 
 import gradio as gr
 
-from kirei.types.basic_types import PathType
+from kirei.types.basic_types import FileContent, PathType
 from kirei.types.function import FuncParam
 from kirei.types.function._param_annotation import ParamAnnotation
 
@@ -108,10 +108,17 @@ def _annotation_file_generator(param: ParamAnnotation):
     return gr.File(label="输出")
 
 
+def _annotation_file_content_generator(param: ParamAnnotation):
+    if not param.get_tp_info(FileContent):
+        return NotImplemented
+    return gr.File(label="输出")
+
+
 def get_default_output_generator_collection() -> OutputComponentGeneratorCollection:
     return (
         OutputComponentGeneratorCollection()
         .register(_annotation_component_generator)
         .register(_annotation_file_generator)
+        .register(_annotation_file_content_generator)
         .register(_annotation_text_generator)
     )
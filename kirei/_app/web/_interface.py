@@ -0,0 +1,295 @@
+import asyncio
+from concurrent.futures import Executor
+import dataclasses
+import functools
+import gettext
+import inspect
+from pathlib import Path
+import tempfile
+from typing import Any, Callable, List, Optional, Tuple
+
+import gradio as gr
+
+from kirei._app._task_io import returns_file
+from kirei._app.web._admission import AdmissionRejectedError, TaskAdmission
+from kirei._app.web._batch import MicroBatcher
+from kirei._app.web._jobs import JobQueue
+from kirei._app.web._component import (
+    get_default_input_generator_collection,
+    get_default_output_generator_collection,
+)
+from kirei.types import ParsedFunc
+from kirei.types.function._artifact import ArtifactStore
+from kirei.types.function._cache import is_user_input_file
+from kirei.types.function._file_content import (
+    content_filename,
+    get_file_content,
+    is_file_content_value,
+    write_content,
+)
+from kirei.types.function._func_parser import TaskSession
+from kirei.types.function._metrics import measure
+from kirei.types.function._param_annotation import ParamAnnotation
+
+_ = gettext.gettext
+_input_component_generator = get_default_input_generator_collection()
+_output_component_generator = get_default_output_generator_collection()
+
+_GrComponent = gr.components.Component
+
+
+def _to_gradio_output(
+    res, annotation: ParamAnnotation, store: Optional[ArtifactStore] = None
+):
+    content = get_file_content(annotation)
+    if content is not None and is_file_content_value(res):
+        # gradio 只能通过文件提供下载：内存中的内容直接写入 artifact store，
+        # store 默认位于 gradio 的上传目录下，gradio 不会再复制一次
+        return str(_write_content(res, content_filename(content), store))
+    # HACK: gradio 不支持 pathlib.Path 类型，需要转换为 str
+    if isinstance(res, Path):
+        return str(res)
+    return res
+
+
+def _write_content(res: Any, filename: str, store: Optional[ArtifactStore]) -> Path:
+    if store is not None:
+        return store.put_content(res, filename).path
+    target = Path(tempfile.mkdtemp()) / filename
+    write_content(res, target)
+    return target
+
+
+def render_interface(
+    parsed_func: ParsedFunc,
+    executor: Optional[Executor] = None,
+    batcher: Optional[MicroBatcher] = None,
+    store: Optional[ArtifactStore] = None,
+    stream_max_chars: int = 65536,
+    admission: Optional[TaskAdmission] = None,
+):
+    # 在当前的 gr.Blocks 中创建任务的界面；不使用 gr.Interface，每个 gr.Interface 都是一个
+    # 独立的 Blocks，创建时会构建自己的 FastAPI 应用，任务很多时启动非常慢
+    metadata = parsed_func.get_metadata()
+
+    return_annotation = metadata.return_type_annotation
+
+    def _output(session: TaskSession, res):
+        with measure(parsed_func.metrics, "reply"):
+            output = _to_gradio_output(res, return_annotation, store)
+        if not parsed_func.is_profiled:
+            return output
+        report = session.profile_report
+        if report is None:
+            return output, "", None
+        return (
+            output,
+            report.format(),
+            [str(report.prof_path), str(report.collapsed_path)],
+        )
+
+    def _func(*args):
+        with parsed_func.enter_session(store) as session:
+            for param, arg in zip(session.meta_data.non_injected_params, args):
+                param.fill(arg)
+            return _output(session, session())
+
+    async def _async_func(*args):
+        # 异步任务直接在 gradio 的 event loop 上执行，不占用 worker 线程
+        async with parsed_func.enter_async_session(store) as session:
+            for param, arg in zip(session.meta_data.non_injected_params, args):
+                param.fill(arg)
+            return _output(session, await session.acall())
+
+    async def _executor_func(*args):
+        # 参数在当前进程校验、注入，任务函数本身交给 executor 执行
+        async with parsed_func.enter_async_session(store) as session:
+            for param, arg in zip(session.meta_data.non_injected_params, args):
+                param.fill(arg)
+            res = await asyncio.wrap_future(session.submit(executor))
+            return _output(session, res)
+
+    async def _stream_func(*args):
+        # 每产生一个输出就推送到页面；字符串输出累积显示，只保留末尾的 stream_max_chars 个字符
+        async with parsed_func.enter_async_session(store) as session:
+            for param, arg in zip(session.meta_data.non_injected_params, args):
+                param.fill(arg)
+            text = ""
+            async for item in session.astream():
+                with measure(parsed_func.metrics, "reply"):
+                    if isinstance(item, str):
+                        text = (f"{text}\n{item}" if text else item)[-stream_max_chars:]
+                        output = text
+                    else:
+                        output = _to_gradio_output(item, return_annotation, store)
+                yield output
+
+    async def _batch_func(arg):
+        # 单个请求只校验自己的参数，校验失败不会影响同一批次的其他请求
+        assert batcher is not None
+        item = parsed_func.validate_batch_item(arg)
+        res = await batcher.submit(item)
+        with measure(parsed_func.metrics, "reply"):
+            return _to_gradio_output(res, return_annotation, store)
+
+    if parsed_func.is_stream:
+        handler = _stream_func
+    elif batcher is not None:
+        handler = _batch_func
+    elif executor is not None:
+        handler = _executor_func
+    elif parsed_func.is_async:
+        handler = _async_func
+    else:
+        handler = _func
+    # 异步任务和交给 executor 的任务不占用 gradio 的线程，不需要默认的单并发限制
+    concurrency_limit = "default" if handler is _func else None
+    if admission is not None:
+        # 并发数和排队由 admission 控制，gradio 不再限制
+        handler = _admit(handler, admission)
+        concurrency_limit = None
+
+    with gr.Row():
+        with gr.Column():
+            input_components: List[_GrComponent] = [
+                _input_component_generator(param)
+                for param in metadata.non_injected_params
+            ]
+            submit_button = gr.Button(_("提交"), variant="primary")
+        with gr.Column():
+            output_components = [
+                _output_component_generator(metadata.return_type_annotation)
+            ]
+            if parsed_func.is_profiled:
+                output_components += [
+                    gr.Textbox(label="profile", lines=10),
+                    gr.File(label="profile files", file_count="multiple"),
+                ]
+    submit_button.click(
+        handler,
+        input_components,
+        output_components,
+        api_name=metadata.name,
+        concurrency_limit=concurrency_limit,
+    )
+
+
+def _admit(handler, admission: TaskAdmission):
+    # 取得执行额度后才执行任务，被拒绝时在页面上显示原因；同步任务交给线程执行
+    if inspect.isasyncgenfunction(handler):
+
+        @functools.wraps(handler)
+        async def _stream_handler(*args):
+            try:
+                async with admission.admit():
+                    async for output in handler(*args):
+                        yield output
+            except AdmissionRejectedError as err:
+                raise gr.Error(str(err)) from err
+
+        return _stream_handler
+
+    @functools.wraps(handler)
+    async def _handler(*args):
+        try:
+            async with admission.admit():
+                if inspect.iscoroutinefunction(handler):
+                    return await handler(*args)
+                return await asyncio.to_thread(handler, *args)
+        except AdmissionRejectedError as err:
+            raise gr.Error(str(err)) from err
+
+    return _handler
+
+
+def render_job_interface(parsed_func: ParsedFunc, queue: JobQueue):
+    # 提交后立即返回 job id，任务在后台执行，关闭页面或重启服务后仍可以用 job id 查询结果
+    metadata = parsed_func.get_metadata()
+    params = metadata.non_injected_params
+
+    def _submit(*args):
+        # 提交前先校验参数，校验失败时直接返回错误而不是创建一个注定失败的 job
+        # 全部参数通过校验后才把上传的文件保存到 job 自己的目录，job 执行时仍然存在
+        for param, arg in zip(params, args):
+            res = parsed_func.bulk_validate(param.name, [arg])
+            if res.has_error:
+                raise gr.Error(str(res.errors[0]))
+        values = [
+            (
+                str(queue.keep_input(Path(arg)))
+                if arg is not None and is_user_input_file(param.annotation)
+                else arg
+            )
+            for param, arg in zip(params, args)
+        ]
+        return queue.submit(metadata.name, values)
+
+    def _query(job_id: str):
+        record = queue.store.get(job_id.strip())
+        if record is None:
+            raise gr.Error(_("job {} 不存在").format(job_id))
+        status = dataclasses.asdict(record)
+        result = status.pop("result")
+        if record.status != "succeeded":
+            return status, None
+        # 输出文件保存在 artifact store 中，可能已经被淘汰
+        if returns_file(metadata.return_type_annotation) and not (
+            isinstance(result, str) and Path(result).is_file()
+        ):
+            result = None
+        return status, result
+
+    input_components = [
+        _input_component_generator(param) for param in metadata.non_injected_params
+    ]
+    submit_button = gr.Button(_("提交"), variant="primary")
+    job_id = gr.Textbox(label="job id", interactive=True)
+    query_button = gr.Button(_("查询"))
+    status = gr.JSON(label=_("状态"))
+    output = _output_component_generator(metadata.return_type_annotation)
+    submit_button.click(
+        _submit,
+        input_components,
+        job_id,
+        api_name=f"{metadata.name}_submit",
+        concurrency_limit=None,
+    ).success(_query, job_id, [status, output], api_name=False)
+    query_button.click(
+        _query,
+        job_id,
+        [status, output],
+        api_name=f"{metadata.name}_status",
+        concurrency_limit=None,
+    )
+
+
+def generate_tabs(tabs: List[Tuple[str, Callable[[], None]]], lazy: bool = True):
+    # lazy 时每个标签页的内容在第一次打开时才创建，之后不再重新创建；
+    # 这样创建的事件只属于打开它的页面，不能通过 gradio 的 API 调用
+    with gr.Blocks(title="kirei") as blocks:
+        with gr.Tabs():
+            for i, (name, render) in enumerate(tabs):
+                with gr.Tab(name) as tab:
+                    if not lazy:
+                        render()
+                        continue
+                    opened = gr.State(False)
+                    tab.select(_mark_opened, None, opened, queue=False, show_api=False)
+                    if i == 0:
+                        # 第一个标签页在打开页面时就显示，不会触发 select
+                        blocks.load(
+                            _mark_opened, None, opened, queue=False, show_api=False
+                        )
+                    _render_when_opened(render, opened)
+    return blocks
+
+
+def _mark_opened() -> bool:
+    return True
+
+
+def _render_when_opened(render: Callable[[], None], opened: gr.State):
+    @gr.render(inputs=opened, triggers=[opened.change])
+    def _render(is_opened: bool):
+        if is_opened:
+            render()
@@ -0,0 +1,320 @@
+import asyncio
+from concurrent.futures import Executor
+from contextlib import closing
+from dataclasses import dataclass
+import functools
+import json
+import logging
+from pathlib import Path
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple
+import uuid
+
+from pydantic import BaseModel, ConfigDict, Field
+
+from kirei._app._task_io import fill_params, keep_output
+from kirei.types import ParsedFunc
+from kirei.types.function import ArtifactStore, JobProgress
+from kirei.types.function._artifact import link_or_copy
+from kirei.types.function._func_parser import TaskSession
+from kirei.types.function._progress import report_progress
+
+JobStatus = Literal["queued", "running", "succeeded", "failed"]
+JobRunner = Callable[[str, List[Any], JobProgress], Any]
+
+_logger = logging.getLogger(__name__)
+
+# 只更新进度比例时，两次写入数据库的最小间隔（秒）
+_PROGRESS_INTERVAL = 0.2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    task TEXT NOT NULL,
+    args TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL,
+    message TEXT,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, seq);
+"""
+
+
+class JobConfig(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    # 同一个任务同时执行的 job 数，None 表示只受 job worker 数的限制
+    max_concurrency: Optional[int] = Field(default=None, ge=1)
+
+
+@dataclass(frozen=True)
+class JobRecord:
+    id: str
+    task: str
+    status: JobStatus
+    progress: Optional[float]
+    message: Optional[str]
+    result: Any
+    error: Optional[str]
+    created_at: float
+    started_at: Optional[float]
+    finished_at: Optional[float]
+
+
+class JobStore:
+    # 每个线程使用自己的连接；WAL 模式下 worker 的写入不会阻塞状态查询
+    def __init__(self, path: Path):
+        self._path = path
+        self._local = threading.local()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # 建表使用单独的连接并立即关闭，不为创建 store 的线程保留连接
+        with closing(sqlite3.connect(path, timeout=30)) as conn, conn:
+            conn.executescript(_SCHEMA)
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def submit(self, task: str, args: List[Any]) -> str:
+        job_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, task, args, status, created_at) "
+                "VALUES (?, ?, ?, 'queued', ?)",
+                (job_id, task, json.dumps(args, default=str), time.time()),
+            )
+        return job_id
+
+    def recover(self) -> int:
+        # 上次退出时仍在执行的 job 重新排队
+        with self._connect() as conn:
+            return conn.execute(
+                "UPDATE jobs SET status = 'queued', started_at = NULL "
+                "WHERE status = 'running'"
+            ).rowcount
+
+    def claim(self, tasks: List[str]) -> Optional[Tuple[str, str, List[Any]]]:
+        # 取出 tasks 中最早排队的一个 job 并标记为执行中
+        if not tasks:
+            return None
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, task, args FROM jobs WHERE status = 'queued' "
+                f"AND task IN ({', '.join('?' * len(tasks))}) ORDER BY seq LIMIT 1",
+                tasks,
+            ).fetchone()
+            if row is None:
+                return None
+            job_id, task, args = row
+            conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?",
+                (time.time(), job_id),
+            )
+        return job_id, task, json.loads(args)
+
+    def set_progress(
+        self, job_id: str, fraction: Optional[float], message: Optional[str]
+    ):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET progress = COALESCE(?, progress), "
+                "message = COALESCE(?, message) WHERE id = ?",
+                (fraction, message, job_id),
+            )
+
+    def finish(self, job_id: str, result: Any):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'succeeded', progress = 1, result = ?, "
+                "finished_at = ? WHERE id = ?",
+                (json.dumps(result, default=str), time.time(), job_id),
+            )
+
+    def fail(self, job_id: str, error: str):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? "
+                "WHERE id = ?",
+                (error, time.time(), job_id),
+            )
+
+    def get(self, job_id: str) -> Optional[JobRecord]:
+        row = (
+            self._connect()
+            .execute(
+                "SELECT id, task, status, progress, message, result, error, "
+                "created_at, started_at, finished_at FROM jobs WHERE id = ?",
+                (job_id,),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        result = json.loads(row[5]) if row[5] is not None else None
+        return JobRecord(*row[:5], result, *row[6:])  # type: ignore
+
+
+@functools.lru_cache(maxsize=None)
+def _get_store(path: Path) -> JobStore:
+    return JobStore(path)
+
+
+class _ProgressReporter:
+    # 只保存数据库路径和 job id，可以被 pickle 到执行任务的子进程中
+    def __init__(self, path: Path, job_id: str):
+        self._path = path
+        self._job_id = job_id
+        self._last_write = 0.0
+
+    def __call__(self, fraction: Optional[float], message: Optional[str]):
+        now = time.monotonic()
+        if message is None and now - self._last_write < _PROGRESS_INTERVAL:
+            return
+        self._last_write = now
+        _get_store(self._path).set_progress(self._job_id, fraction, message)
+
+
+class JobQueue:
+    def __init__(self, store: JobStore, workers: int, input_dir: Path):
+        if workers < 1:
+            raise ValueError("workers must be positive")
+        self._store = store
+        self._workers = workers
+        self._input_dir = input_dir
+        self._runners: Dict[str, Tuple[JobRunner, Optional[int]]] = {}
+        self._running: Dict[str, int] = {}
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._stopped = False
+
+    @property
+    def store(self) -> JobStore:
+        return self._store
+
+    def keep_input(self, path: Path) -> Path:
+        # 上传的文件保存在 job 自己的目录中，不会在 job 执行前被 artifact store 淘汰
+        target_dir = self._input_dir / uuid.uuid4().hex
+        target_dir.mkdir(parents=True)
+        target = target_dir / path.name
+        link_or_copy(path, target)
+        return target
+
+    def register(self, task: str, runner: JobRunner, config: JobConfig):
+        self._runners[task] = (runner, config.max_concurrency)
+        return self
+
+    def submit(self, task: str, args: List[Any]) -> str:
+        assert task in self._runners, f"Task {task} is not registered"
+        job_id = self._store.submit(task, args)
+        with self._cond:
+            self._cond.notify()
+        return job_id
+
+    def start(self):
+        recovered = self._store.recover()
+        if recovered:
+            _logger.info("Requeued %d interrupted jobs", recovered)
+        for i in range(self._workers):
+            thread = threading.Thread(
+                target=self._work, name=f"kirei-job-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def shutdown(self):
+        # 不等待执行中的 job，它们在下次启动时会重新排队
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def _claim(self) -> Optional[Tuple[str, str, List[Any]]]:
+        available = [
+            task
+            for task, (_runner, limit) in self._runners.items()
+            if limit is None or self._running.get(task, 0) < limit
+        ]
+        job = self._store.claim(available)
+        if job is not None:
+            self._running[job[1]] = self._running.get(job[1], 0) + 1
+        return job
+
+    def _work(self):
+        while True:
+            with self._cond:
+                job = None
+                while not self._stopped and (job := self._claim()) is None:
+                    self._cond.wait()
+                if job is None:
+                    return
+            try:
+                self._run(*job)
+            finally:
+                with self._cond:
+                    self._running[job[1]] -= 1
+                    # 释放了这个任务的并发额度，其他 worker 可能可以取到新的 job
+                    self._cond.notify_all()
+
+    def _run(self, job_id: str, task: str, args: List[Any]):
+        runner, _limit = self._runners[task]
+        progress = JobProgress(_ProgressReporter(self._store.path, job_id))
+        try:
+            result = runner(job_id, args, progress)
+        except Exception as err:
+            if self._stopped:
+                # 服务退出导致的失败（例如进程池已关闭）不记录，下次启动时重新执行
+                return
+            _logger.exception("Job %s of task %s failed", job_id, task)
+            self._store.fail(job_id, f"{type(err).__name__}: {err}")
+            return
+        self._store.finish(job_id, result)
+
+
+def create_job_runner(
+    parsed_func: ParsedFunc, executor: Optional[Executor], store: ArtifactStore
+) -> JobRunner:
+    # 输出文件只保存一份：保存在 artifact store 中，通过和同步接口相同的下载地址取得
+    def _fill(session: TaskSession, args: List[Any]):
+        fill_params(session.meta_data.non_injected_params, args)
+
+    def _keep(session: TaskSession, res: Any) -> Any:
+        return keep_output(session.meta_data.return_type_annotation, res, store)
+
+    async def _arun(args: List[Any]) -> Any:
+        async with parsed_func.enter_async_session(store) as session:
+            _fill(session, args)
+            if executor is not None:
+                res = await asyncio.wrap_future(session.submit(executor))
+            else:
+                res = await session.acall()
+            return _keep(session, res)
+
+    def run(job_id: str, args: List[Any], progress: JobProgress) -> Any:
+        with report_progress(progress):
+            if parsed_func.is_async:
+                return asyncio.run(_arun(args))
+            with parsed_func.enter_session(store) as session:
+                _fill(session, args)
+                if executor is not None:
+                    res = session.submit(executor).result()
+                else:
+                    res = session()
+                return _keep(session, res)
+
+    return run
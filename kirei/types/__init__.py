@@ -1,7 +1,7 @@
 from abc import ABC, abstractmethod
 import gettext
 import pathlib
-from typing import Annotated, Callable, TypeVar
+from typing import Annotated, Callable, Iterator, TypeVar
 from kirei.types.function import (
     ParamInquirerCollection as ParamInquirerCollection,
     FuncParam as FuncParam,
@@ -10,11 +10,23 @@ from kirei.types.function import (
     ParamAnnotation as ParamAnnotation,
 )
 from kirei.types.function._replier import ReplierCollection as ReplierCollection
-from kirei.types.basic_types import PathType
+from kirei.types.basic_types import (
+    FileContent as FileContent,
+    FileReader,
+    PathType,
+)
 
 UserInputFilePath = Annotated[pathlib.Path, PathType(type="user_input_file")]
 OutputFilePath = Annotated[pathlib.Path, PathType(type="out_file")]
 TempDirPath = Annotated[pathlib.Path, PathType(type="temp_dir")]
+# 以下类型和 UserInputFilePath 一样由用户提供文件，任务得到的是在 session 中打开的文件内容，
+# 不需要一次读入内存
+UserInputFileBuffer = Annotated[memoryview, FileReader(mode="mmap")]
+UserInputFileChunks = Annotated[Iterator[bytes], FileReader(mode="chunks")]
+UserInputFileLines = Annotated[Iterator[str], FileReader(mode="lines")]
+# 任务返回内存中的文件内容（bytes、BytesIO 或 memoryview），
+# 需要指定文件名时使用 Annotated[bytes, FileContent(filename=..., media_type=...)]
+OutputFileBytes = Annotated[bytes, FileContent()]
 
 
 Task = Callable  # Any callable is a valid Task
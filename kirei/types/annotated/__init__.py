@@ -4,8 +4,12 @@ from kirei.types.annotated._validator import (
     AnyValidator as AnyValidator,
     ValidatorChain as ValidatorChain,
     TypeValidatorProvider as TypeValidatorProvider,
+    CompiledValidator as CompiledValidator,
+    BulkValidator as BulkValidator,
+    BulkValidationResult as BulkValidationResult,
 )
 from kirei.types.basic_types import PathType, Path
+import pydantic
 
 
 def _validate_path_type(path_type: PathType, path: Path):
@@ -14,8 +18,16 @@ def _validate_path_type(path_type: PathType, path: Path):
     return path
 
 
-def get_default_validator_provider() -> ValidatorProvider:
-    provider = ValidatorProvider().push_after_partial_validator(
-        Path, PathType, _validate_path_type
+def _path_type_metadata(path_type: PathType):
+    if path_type.type == "user_input_file":
+        return pydantic.types.PathType("file")
+    return None
+
+
+def get_default_validator_provider(compiled: bool = True) -> ValidatorProvider:
+    provider = (
+        ValidatorProvider(compiled)
+        .push_after_partial_validator(Path, PathType, _validate_path_type)
+        .register_constraint_metadata(PathType, _path_type_metadata)
     )
     return provider
@@ -1,5 +1,6 @@
 from typing import (
     Any,
+    Iterable,
     Callable,
     Dict,
     Generic,
@@ -8,10 +9,20 @@ from typing import (
     Literal,
     Optional,
     Sequence,
+    Set,
     Type,
     Union,
     cast,
 )
+from dataclasses import dataclass
+from pydantic import (
+    ConfigDict,
+    GetCoreSchemaHandler,
+    PydanticUserError,
+    TypeAdapter,
+    ValidationError,
+)
+from pydantic_core import CoreSchema, core_schema
 from typing_extensions import Annotated, TypeVar, get_args, get_origin
 
 
@@ -25,6 +36,26 @@ AnyValidatorGenerator = Callable[[_InfoT], AnyValidator[_TargetT]]
 ValidatorType = Literal["after", "pre"]
 PartialPreValidator = Callable[[_InfoT, Any], _TargetT]
 PartialAfterValidator = Callable[[_InfoT, _TargetT], _TargetT]
+# 将约束信息转换为 pydantic 能识别的 Annotated 元数据，返回 None 表示没有需要检查的约束
+ConstraintMetadataConverter = Callable[[_InfoT], Optional[Any]]
+
+# 值先经过类型的构造函数（和 python 校验链的初始校验器相同），再由 pydantic 检查约束，
+# 因此接受的输入和转换结果与 python 校验链一致；构造函数得到的 Decimal('NaN') 等值也被接受
+_COMPILED_CONFIG = ConfigDict(allow_inf_nan=True)
+# 只经过构造函数校验时，这些 numpy dtype 的列不需要校验，直接转换为 python 对象
+_PASSTHROUGH_DTYPE_KINDS: Dict[Type, str] = {int: "iu", float: "f", str: "U"}
+
+
+@dataclass(frozen=True)
+class _Construct:
+    # pydantic 的元数据：校验前先调用类型的构造函数；不使用 BeforeValidator，
+    # 它会检查函数签名，Path 等构造函数的签名无法识别
+    tp: Type
+
+    def __get_pydantic_core_schema__(
+        self, source: Any, handler: GetCoreSchemaHandler
+    ) -> CoreSchema:
+        return core_schema.no_info_before_validator_function(self.tp, handler(source))
 
 
 class ValidatorChain(Sequence[AnyValidator[_TargetT]]):
@@ -57,6 +88,107 @@ class ValidatorChain(Sequence[AnyValidator[_TargetT]]):
         return self
 
 
+class CompiledValidator(Generic[_TargetT]):
+    # 类型转换和所有约束检查编译为一个 pydantic-core 校验器，一次调用完成
+    def __init__(self, adapter: TypeAdapter):
+        self._adapter = adapter
+        self._validate = adapter.validator.validate_python
+
+    @property
+    def adapter(self) -> TypeAdapter:
+        return self._adapter
+
+    def __call__(self, data: Any) -> _TargetT:
+        return self._validate(data)
+
+
+@dataclass(frozen=True)
+class BulkValidationResult(Generic[_TargetT]):
+    # 校验失败的行 values 为 None，errors 中为对应的异常
+    values: List[Optional[_TargetT]]
+    errors: List[Optional[Exception]]
+
+    @property
+    def error_mask(self) -> List[bool]:
+        return [err is not None for err in self.errors]
+
+    @property
+    def has_error(self) -> bool:
+        return any(err is not None for err in self.errors)
+
+
+class BulkValidator(Generic[_TargetT]):
+    # 对一整列参数值进行校验，列可以是 list、任意可迭代对象或 numpy 数组
+    def __init__(
+        self,
+        item_validator: Callable[[Any], _TargetT],
+        list_adapter: Optional[TypeAdapter] = None,
+        passthrough_dtype_kinds: str = "",
+    ):
+        self._item_validator = item_validator
+        self._validate_list = (
+            list_adapter.validator.validate_python if list_adapter else None
+        )
+        self._passthrough_dtype_kinds = passthrough_dtype_kinds
+
+    def __call__(self, column: Iterable[Any]) -> BulkValidationResult[_TargetT]:
+        dtype = getattr(column, "dtype", None)
+        if dtype is not None and dtype.kind in self._passthrough_dtype_kinds:
+            values = column.tolist()  # type: ignore
+            return BulkValidationResult(values, [None] * len(values))
+        items = column.tolist() if hasattr(column, "tolist") else list(column)  # type: ignore
+        if self._validate_list is None:
+            return self._validate_each(items)
+        try:
+            values = self._validate_list(items)
+        except ValidationError as err:
+            failed = {e["loc"][0] for e in err.errors() if e["loc"]}
+            return self._validate_with_failures(items, failed)
+        except Exception:
+            # 构造函数抛出的 TypeError 等异常不会被 pydantic 转换，无法得知失败的行
+            return self._validate_each(items)
+        return BulkValidationResult(values, [None] * len(values))
+
+    def _validate_each(self, items: List[Any]) -> BulkValidationResult[_TargetT]:
+        values: List[Optional[_TargetT]] = []
+        errors: List[Optional[Exception]] = []
+        for item in items:
+            try:
+                values.append(self._item_validator(item))
+                errors.append(None)
+            except Exception as err:
+                values.append(None)
+                errors.append(err)
+        return BulkValidationResult(values, errors)
+
+    def _validate_with_failures(
+        self, items: List[Any], failed: Set[Any]
+    ) -> BulkValidationResult[_TargetT]:
+        # 失败的行逐个校验以得到各自的异常，其余的行再整体校验一次
+        assert self._validate_list is not None
+        if not failed:
+            return self._validate_each(items)
+        passed = [item for i, item in enumerate(items) if i not in failed]
+        try:
+            passed_values = iter(self._validate_list(passed))
+        except Exception:
+            return self._validate_each(items)
+        values: List[Optional[_TargetT]] = []
+        errors: List[Optional[Exception]] = []
+        for i, item in enumerate(items):
+            if i not in failed:
+                values.append(next(passed_values))
+                errors.append(None)
+                continue
+            try:
+                values.append(self._item_validator(item))
+                errors.append(None)
+            except Exception as err:
+                values.append(None)
+                errors.append(err)
+        return BulkValidationResult(values, errors)
+
+
 class TypeValidatorProvider(Generic[_TargetT]):
     def __init__(self, initial_validator: PreValidator[_TargetT]):
         self._initial_validator = initial_validator
@@ -86,6 +218,12 @@ class TypeValidatorProvider(Generic[_TargetT]):
             return None
         return generator(info)
 
+    def has_custom_initial_validator(self, tp: Type) -> bool:
+        return self._initial_validator is not tp
+
+    def has_info_validator(self, info: Any) -> bool:
+        return info.__class__ in self._validator_generator_mapping
+
     def get_validator(self, *infos: Any):
         validator_chain = ValidatorChain([self._initial_validator])
         for info in infos:
@@ -101,8 +239,13 @@ class TypeValidatorProvider(Generic[_TargetT]):
 
 
 class ValidatorProvider:
-    def __init__(self):
+    def __init__(self, compiled: bool = True):
+        # compiled 为 True 时，有约束的参数类型尽量编译为 pydantic 的 TypeAdapter，
+        # 无法编译（自定义的校验器、pydantic 不支持的类型）时退回到 python 的 ValidatorChain；
+        # 没有约束的类型直接使用构造函数，编译后只会多一次 pydantic 的调用
+        self._compiled = compiled
         self._tp_to_validator_provider: Dict[Type, TypeValidatorProvider] = {}
+        self._metadata_converters: Dict[Type, ConstraintMetadataConverter] = {}
 
     def push_pre_partial_validator(
         self,
@@ -132,6 +275,16 @@ class ValidatorProvider:
         )
         return self
 
+    def register_constraint_metadata(
+        self,
+        info_tp: Type[_InfoT],
+        converter: ConstraintMetadataConverter[_InfoT],
+    ):
+        # 注册了转换器的约束在编译时由 pydantic 检查，同一约束的 python 校验器只在退回时使用
+        assert info_tp not in self._metadata_converters
+        self._metadata_converters[info_tp] = converter
+        return self
+
     def reset_validator(self, tp: Type[_TargetT], validator: PreValidator[_TargetT]):
         self._tp_to_validator_provider[tp] = TypeValidatorProvider(validator)
         return self
@@ -157,7 +310,77 @@ class ValidatorProvider:
         else:
             raise NotImplementedError(f"Unsupported origin type: {t}")
 
+    def _is_compilable(
+        self, real_type: Type, provider: TypeValidatorProvider, constraints: List[Any]
+    ) -> bool:
+        if provider.has_custom_initial_validator(real_type):
+            return False
+        return all(
+            info.__class__ in self._metadata_converters
+            or not provider.has_info_validator(info)
+            for info in constraints
+        )
+
+    def _get_compiled_type(self, real_type: Type, constraints: List[Any]) -> Any:
+        return Annotated[
+            tuple(
+                [
+                    real_type,
+                    *self._get_constraint_metadata(constraints),
+                    # 放在最后，作为最外层先执行；约束仍然由 pydantic-core 在类型的 schema 中检查
+                    _Construct(real_type),
+                ]
+            )
+        ]
+
+    def _get_constraint_metadata(self, constraints: List[Any]) -> List[Any]:
+        metadata = []
+        for info in constraints:
+            converter = self._metadata_converters.get(info.__class__)
+            if converter is None:
+                # pydantic 会忽略无法识别的元数据，和 python 校验链的行为一致
+                metadata.append(info)
+                continue
+            converted = converter(info)
+            if converted is not None:
+                metadata.append(converted)
+        return metadata
+
+    def _compile(self, tp: Any) -> Optional[TypeAdapter]:
+        try:
+            return TypeAdapter(tp, config=_COMPILED_CONFIG)
+        except PydanticUserError:
+            return None
+
     def get_validator(self, t: Type[_TargetT]) -> Callable[[Any], _TargetT]:
         real_type = self._get_real_type(t)
         constraints = self._get_constraints(t)
-        return self._get_validator_provider(real_type).get_validator(*constraints)
+        provider = self._get_validator_provider(real_type)
+        if not self._compiled:
+            return provider.get_validator(*constraints)
+        if self._get_constraint_metadata(constraints) and self._is_compilable(
+            real_type, provider, constraints
+        ):
+            adapter = self._compile(self._get_compiled_type(real_type, constraints))
+            if adapter is not None:
+                return CompiledValidator(adapter)
+        chain = provider.get_validator(*constraints)
+        return chain[0] if len(chain) == 1 else chain
+
+    def get_bulk_validator(self, t: Type[_TargetT]) -> BulkValidator[_TargetT]:
+        # 可以编译时整列交给 pydantic-core 一次校验，否则逐个调用单值的校验器
+        item_validator = self.get_validator(t)
+        real_type = self._get_real_type(t)
+        constraints = self._get_constraints(t)
+        if not isinstance(item_validator, CompiledValidator):
+            # 校验器只有构造函数时，numpy 数组中这些 dtype 的列不需要逐个校验
+            return BulkValidator(
+                item_validator,
+                passthrough_dtype_kinds=(
+                    _PASSTHROUGH_DTYPE_KINDS.get(real_type, "")
+                    if item_validator is real_type
+                    else ""
+                ),
+            )
+        tp = self._get_compiled_type(real_type, constraints)
+        return BulkValidator(item_validator, self._compile(List[tp]))  # type: ignore
@@ -1,5 +1,5 @@
 import pathlib
-from typing import Literal
+from typing import Literal, Optional
 import pydantic
 from pydantic import StringConstraints as StringConstraints
 import decimal
@@ -14,3 +14,20 @@ Int = int
 
 class PathType(pydantic.BaseModel):
     type: Literal["temp_dir", "user_input_file", "out_file"]
+
+
+class FileReader(pydantic.BaseModel):
+    # 用户输入的文件不以路径的形式交给任务，而是在执行时打开：
+    # mmap 为只读的 memoryview，chunks 为按块读取的 bytes 迭代器，lines 为按行读取的 str 迭代器
+    model_config = pydantic.ConfigDict(frozen=True)
+    mode: Literal["mmap", "chunks", "lines"]
+    chunk_size: int = pydantic.Field(default=1024 * 1024, ge=1)
+    encoding: str = "utf-8"
+
+
+class FileContent(pydantic.BaseModel):
+    # 任务在内存中生成的文件内容（bytes、BytesIO 或 memoryview），不需要先写入临时文件
+    # filename 没有扩展名时根据 media_type 推断
+    model_config = pydantic.ConfigDict(frozen=True)
+    filename: str = "output"
+    media_type: Optional[str] = None
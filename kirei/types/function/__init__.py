@@ -11,5 +11,42 @@ from kirei.types.function._param_annotation import ParamAnnotation as ParamAnnot
 from kirei.types.function._injector import (
     get_default_context_collection as get_default_context_collection,
     ContextInjectorCollection as ContextInjectorCollection,
+    InjectorScope as InjectorScope,
     ParamInjectorCollection as ParamInjectorCollection,
+    InjectorLifetime as InjectorLifetime,
+    ContextManagerCreator as ContextManagerCreator,
+    InjectorMatcher as InjectorMatcher,
 )
+from kirei.types.function._executor import (
+    ExecutorType as ExecutorType,
+    ProcessTaskExecutor as ProcessTaskExecutor,
+)
+from kirei.types.function._artifact import (
+    Artifact as Artifact,
+    ArtifactStore as ArtifactStore,
+)
+from kirei.types.function._cache import (
+    ResultCache as ResultCache,
+    MemoryResultCache as MemoryResultCache,
+    DiskResultCache as DiskResultCache,
+)
+from kirei.types.function._single_flight import (
+    SingleFlightStats as SingleFlightStats,
+)
+from kirei.types.function._metrics import (
+    MetricsRegistry as MetricsRegistry,
+    TaskMetrics as TaskMetrics,
+    TaskMetricsSnapshot as TaskMetricsSnapshot,
+    HistogramSnapshot as HistogramSnapshot,
+)
+from kirei.types.function._progress import JobProgress as JobProgress
+from kirei.types.function._cancel import (
+    CancellationToken as CancellationToken,
+    TaskCancelledError as TaskCancelledError,
+    TaskTimeoutError as TaskTimeoutError,
+)
+from kirei.types.function._profiler import (
+    ProfileConfig as ProfileConfig,
+    ProfileReport as ProfileReport,
+)
+from kirei.types.function._registry import TaskRegistry as TaskRegistry
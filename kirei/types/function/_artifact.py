@@ -0,0 +1,201 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+import os
+from pathlib import Path
+import shutil
+import sys
+import threading
+import time
+from typing import Callable, Dict, Optional
+import uuid
+
+from kirei.types.function._file_content import FileContentValue, write_content
+
+# 正在写入的文件先放在这个前缀的目录中，写完后整体改名为 artifact id
+_WRITING_PREFIX = ".writing-"
+# linux 的 FICLONE ioctl，btrfs、xfs 等文件系统上可以写时复制地克隆文件
+_FICLONE = 0x40049409
+
+
+def _reflink(src: Path, dst: Path):
+    if sys.platform != "linux":
+        raise OSError("reflink is not supported")
+    import fcntl
+
+    # 只写入新建的文件，不能截断已经存在的文件（以及它的硬链接）
+    with src.open("rb") as fsrc, dst.open("xb") as fdst:
+        fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+
+
+def _link_or_copy(src: Path, dst: Path, hardlink: bool):
+    if hardlink:
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            pass
+    try:
+        _reflink(src, dst)
+        return
+    except OSError:
+        pass
+    shutil.copyfile(src, dst)
+
+
+def link_or_copy(src: Path, dst: Path, *, hardlink: bool = True):
+    # 同一文件系统上优先使用硬链接或 reflink，不复制文件内容；都不支持时才复制
+    # 硬链接和源文件共享内容，源文件之后可能被修改时应该传入 hardlink=False
+    # 先写入同一目录下的临时文件再替换 dst：dst 已经存在时只替换目录项，不修改它原来的内容
+    tmp = dst.with_name(f".{dst.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        _link_or_copy(src, tmp, hardlink)
+        os.replace(tmp, dst)
+    finally:
+        # 失败时，或者 tmp 和 dst 是同一个文件的硬链接（此时 os.replace 什么也不做）时删除 tmp
+        tmp.unlink(missing_ok=True)
+
+
+def _is_artifact_id(name: str) -> bool:
+    # 和 uuid.uuid4().hex 的格式一致
+    return len(name) == 32 and all(c in "0123456789abcdef" for c in name)
+
+
+@dataclass(frozen=True)
+class Artifact:
+    id: str
+    path: Path
+    size: int
+
+
+class ArtifactStore:
+    # 保存任务输出的文件，使其不受 session 临时目录的生命周期影响
+    # 超过 ttl 秒没有被访问、或者总大小/数量超出限制时，按最近最少访问的顺序删除
+    def __init__(
+        self,
+        root: Path,
+        *,
+        max_bytes: Optional[int] = None,
+        max_entries: Optional[int] = None,
+        ttl: Optional[float] = None,
+    ):
+        self._root = Path(root)
+        self._root.mkdir(parents=True, exist_ok=True)
+        self._max_bytes = max_bytes
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Artifact]" = OrderedDict()
+        self._accessed: Dict[str, float] = {}
+        self._total_bytes = 0
+        self._load()
+
+    @property
+    def root(self) -> Path:
+        return self._root
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def _load(self):
+        # 重启后继续管理上次留下的文件，以修改时间作为最近访问时间
+        # 只处理以 artifact id 命名的目录，root 中的其他文件和正在写入的目录不会被删除
+        found = []
+        for entry_dir in self._root.iterdir():
+            if not _is_artifact_id(entry_dir.name) or not entry_dir.is_dir():
+                continue
+            files = [f for f in entry_dir.iterdir() if f.is_file()]
+            if len(files) != 1:
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                continue
+            stat = files[0].stat()
+            found.append(
+                (stat.st_mtime, Artifact(entry_dir.name, files[0], stat.st_size))
+            )
+        for accessed, artifact in sorted(found, key=lambda item: item[0]):
+            self._add(artifact, accessed)
+        with self._lock:
+            self._evict(time.time())
+
+    def _add(self, artifact: Artifact, accessed: float):
+        self._entries[artifact.id] = artifact
+        self._accessed[artifact.id] = accessed
+        self._total_bytes += artifact.size
+
+    def put(self, path: Path) -> Artifact:
+        return self._put(path.name, lambda target: link_or_copy(path, target))
+
+    def put_content(self, value: FileContentValue, filename: str) -> Artifact:
+        # 内存中的文件内容直接写入 store，不经过临时文件
+        return self._put(filename, lambda target: write_content(value, target))
+
+    def _put(self, filename: str, write: Callable[[Path], None]) -> Artifact:
+        # 写完后才出现以 artifact id 命名的目录，其他进程不会取得或清理写了一半的文件
+        artifact_id = uuid.uuid4().hex
+        writing_dir = self._root / f"{_WRITING_PREFIX}{artifact_id}"
+        writing_dir.mkdir()
+        try:
+            write(writing_dir / filename)
+            os.rename(writing_dir, self._root / artifact_id)
+        except BaseException:
+            shutil.rmtree(writing_dir, ignore_errors=True)
+            raise
+        target = self._root / artifact_id / filename
+        artifact = Artifact(artifact_id, target, target.stat().st_size)
+        now = time.time()
+        with self._lock:
+            self._add(artifact, now)
+            self._evict(now)
+        return artifact
+
+    def get(self, artifact_id: str) -> Optional[Artifact]:
+        now = time.time()
+        with self._lock:
+            artifact = self._entries.get(artifact_id) or self._adopt(artifact_id, now)
+            if artifact is None:
+                return None
+            if self._is_expired(artifact_id, now):
+                self._delete(artifact_id)
+                return None
+            self._entries.move_to_end(artifact_id)
+            self._accessed[artifact_id] = now
+            return artifact
+
+    def _adopt(self, artifact_id: str, now: float) -> Optional[Artifact]:
+        # 多个进程共享同一个目录时，其他进程保存的文件也可以被取得
+        if not _is_artifact_id(artifact_id):
+            return None
+        entry_dir = self._root / artifact_id
+        files = (
+            [f for f in entry_dir.iterdir() if f.is_file()]
+            if entry_dir.is_dir()
+            else []
+        )
+        if len(files) != 1:
+            return None
+        artifact = Artifact(artifact_id, files[0], files[0].stat().st_size)
+        self._add(artifact, now)
+        return artifact
+
+    def _is_expired(self, artifact_id: str, now: float) -> bool:
+        return self._ttl is not None and self._accessed[artifact_id] + self._ttl < now
+
+    def _delete(self, artifact_id: str):
+        artifact = self._entries.pop(artifact_id)
+        del self._accessed[artifact_id]
+        self._total_bytes -= artifact.size
+        shutil.rmtree(self._root / artifact_id, ignore_errors=True)
+
+    def _evict(self, now: float):
+        # 刚加入的文件总是保留，即使它本身超出了大小限制
+        while len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            over_bytes = (
+                self._max_bytes is not None and self._total_bytes > self._max_bytes
+            )
+            over_entries = (
+                self._max_entries is not None and len(self._entries) > self._max_entries
+            )
+            if not (over_bytes or over_entries or self._is_expired(oldest, now)):
+                return
+            self._delete(oldest)
@@ -0,0 +1,198 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+import hashlib
+from pathlib import Path
+import pickle
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Iterable, Optional, Tuple
+
+from kirei.types.basic_types import PathType
+from kirei.types.function._artifact import link_or_copy
+from kirei.types.function._param_annotation import ParamAnnotation
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class CachedResult:
+    value: Any
+
+
+def is_user_input_file(annotation: ParamAnnotation) -> bool:
+    path_type = annotation.get_tp_info(PathType)
+    return bool(path_type and path_type.type == "user_input_file")
+
+
+def is_output_file(annotation: ParamAnnotation) -> bool:
+    path_type = annotation.get_tp_info(PathType)
+    return bool(path_type and path_type.type == "out_file")
+
+
+def make_invocation_key(
+    task_id: str, arguments: Iterable[Tuple[str, ParamAnnotation, Any]]
+) -> str:
+    # 用户上传的文件按内容计算 hash，相同内容的不同临时文件会得到相同的 key
+    hasher = hashlib.sha256(task_id.encode())
+    for name, annotation, value in arguments:
+        hasher.update(b"\0" + name.encode() + b"\0")
+        if isinstance(value, Path) and is_user_input_file(annotation):
+            hasher.update(b"file:")
+            with value.open("rb") as f:
+                while chunk := f.read(_HASH_CHUNK_SIZE):
+                    hasher.update(chunk)
+        else:
+            hasher.update(pickle.dumps(value, protocol=4))
+    return hasher.hexdigest()
+
+
+class ResultCache(ABC):
+    @abstractmethod
+    def get(self, key: str) -> Optional[CachedResult]: ...
+
+    @abstractmethod
+    def put(self, key: str, value: Any) -> None: ...
+
+    @abstractmethod
+    def put_artifact(self, key: str, path: Path) -> Path:
+        # 将任务输出的文件复制到缓存自己管理的目录中，返回复制后的路径
+        ...
+
+
+def _copy_artifact(artifact_dir: Path, key: str, path: Path) -> Path:
+    target_dir = artifact_dir / key
+    target_dir.mkdir(parents=True, exist_ok=True)
+    target = target_dir / path.name
+    link_or_copy(path, target)
+    return target
+
+
+class MemoryResultCache(ResultCache):
+    def __init__(self, max_entries: int = 128):
+        if max_entries < 1:
+            raise ValueError("max_entries must be positive")
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._artifact_dir: Optional[tempfile.TemporaryDirectory] = None
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return CachedResult(self._entries[key])
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                evicted_key, _ = self._entries.popitem(last=False)
+                self._remove_artifact(evicted_key)
+
+    def put_artifact(self, key: str, path: Path) -> Path:
+        with self._lock:
+            if self._artifact_dir is None:
+                self._artifact_dir = tempfile.TemporaryDirectory(prefix="kirei-cache-")
+            artifact_dir = Path(self._artifact_dir.name)
+        return _copy_artifact(artifact_dir, key, path)
+
+    def _remove_artifact(self, key: str):
+        if self._artifact_dir is not None:
+            shutil.rmtree(Path(self._artifact_dir.name) / key, ignore_errors=True)
+
+
+class DiskResultCache(ResultCache):
+    def __init__(
+        self,
+        root: Path,
+        *,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[float] = None,
+    ):
+        self._root = Path(root)
+        self._artifact_dir = self._root / "artifacts"
+        self._artifact_dir.mkdir(parents=True, exist_ok=True)
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            self._root / "index.sqlite3", check_same_thread=False
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created REAL NOT NULL,"
+            " accessed REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, created FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created = row
+            if self._ttl is not None and created + self._ttl < now:
+                self._delete(key)
+                self._db.commit()
+                return None
+            self._db.execute(
+                "UPDATE entries SET accessed = ? WHERE key = ?", (now, key)
+            )
+            self._db.commit()
+        return CachedResult(pickle.loads(value))
+
+    def put(self, key: str, value: Any) -> None:
+        data = pickle.dumps(value)
+        artifact_size = sum(
+            f.stat().st_size
+            for f in (self._artifact_dir / key).glob("*")
+            if f.is_file()
+        )
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                (key, data, len(data) + artifact_size, now, now),
+            )
+            self._evict(now)
+            self._db.commit()
+
+    def put_artifact(self, key: str, path: Path) -> Path:
+        return _copy_artifact(self._artifact_dir, key, path)
+
+    def _delete(self, key: str):
+        self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+        shutil.rmtree(self._artifact_dir / key, ignore_errors=True)
+
+    def _evict(self, now: float):
+        if self._ttl is not None:
+            for (key,) in self._db.execute(
+                "SELECT key FROM entries WHERE created < ?", (now - self._ttl,)
+            ).fetchall():
+                self._delete(key)
+        while True:
+            count, total_size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+            over_entries = self._max_entries is not None and count > self._max_entries
+            over_bytes = self._max_bytes is not None and total_size > self._max_bytes
+            if count <= 1 or not (over_entries or over_bytes):
+                return
+            (key,) = self._db.execute(
+                "SELECT key FROM entries ORDER BY accessed LIMIT 1"
+            ).fetchone()
+            self._delete(key)
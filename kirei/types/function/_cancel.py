@@ -0,0 +1,112 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+import threading
+import time
+from typing import Iterator, Optional
+
+from kirei.types.function._param_annotation import ParamAnnotation
+
+
+class TaskCancelledError(Exception):
+    pass
+
+
+class TaskTimeoutError(TaskCancelledError, TimeoutError):
+    pass
+
+
+class CancellationToken:
+    # 任务函数声明 CancellationToken 类型的参数，在耗时的循环中调用 check() 即可响应取消和超时
+    # 可以被 pickle：executor="process" 的任务在子进程中只能感知超时，取消时 worker 进程会被结束
+    def __init__(self, name: str = "Task"):
+        self._name = name
+        self._event = threading.Event()
+        self._timeout: Optional[float] = None
+        self._deadline: Optional[float] = None
+        self._timed_out = False
+
+    def start(self, timeout: Optional[float]):
+        # 开始执行任务时设置超时时间
+        if timeout is not None:
+            self._timeout = timeout
+            self._deadline = time.monotonic() + timeout
+        return self
+
+    def cancel(self):
+        self._event.set()
+
+    def expire(self):
+        self._timed_out = True
+        self._event.set()
+
+    @property
+    def timed_out(self) -> bool:
+        return self._timed_out or (
+            self._deadline is not None and time.monotonic() >= self._deadline
+        )
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set() or self.timed_out
+
+    def remaining(self) -> Optional[float]:
+        if self._deadline is None:
+            return None
+        return max(self._deadline - time.monotonic(), 0)
+
+    def exception(self) -> Optional[TaskCancelledError]:
+        # check() 会抛出的异常，没有被取消或超时时为 None
+        if self.timed_out:
+            return TaskTimeoutError(f"{self._name} timed out after {self._timeout}s")
+        if self._event.is_set():
+            return TaskCancelledError(f"{self._name} was cancelled")
+        return None
+
+    def check(self):
+        err = self.exception()
+        if err is not None:
+            raise err
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        # 代替 time.sleep，被取消或超时时提前返回 True
+        remaining = self.remaining()
+        if remaining is not None:
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        self._event.wait(timeout)
+        return self.cancelled
+
+    def __getstate__(self):
+        return {
+            "name": self._name,
+            "timeout": self._timeout,
+            "deadline": self._deadline,
+            "cancelled": self._event.is_set(),
+            "timed_out": self._timed_out,
+        }
+
+    def __setstate__(self, state):
+        self._name = state["name"]
+        self._timeout = state["timeout"]
+        self._event = threading.Event()
+        if state["cancelled"]:
+            self._event.set()
+        self._deadline = state["deadline"]
+        self._timed_out = state["timed_out"]
+
+
+_current_token: ContextVar[Optional[CancellationToken]] = ContextVar(
+    "kirei_cancellation_token", default=None
+)
+
+
+@contextmanager
+def provide_token(token: CancellationToken) -> Iterator[None]:
+    token_ref = _current_token.set(token)
+    try:
+        yield
+    finally:
+        _current_token.reset(token_ref)
+
+
+def cancellation_injector(param: ParamAnnotation) -> CancellationToken:
+    return _current_token.get() or CancellationToken()
@@ -0,0 +1,206 @@
+import asyncio
+from concurrent.futures import Executor, Future
+from concurrent.futures.process import BrokenProcessPool
+import inspect
+import multiprocessing
+from multiprocessing.connection import Connection
+import os
+import pickle
+import queue
+import threading
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple
+
+from kirei.types.function._injector import close_process_injectors
+
+
+ExecutorType = Literal["thread", "process"]
+
+_Job = Tuple[Future, Callable, Tuple[Any, ...], Dict[str, Any]]
+
+
+def _worker_main(conn: Connection):
+    try:
+        _serve(conn)
+    finally:
+        # 关闭这个 worker 进程中创建的 process 作用域资源
+        close_process_injectors()
+
+
+def _serve(conn: Connection):
+    while True:
+        try:
+            data = conn.recv_bytes()
+        except EOFError:
+            return
+        try:
+            # 反序列化参数时会创建 process 作用域的资源，失败时作为任务的错误返回
+            job = pickle.loads(data)
+            if job is None:
+                return
+            func, args, kwargs = job
+            res = func(*args, **kwargs)
+            if inspect.isawaitable(res):
+                res = asyncio.run(res)  # type: ignore
+            reply = (True, res)
+        except BaseException as err:
+            reply = (False, err)
+        try:
+            conn.send(reply)
+        except Exception as err:
+            # 返回值或异常无法被 pickle 时，至少把原因传回主进程
+            conn.send((False, RuntimeError(f"Can not send task result: {err!r}")))
+
+
+class _Worker:
+    def __init__(self, context: multiprocessing.context.BaseContext):
+        self._conn, child_conn = context.Pipe()
+        self._process = context.Process(
+            target=_worker_main, args=(child_conn,), daemon=True
+        )
+        self._process.start()
+        child_conn.close()
+        self.finished_tasks = 0
+        self._killed = False
+
+    @property
+    def is_alive(self) -> bool:
+        # 被结束的进程可能还没有退出完成，不能再接收任务
+        return not self._killed and self._process.is_alive()
+
+    def run(self, func: Callable, args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Any:
+        self._conn.send((func, args, kwargs))
+        try:
+            ok, res = self._conn.recv()
+        except (EOFError, OSError):
+            raise BrokenProcessPool(
+                f"Worker process {self._process.pid} exited unexpectedly"
+            )
+        self.finished_tasks += 1
+        if not ok:
+            raise res
+        return res
+
+    def kill(self):
+        self._killed = True
+        self._process.kill()
+
+    def stop(self):
+        try:
+            self._conn.send(None)
+        except OSError:
+            pass
+        self._process.join(timeout=1)
+        if self._process.is_alive():
+            self._process.kill()
+            self._process.join()
+        self._conn.close()
+
+
+class ProcessTaskExecutor(Executor):
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_tasks_per_worker: Optional[int] = None,
+        start_method: Optional[str] = "spawn",
+    ):
+        # 默认使用 spawn：在已经启动了 web server 线程的进程中 fork 并不安全
+        self._max_workers = max_workers or os.cpu_count() or 1
+        self._max_tasks_per_worker = max_tasks_per_worker
+        self._context = multiprocessing.get_context(start_method)
+        self._jobs: "queue.SimpleQueue[Optional[_Job]]" = queue.SimpleQueue()
+        self._threads: List[threading.Thread] = []
+        self._running: Dict[Future, _Worker] = {}
+        self._lock = threading.Lock()
+        self._is_shutdown = False
+
+    @property
+    def max_workers(self) -> int:
+        return self._max_workers
+
+    def start(self):
+        with self._lock:
+            if self._is_shutdown:
+                raise RuntimeError("Executor is already shutdown")
+            if self._threads:
+                return self
+            for i in range(self._max_workers):
+                worker = _Worker(self._context)
+                thread = threading.Thread(
+                    target=self._dispatch,
+                    args=(worker,),
+                    name=f"kirei-process-executor-{i}",
+                    daemon=True,
+                )
+                thread.start()
+                self._threads.append(thread)
+        return self
+
+    def submit(self, fn: Callable, /, *args: Any, **kwargs: Any) -> Future:
+        self.start()
+        future: Future = Future()
+        self._jobs.put((future, fn, args, kwargs))
+        return future
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        with self._lock:
+            if self._is_shutdown:
+                return
+            self._is_shutdown = True
+            if cancel_futures:
+                self._cancel_pending_jobs()
+            for _ in self._threads:
+                self._jobs.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def terminate(self, future: Future) -> bool:
+        # 取消还在排队的任务，或者结束正在执行该任务的 worker 进程（之后会启动新的 worker）
+        if future.cancel():
+            return True
+        with self._lock:
+            worker = self._running.get(future)
+        if worker is None:
+            return False
+        worker.kill()
+        return True
+
+    def _cancel_pending_jobs(self):
+        while True:
+            try:
+                job = self._jobs.get_nowait()
+            except queue.Empty:
+                return
+            if job is not None:
+                job[0].cancel()
+
+    def _renew_worker(self, worker: _Worker) -> _Worker:
+        if worker.is_alive and (
+            self._max_tasks_per_worker is None
+            or worker.finished_tasks < self._max_tasks_per_worker
+        ):
+            return worker
+        worker.stop()
+        return _Worker(self._context)
+
+    def _dispatch(self, worker: _Worker):
+        try:
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    return
+                future, func, args, kwargs = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                worker = self._renew_worker(worker)
+                with self._lock:
+                    self._running[future] = worker
+                try:
+                    future.set_result(worker.run(func, args, kwargs))
+                except BaseException as err:
+                    future.set_exception(err)
+                finally:
+                    with self._lock:
+                        del self._running[future]
+        finally:
+            worker.stop()
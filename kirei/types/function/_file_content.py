@@ -0,0 +1,31 @@
+import io
+import mimetypes
+from pathlib import Path
+from typing import Any, Optional, Union
+
+from kirei.types.basic_types import FileContent
+from kirei.types.function._param_annotation import ParamAnnotation
+
+FileContentValue = Union[bytes, bytearray, memoryview, io.BytesIO]
+
+
+def get_file_content(annotation: ParamAnnotation) -> Optional[FileContent]:
+    return annotation.get_tp_info(FileContent)
+
+
+def is_file_content_value(value: Any) -> bool:
+    return isinstance(value, (bytes, bytearray, memoryview, io.BytesIO))
+
+
+def content_filename(content: FileContent) -> str:
+    filename = content.filename
+    if content.media_type is not None and not Path(filename).suffix:
+        filename += mimetypes.guess_extension(content.media_type) or ""
+    return filename
+
+
+def write_content(value: FileContentValue, path: Path):
+    # BytesIO 通过 getbuffer() 直接写出，不复制一份 bytes
+    view = value.getbuffer() if isinstance(value, io.BytesIO) else memoryview(value)
+    with view, path.open("wb") as f:
+        f.write(view)
@@ -0,0 +1,50 @@
+from contextlib import ExitStack, closing, contextmanager
+import logging
+import mmap
+import os
+from pathlib import Path
+from typing import Any, Iterator
+
+from kirei.types.basic_types import FileReader
+
+_logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def _mapped(path: Path) -> Iterator[memoryview]:
+    with path.open("rb") as f:
+        # 空文件不能被 mmap
+        if os.fstat(f.fileno()).st_size == 0:
+            yield memoryview(b"")
+            return
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+    try:
+        yield view
+    finally:
+        try:
+            view.release()
+            mapped.close()
+        except BufferError:
+            # 任务在 session 结束后仍然持有切片，切片被回收后 mmap 会随之关闭
+            _logger.warning("Memory map of %s is still referenced after session", path)
+
+
+def _iter_chunks(path: Path, chunk_size: int) -> Iterator[bytes]:
+    with path.open("rb") as f:
+        while chunk := f.read(chunk_size):
+            yield chunk
+
+
+def _iter_lines(path: Path, encoding: str) -> Iterator[str]:
+    with path.open(encoding=encoding) as f:
+        yield from f
+
+
+def open_file_reader(reader: FileReader, path: Path, stack: ExitStack) -> Any:
+    # 打开的文件、mmap 在 stack 关闭（session 结束）时关闭
+    if reader.mode == "mmap":
+        return stack.enter_context(_mapped(path))
+    if reader.mode == "chunks":
+        return stack.enter_context(closing(_iter_chunks(path, reader.chunk_size)))
+    return stack.enter_context(closing(_iter_lines(path, reader.encoding)))
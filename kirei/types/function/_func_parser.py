@@ -1,32 +1,79 @@
 from __future__ import annotations
-from contextlib import contextmanager
+import asyncio
+import collections.abc
+from concurrent.futures import (
+    Executor,
+    Future,
+    InvalidStateError,
+    ProcessPoolExecutor,
+)
+from contextlib import ExitStack, asynccontextmanager, contextmanager, nullcontext
 from dataclasses import dataclass
 import functools
 import inspect
 import logging
+from pathlib import Path
+import threading
+import time
 from typing import (
+    Annotated,
     Any,
+    AsyncIterator,
+    Awaitable,
     Callable,
+    Dict,
     Generic,
+    Iterable,
     Iterator,
     List,
     Optional,
     Sequence,
+    Tuple,
     Type,
     TypeVar,
+    Union,
     cast,
 )
-from typing_extensions import ParamSpec
+from typing_extensions import ParamSpec, get_args, get_origin
+
+from kirei.types.basic_types import FileReader, PathType
 
+from kirei.types.function._artifact import ArtifactStore
+from kirei.types.function._cache import (
+    ResultCache,
+    is_output_file,
+    make_invocation_key,
+)
+from kirei.types.function._cancel import (
+    CancellationToken,
+    TaskTimeoutError,
+    provide_token,
+)
+from kirei.types.function._executor import ProcessTaskExecutor
+from kirei.types.function._file_reader import open_file_reader
 from kirei.types.function._param_annotation import ParamAnnotation
+from kirei.types.function._single_flight import SingleFlight, SingleFlightStats
+from kirei.types.function._metrics import MetricsRegistry, TaskMetrics, measure
+from kirei.types.function._profiler import (
+    ProfileCapture,
+    ProfileConfig,
+    ProfileReport,
+    TaskProfiler,
+    arun_profiled,
+    run_profiled,
+)
 from kirei.types.function._injector import (
     ContextInjectorCollection,
+    ContextInjectorEntry,
     ParamInjector,
     ParamInjectorCollection,
+    ProcessLocal,
 )
 from kirei.types.annotated import get_default_validator_provider
 from kirei.types.annotated._validator import (
     AnyValidator,
+    BulkValidationResult,
+    BulkValidator,
     ValidatorProvider,
 )
 
@@ -35,23 +82,46 @@ _InfoT = TypeVar("_InfoT")
 _logger = logging.getLogger(__name__)
 
 
+_UNFILLED: Any = object()
+# 同 kirei.types.UserInputFilePath
+_USER_INPUT_FILE: Any = Annotated[Path, PathType(type="user_input_file")]
+_STREAM_END: Any = object()
+
+
+@dataclass(frozen=True)
+class CompiledParam(Generic[_T]):
+    position: int
+    name: str
+    annotation: ParamAnnotation[_T]
+    validator: AnyValidator[_T]
+    # 参数按文件路径校验，执行时在 session 中打开后再传给任务函数
+    reader: Optional[FileReader] = None
+    # 由 injector 提供而不是用户输入，解析时根据 injector 的注册信息确定；
+    # None 表示注册时没有 match，在 session 中由 injector 决定
+    injected: Optional[bool] = False
+
+
 class FuncParam(Generic[_T]):
+    __slots__ = ("_index", "_spec", "_slots", "_metrics")
+
     def __init__(
-        self, index: int, name: str, tp: Type[_T], validator: AnyValidator[_T]
+        self,
+        index: int,
+        spec: CompiledParam[_T],
+        slots: List[Any],
+        metrics: Optional[TaskMetrics] = None,
     ) -> None:
         self._index = index
-        self._is_filled = False
-        self._filled_value = None
-        self._name = name
-        self._tp = ParamAnnotation(tp)
-        self._validator = validator
+        self._spec = spec
+        self._slots = slots
+        self._metrics = metrics
 
     @property
     def annotation(self):
-        return self._tp
+        return self._spec.annotation
 
     def __repr__(self) -> str:
-        return super().__str__() + f"({self._name}, {self._tp})"
+        return super().__repr__() + f"({self._spec.name}, {self._spec.annotation})"
 
     @property
     def index(self):
@@ -59,44 +129,55 @@ class FuncParam(Generic[_T]):
 
     @property
     def is_filled(self):
-        return self._is_filled
+        return self._slots[self._spec.position] is not _UNFILLED
 
     @property
     def name(self):
-        return self._name
+        return self._spec.name
 
     @property
     def iter_annotated_params(self) -> Sequence[Any]:
-        return self._tp.iter_annotated_params
+        return self._spec.annotation.iter_annotated_params
 
     @property
     def real_source_type(self) -> Type[_T]:
-        return self._tp.real_source_type
+        return self._spec.annotation.real_source_type
 
     def get_tp_info(self, info_t: Type[_InfoT]) -> Optional[_InfoT]:
-        return self._tp.get_tp_info(info_t)
+        return self._spec.annotation.get_tp_info(info_t)
 
     def reindex(self, value: int):
         self._index = value
         return self
 
     def get_value(self) -> _T:
-        if not self._is_filled:
-            raise ValueError(f"Param {self._name} is not filled")
-        return cast(_T, self._filled_value)
+        value = self._slots[self._spec.position]
+        if value is _UNFILLED:
+            raise ValueError(f"Param {self._spec.name} is not filled")
+        return cast(_T, value)
 
     def fill(self, value: Any):
-        assert not self._is_filled, "Param is already filled"
-        self._filled_value = self._validator(value)
-        self._is_filled = True
+        assert not self.is_filled, "Param is already filled"
+        if self._metrics is None:
+            self._slots[self._spec.position] = self._spec.validator(value)
+            return self
+        with self._metrics.measure("validate"):
+            self._slots[self._spec.position] = self._spec.validator(value)
+        return self
+
+    def fill_validated(self, value: _T):
+        # 值已经在外部校验过（例如 ParsedFunc.bulk_validate），直接填入
+        assert not self.is_filled, "Param is already filled"
+        self._slots[self._spec.position] = value
         return self
 
     def maybe_fill_with_injector(self, injector: ParamInjector[_T]):
-        assert not self._is_filled
-        val = injector(self._tp)
+        assert not self.is_filled
+        val = injector(self._spec.annotation)
         if val is NotImplemented:
             return self
-        self.fill(val)
+        # injector 提供的是已经构造好的对象（例如数据库连接），不再经过 validator
+        self._slots[self._spec.position] = val
         return self
 
 
@@ -111,45 +192,627 @@ class FuncMetaData:
     return_type_annotation: ParamAnnotation
 
 
-def _get_return_type_annotation(func: Callable) -> ParamAnnotation:
-    annotation = inspect.signature(func).return_annotation
+@dataclass(frozen=True)
+class TaskPlan(Generic[_P, _T]):
+    name: str
+    func: Callable[_P, _T]
+    params: Tuple[CompiledParam, ...]
+    return_type_annotation: ParamAnnotation
+    context_injectors: Tuple[ContextInjectorEntry, ...]
+    is_coroutine: bool
+    # batch 任务中以 list[T] 声明的参数位置，该参数按单个 T 校验
+    batch_param: Optional[int] = None
+    # 生成器任务，每次 yield 的值作为一个输出，return_type_annotation 为单个输出的类型
+    is_generator: bool = False
+    is_async_generator: bool = False
+    # 有 CancellationToken 类型的参数，session 需要提供自己的 token 用于注入
+    has_token_param: bool = False
+    has_file_reader: bool = False
+    # 有参数由 process 作用域的 injector 提供，执行时才取得实例
+    has_process_resource: bool = False
+
+    @property
+    def is_stream(self) -> bool:
+        return self.is_generator or self.is_async_generator
+
+    @property
+    def is_async(self) -> bool:
+        return (
+            self.is_coroutine
+            or self.is_async_generator
+            or any(entry.is_async for entry in self.context_injectors)
+        )
+
+    @property
+    def task_id(self) -> str:
+        return f"{self.func.__module__}.{self.func.__qualname__}:{self.name}"
+
+
+_STREAM_ORIGINS = (
+    collections.abc.Iterator,
+    collections.abc.Iterable,
+    collections.abc.Generator,
+    collections.abc.AsyncIterator,
+    collections.abc.AsyncIterable,
+    collections.abc.AsyncGenerator,
+)
+
+
+def _get_return_type_annotation(
+    sig: inspect.Signature, batch: bool = False, stream: bool = False
+) -> ParamAnnotation:
+    annotation = sig.return_annotation
     if annotation is inspect.Parameter.empty:
         return ParamAnnotation(str)
+    if batch:
+        return ParamAnnotation(_get_batch_item_type(annotation, "return value"))
+    if stream:
+        return ParamAnnotation(_get_stream_item_type(annotation))
     return ParamAnnotation(annotation)
 
 
+def _get_stream_item_type(tp: Any) -> Any:
+    if get_origin(tp) not in _STREAM_ORIGINS:
+        raise TypeError(
+            f"Generator task must be annotated as Iterator[T] or AsyncIterator[T], got {tp}"
+        )
+    args = get_args(tp)
+    return args[0] if args else str
+
+
+def _get_batch_item_type(tp: Any, name: str) -> Any:
+    if get_origin(tp) is not list:
+        raise TypeError(f"Batch task {name} must be annotated as list[T], got {tp}")
+    args = get_args(tp)
+    return args[0] if args else str
+
+
+def _find_batch_param(sig: inspect.Signature) -> int:
+    positions = [
+        position
+        for position, param in enumerate(sig.parameters.values())
+        if get_origin(param.annotation) is list
+    ]
+    if len(positions) != 1:
+        raise TypeError("Batch task must have exactly one param annotated as list[T]")
+    return positions[0]
+
+
+def _compile_plan(
+    func: Callable[_P, _T],
+    name: str,
+    injector_collection: ContextInjectorCollection,
+    validator_provider: ValidatorProvider,
+    batch: bool = False,
+) -> TaskPlan[_P, _T]:
+    sig = inspect.signature(func, eval_str=True)
+    batch_param = _find_batch_param(sig) if batch else None
+    is_async_generator = inspect.isasyncgenfunction(func)
+    params: List[CompiledParam] = []
+    for position, param in enumerate(sig.parameters.values()):
+        tp = param.annotation
+        if tp is inspect.Parameter.empty:
+            tp = str  # fallback to str
+        elif position == batch_param:
+            tp = _get_batch_item_type(tp, param.name)
+        reader = ParamAnnotation(tp).get_tp_info(FileReader)
+        if reader is not None:
+            # 界面、命令行和结果缓存都把它当作用户输入的文件
+            tp = _USER_INPUT_FILE
+        annotation = ParamAnnotation(tp)
+        params.append(
+            CompiledParam(
+                position,
+                param.name,
+                annotation,
+                validator_provider.get_validator(tp),
+                reader,
+                injector_collection.provides(annotation),
+            )
+        )
+    return TaskPlan(
+        name=name,
+        func=func,
+        params=tuple(params),
+        return_type_annotation=_get_return_type_annotation(
+            sig, batch, inspect.isgeneratorfunction(func) or is_async_generator
+        ),
+        context_injectors=injector_collection.resolve(
+            param.annotation for param in params
+        ),
+        is_coroutine=inspect.iscoroutinefunction(func),
+        batch_param=batch_param,
+        is_generator=inspect.isgeneratorfunction(func),
+        is_async_generator=is_async_generator,
+        has_token_param=any(
+            param.annotation.real_source_type is CancellationToken for param in params
+        ),
+        has_file_reader=any(param.reader is not None for param in params),
+        has_process_resource=injector_collection.requires_process_resource(
+            param.annotation for param in params
+        ),
+    )
+
+
+async def _arun_sync_profiled(
+    func: Callable, memory: bool, args: Sequence[Any]
+) -> Tuple[Any, Optional[ProfileCapture]]:
+    return run_profiled(func, memory, args)
+
+
 class TaskSession(Generic[_P, _T]):
     def __init__(
         self,
         injector_collection: ParamInjectorCollection,
-        func: Callable[_P, _T],
-        task_name: str,
-        params: List[FuncParam],
+        plan: TaskPlan[_P, _T],
+        cache: Optional[ResultCache] = None,
+        single_flight: Optional[SingleFlight] = None,
+        metrics: Optional[TaskMetrics] = None,
+        profiler: Optional[TaskProfiler] = None,
+        timeout: Optional[float] = None,
+        artifact_store: Optional[ArtifactStore] = None,
     ):
         self._injector_collection = injector_collection
-        self._func = func
-        self._params = [
-            param.maybe_fill_with_injector(self._injector_collection)
-            for param in params
-        ]
-        non_injected_params = [param for param in self._params if not param.is_filled]
-        non_injected_params = [
-            param.reindex(i) for i, param in enumerate(non_injected_params, 1)
-        ]
+        self._plan = plan
+        self._artifact_store = artifact_store
+        self._timeout = timeout
+        self._token: Optional[CancellationToken] = None
+        self._resources: Optional[ExitStack] = None
+        self._executor_futures: List[Tuple[Executor, Future]] = []
+        self._profiler = profiler
+        self._profile_report: Optional[ProfileReport] = None
+        self._cache = cache
+        self._single_flight = single_flight
+        self._metrics = metrics
+        self._slots: List[Any] = [_UNFILLED] * len(plan.params)
+        non_injected_params: List[FuncParam] = []
+        # CancellationToken 类型的参数注入为这个 session 自己的 token
+        with (
+            provide_token(self.cancellation_token)
+            if plan.has_token_param
+            else nullcontext()
+        ):
+            for spec in plan.params:
+                param = FuncParam(spec.position + 1, spec, self._slots, metrics)
+                if spec.injected is not False:
+                    param.maybe_fill_with_injector(self._injector_collection)
+                if param.is_filled:
+                    continue
+                if spec.injected:
+                    raise TypeError(
+                        f"Injector matching {spec.annotation} did not provide "
+                        f"param {spec.name} of task {plan.name}"
+                    )
+                non_injected_params.append(param.reindex(len(non_injected_params) + 1))
         self._meta_data = FuncMetaData(
-            name=task_name,
+            name=plan.name,
             non_injected_params=non_injected_params,
-            return_type_annotation=_get_return_type_annotation(self._func),
+            return_type_annotation=plan.return_type_annotation,
         )
 
     @property
     def meta_data(self):
         return self._meta_data
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        # 关闭执行时打开的输入文件
+        if self._resources is not None:
+            self._resources.close()
+            self._resources = None
+
+    def _args(self, remote: bool = False) -> List[Any]:
+        # remote 为 True 时任务在其他进程中执行，process 作用域的值在那个进程中取得
+        if not (self._plan.has_file_reader or self._plan.has_process_resource):
+            return self._slots
+        args = list(self._slots)
+        for spec in self._plan.params:
+            value = args[spec.position]
+            if spec.reader is not None:
+                if self._resources is None:
+                    self._resources = ExitStack()
+                args[spec.position] = open_file_reader(
+                    spec.reader, value, self._resources
+                )
+            elif isinstance(value, ProcessLocal) and not remote:
+                args[spec.position] = value.resolve()
+        return args
+
+    @property
+    def is_async(self) -> bool:
+        # 任务函数本身是否为异步函数或异步生成器，与 injector 无关
+        return self._plan.is_coroutine or self._plan.is_async_generator
+
+    @property
+    def cancellation_token(self) -> CancellationToken:
+        # 只在需要时创建，大部分 session 既没有超时也不会被取消
+        if self._token is None:
+            self._token = CancellationToken(f"Task {self._plan.name}")
+        return self._token
+
+    def cancel(self):
+        # 任务函数通过 CancellationToken 感知取消；在进程中执行的任务直接结束 worker 进程
+        self.cancellation_token.cancel()
+        self._abort_executor_futures()
+
+    def _abort_executor_futures(self):
+        for executor, future in self._executor_futures:
+            if isinstance(executor, ProcessTaskExecutor):
+                executor.terminate(future)
+            else:
+                future.cancel()
+
+    def _start(self):
+        if self._timeout is not None:
+            self.cancellation_token.start(self._timeout)
+
+    def _check_deadline(self):
+        # 同步任务无法被强制中断，只能在任务返回（或产出）后检查是否已经超时
+        if self._timeout is not None and self.cancellation_token.timed_out:
+            self.cancellation_token.check()
+
+    def fill_batch(self, items: List[Any]):
+        # items 中的每一项都应该已经由 ParsedFunc.validate_batch_item 校验过
+        assert self._plan.batch_param is not None, "Task is not a batch task"
+        assert self._slots[self._plan.batch_param] is _UNFILLED
+        self._slots[self._plan.batch_param] = list(items)
+        return self
+
+    @property
+    def is_stream(self) -> bool:
+        return self._plan.is_stream
+
+    def _check_not_stream(self):
+        if self._plan.is_stream:
+            raise TypeError(
+                f"Task {self._plan.name} is a generator, use `session.stream()` "
+                "or `session.astream()`"
+            )
+
+    def stream(self) -> Iterator[_T]:
+        # 逐个产出生成器任务的输出，不会在内存中累积
+        if not self._plan.is_generator:
+            raise TypeError(
+                f"Task {self._plan.name} is not a sync generator, "
+                "use `session.astream()`"
+                if self._plan.is_async_generator
+                else f"Task {self._plan.name} is not a generator"
+            )
+        self._check_filled()
+        self._start()
+        return self._stream()
+
+    def _stream(self) -> Iterator[_T]:
+        with measure(self._metrics, "execute"):
+            gen = self._plan.func(*self._args())  # type: ignore
+            try:
+                for item in gen:
+                    self._check_deadline()
+                    yield item
+            finally:
+                gen.close()
+
+    def astream(self) -> AsyncIterator[_T]:
+        # 同步生成器的每一步在线程中执行，不阻塞 event loop
+        if not self._plan.is_stream:
+            raise TypeError(f"Task {self._plan.name} is not a generator")
+        self._check_filled()
+        self._start()
+        return self._astream()
+
+    async def _astream(self) -> AsyncIterator[_T]:
+        with measure(self._metrics, "execute"):
+            if self._plan.is_async_generator:
+                agen = self._plan.func(*self._args())  # type: ignore
+                try:
+                    while True:
+                        try:
+                            item = await self._bounded(agen.__anext__())
+                        except StopAsyncIteration:
+                            return
+                        yield item
+                finally:
+                    await agen.aclose()
+            gen = self._plan.func(*self._args())  # type: ignore
+            try:
+                while True:
+                    item = await asyncio.to_thread(next, gen, _STREAM_END)
+                    if item is _STREAM_END:
+                        return
+                    self._check_deadline()
+                    yield item
+            finally:
+                gen.close()
+
+    def _check_filled(self):
+        for spec, value in zip(self._plan.params, self._slots):
+            if value is _UNFILLED:
+                raise ValueError(f"Param {spec.name} is not filled")
+
+    def invocation_key(self) -> str:
+        self._check_filled()
+        return make_invocation_key(
+            self._plan.task_id,
+            (
+                (param.name, param.annotation, param.get_value())
+                for param in self._meta_data.non_injected_params
+            ),
+        )
+
+    def _save_result(self, key: str, res: _T) -> _T:
+        assert self._cache is not None
+        # 输出文件位于 session 的临时目录中，需要先复制到缓存自己的目录
+        if isinstance(res, Path) and is_output_file(self._plan.return_type_annotation):
+            res = cast(_T, self._cache.put_artifact(key, res))
+        self._cache.put(key, res)
+        return res
+
+    @property
+    def _needs_key(self) -> bool:
+        return self._cache is not None or self._single_flight is not None
+
+    @property
+    def profile_report(self) -> Optional[ProfileReport]:
+        # 这次执行被采样时，执行结束后为 profile 的结果
+        return self._profile_report
+
+    def _save_profile(self, capture: Optional[ProfileCapture]):
+        if capture is not None:
+            assert self._profiler is not None
+            self._profile_report = self._profiler.save(capture)
+
+    def _invoke(self) -> _T:
+        if self._profiler is None or not self._profiler.sample():
+            return self._plan.func(*self._args())  # type: ignore
+        res, capture = run_profiled(
+            self._plan.func, self._profiler.config.memory, self._args()
+        )
+        self._save_profile(capture)
+        return res
+
+    def _executor_submit(self, executor: Executor) -> Future[_T]:
+        remote = isinstance(executor, (ProcessTaskExecutor, ProcessPoolExecutor))
+        if self._plan.has_file_reader and remote:
+            raise TypeError(
+                f"Task {self._plan.name} reads input files in session, "
+                "it can not be executed in another process"
+            )
+        if self._profiler is None or not self._profiler.sample():
+            future = executor.submit(self._plan.func, *self._args(remote))
+            self._executor_futures.append((executor, future))
+            return future
+        # 在执行任务的进程中采集 profile，再在当前进程中保存
+        res_future: Future[_T] = Future()
+
+        def _on_done(future: Future):
+            try:
+                res, capture = future.result()
+                self._save_profile(capture)
+                res_future.set_result(res)
+            except BaseException as err:
+                res_future.set_exception(err)
+
+        future = executor.submit(
+            run_profiled,
+            self._plan.func,
+            self._profiler.config.memory,
+            tuple(self._args(remote)),
+        )
+        self._executor_futures.append((executor, future))
+        future.add_done_callback(_on_done)
+        return res_future
+
+    def _keep_artifact(self, res: _T) -> _T:
+        # 输出文件位于 session 的临时目录中，在结果离开 session（或者共享给合并的请求）之前
+        # 移入 artifact store
+        if self._artifact_store is None or not isinstance(res, Path):
+            return res
+        if not is_output_file(self._plan.return_type_annotation):
+            return res
+        return cast(_T, self._artifact_store.put(res).path)
+
+    def _run(self, key: str) -> _T:
+        if self._cache is None:
+            return self._keep_artifact(self._invoke())
+        cached = self._cache.get(key)
+        if cached is not None:
+            return self._keep_artifact(cached.value)
+        return self._keep_artifact(self._save_result(key, self._invoke()))
+
     def __call__(self) -> _T:
-        res = self._func(*[param.get_value() for param in self._params])  # type: ignore
+        if self._plan.is_coroutine:
+            raise TypeError(
+                f"Task {self._plan.name} is async, use `await session.acall()`"
+            )
+        self._check_not_stream()
+        self._start()
+        if self._metrics is None:
+            return self._call_checked()
+        with self._metrics.measure("execute"):
+            return self._call_checked()
+
+    def _call_checked(self) -> _T:
+        res = self._call()
+        self._check_deadline()
         return res
 
+    def _call(self) -> _T:
+        self._check_filled()
+        if not self._needs_key:
+            return self._keep_artifact(self._invoke())
+        key = self.invocation_key()
+        if self._single_flight is None:
+            return self._run(key)
+        return self._single_flight.do(key, lambda: self._run(key))
+
+    def _submit(self, key: str, executor: Executor) -> Future[_T]:
+        if self._cache is None:
+            return self._then_keep_artifact(self._executor_submit(executor))
+        res_future: Future[_T] = Future()
+        cached = self._cache.get(key)
+        if cached is not None:
+            res_future.set_result(self._keep_artifact(cached.value))
+            return res_future
+
+        def _on_done(future: Future):
+            try:
+                res = self._save_result(key, future.result())
+                res_future.set_result(self._keep_artifact(res))
+            except BaseException as err:
+                res_future.set_exception(err)
+
+        self._executor_submit(executor).add_done_callback(_on_done)
+        return res_future
+
+    def _then_keep_artifact(self, future: Future[_T]) -> Future[_T]:
+        if self._artifact_store is None:
+            return future
+        res_future: Future[_T] = Future()
+
+        def _on_done(future: Future):
+            try:
+                res_future.set_result(self._keep_artifact(future.result()))
+            except BaseException as err:
+                res_future.set_exception(err)
+
+        future.add_done_callback(_on_done)
+        return res_future
+
+    def submit(self, executor: Executor) -> Future[_T]:
+        # 参数已经在当前进程完成校验和注入，executor 只负责执行任务函数本身
+        self._check_not_stream()
+        self._start()
+        if self._metrics is None:
+            return self._bound_future(self._submit_checked(executor))
+        metrics = self._metrics
+        start = time.perf_counter()
+
+        def _on_done(future: Future):
+            failed = future.cancelled() or future.exception() is not None
+            metrics.observe("execute", time.perf_counter() - start, failed)
+
+        try:
+            future = self._bound_future(self._submit_checked(executor))
+        except BaseException:
+            metrics.observe("execute", time.perf_counter() - start, True)
+            raise
+        future.add_done_callback(_on_done)
+        return future
+
+    def _bound_future(self, future: Future[_T]) -> Future[_T]:
+        # 超时后立即返回超时错误，进程中执行的任务会被结束，线程中的任务只能通过 token 感知
+        if self._timeout is None:
+            return future
+        token = self.cancellation_token
+        res_future: Future[_T] = Future()
+
+        def _on_timeout():
+            if res_future.done():
+                return
+            token.expire()
+            self._abort_executor_futures()
+            try:
+                res_future.set_exception(token.exception())
+            except InvalidStateError:
+                pass
+
+        timer = threading.Timer(token.remaining() or 0, _on_timeout)
+        timer.daemon = True
+        timer.start()
+
+        def _on_done(future: Future):
+            timer.cancel()
+            try:
+                if future.cancelled():
+                    res_future.cancel()
+                elif future.exception() is not None:
+                    res_future.set_exception(future.exception())
+                else:
+                    res_future.set_result(future.result())
+            except InvalidStateError:
+                pass
+
+        future.add_done_callback(_on_done)
+        return res_future
+
+    def _submit_checked(self, executor: Executor) -> Future[_T]:
+        self._check_filled()
+        if not self._needs_key:
+            return self._then_keep_artifact(self._executor_submit(executor))
+        key = self.invocation_key()
+        if self._single_flight is None:
+            return self._submit(key, executor)
+        return self._single_flight.submit(key, lambda: self._submit(key, executor))
+
+    async def _arun(self, key: str) -> _T:
+        if self._cache is None:
+            return self._keep_artifact(await self._acall())
+        cached = self._cache.get(key)
+        if cached is not None:
+            return self._keep_artifact(cached.value)
+        return self._keep_artifact(self._save_result(key, await self._acall()))
+
+    async def acall(self) -> _T:
+        self._check_not_stream()
+        self._start()
+        if self._metrics is None:
+            return await self._bounded(self._acall_checked())
+        with self._metrics.measure("execute"):
+            return await self._bounded(self._acall_checked())
+
+    async def _bounded(self, aw: Awaitable[_T]) -> _T:
+        if self._timeout is None:
+            return await aw
+        token = self.cancellation_token
+        try:
+            res = await asyncio.wait_for(aw, token.remaining())
+        except asyncio.TimeoutError:
+            if not token.timed_out:
+                raise
+            token.expire()
+            raise cast(TaskTimeoutError, token.exception()) from None
+        self._check_deadline()
+        return res
+
+    async def _acall_checked(self) -> _T:
+        self._check_filled()
+        if not self._needs_key:
+            return self._keep_artifact(await self._acall())
+        # 计算 key 需要读取上传文件的全部内容，不能阻塞 event loop
+        key = await asyncio.to_thread(self.invocation_key)
+        if self._single_flight is None:
+            return await self._arun(key)
+        return await self._single_flight.ado(key, lambda: self._arun(key))
+
+    async def _acall(self) -> _T:
+        if self._profiler is not None and self._profiler.sample():
+            profiled = arun_profiled if self._plan.is_coroutine else _arun_sync_profiled
+            res, capture = await profiled(
+                self._plan.func, self._profiler.config.memory, self._args()
+            )
+            self._save_profile(capture)
+            return res
+        res = self._plan.func(*self._args())  # type: ignore
+        if self._plan.is_coroutine:
+            res = await res  # type: ignore
+        return res
+
+
+def _get_profile_config(
+    profile: Union[bool, ProfileConfig, None], unsupported: bool
+) -> Optional[ProfileConfig]:
+    if profile is None:
+        # 未指定时由环境变量 KIREI_PROFILE 决定，batch 和生成器任务不支持 profile
+        return None if unsupported else ProfileConfig.from_env()
+    if isinstance(profile, ProfileConfig):
+        return profile
+    return ProfileConfig() if profile else None
+
 
 class ParsedFunc(Generic[_P, _T]):
     def __init__(
@@ -158,39 +821,252 @@ class ParsedFunc(Generic[_P, _T]):
         func: Callable[_P, _T],
         validator_provider: ValidatorProvider,
         override_name: Optional[str] = None,
+        batch: bool = False,
+        cache: Optional[ResultCache] = None,
+        dedupe: bool = False,
+        metrics: Optional[MetricsRegistry] = None,
+        profile: Union[bool, ProfileConfig, None] = None,
+        timeout: Optional[float] = None,
+        artifact_store: Optional[ArtifactStore] = None,
     ):
+        if timeout is not None and timeout <= 0:
+            raise ValueError("timeout must be positive")
+        if batch and (cache is not None or dedupe):
+            raise TypeError("Batch task does not support result cache or dedupe")
+        if batch and profile:
+            raise TypeError("Batch task does not support profile")
         self._injector_collection = injector_collection
-        self._func = func
         self._validator_provider = validator_provider
+        self._bulk_validators: Dict[str, BulkValidator] = {}
+        self._cache = cache
+        self._timeout = timeout
+        self._artifact_store = artifact_store
+        self._func = func
         self._name = override_name or func.__name__
+        self._batch = batch
+        self._dedupe = dedupe
+        self._profile = profile
+        self._single_flight = SingleFlight() if dedupe else None
+        self._metrics = metrics.task(self._name) if metrics else None
 
-    @contextmanager
-    def enter_session(self):
-        with self._injector_collection as injector:
-            yield TaskSession(
-                injector,
-                self._func,
-                self._name,
-                list(self._params),
+    @functools.cached_property
+    def _plan(self) -> TaskPlan[_P, _T]:
+        # 第一次使用时才解析函数签名、创建 validator，注册大量任务时不拖慢启动
+        plan = _compile_plan(
+            self._func,
+            self._name,
+            self._injector_collection,
+            self._validator_provider,
+            self._batch,
+        )
+        if plan.is_stream and (
+            self._batch or self._cache is not None or self._dedupe or self._profile
+        ):
+            raise TypeError(
+                "Generator task does not support batch, result cache, dedupe or profile"
             )
+        return plan
 
-    @functools.cache
-    def get_metadata(self):
-        # HACK: 创建一个临时 session 来获取 metadata
-        with self.enter_session() as session:
-            return session.meta_data
+    @functools.cached_property
+    def _shares_output_file(self) -> bool:
+        # 没有缓存和 artifact store 时输出文件位于发起执行的 session 的临时目录中，
+        # 无法安全地共享给其他调用者
+        return (
+            self._dedupe
+            and self._cache is None
+            and is_output_file(self._plan.return_type_annotation)
+        )
+
+    @functools.cached_property
+    def _profiler(self) -> Optional[TaskProfiler]:
+        profile_config = _get_profile_config(
+            self._profile, self._batch or self._plan.is_stream
+        )
+        return TaskProfiler(self._name, profile_config) if profile_config else None
 
     @property
-    def _params(self) -> Iterator[FuncParam]:
-        sig: inspect.Signature = inspect.signature(self._func)
-        index = 1
-        for param in sig.parameters.values():
-            tp = param.annotation
-            if tp is inspect.Parameter.empty:
-                tp = str  # fallback to str
-            validator_chain = self._validator_provider.get_validator(tp)
-            yield FuncParam(index, param.name, tp, validator_chain)
-            index += 1
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def func(self) -> Callable[_P, _T]:
+        return self._func
+
+    @property
+    def plan(self) -> TaskPlan[_P, _T]:
+        return self._plan
+
+    def compile(self):
+        # 立即解析任务（否则在第一次使用时解析），任务配置的错误在这里抛出
+        self.get_metadata()
+        return self
+
+    @property
+    def is_async(self) -> bool:
+        return self._plan.is_async
+
+    @property
+    def single_flight_stats(self) -> Optional[SingleFlightStats]:
+        if self._single_flight is None:
+            return None
+        return self._single_flight.stats
+
+    @property
+    def metrics(self) -> Optional[TaskMetrics]:
+        return self._metrics
+
+    @property
+    def is_stream(self) -> bool:
+        return self._plan.is_stream
+
+    @property
+    def is_profiled(self) -> bool:
+        return self._profiler is not None
+
+    @property
+    def is_batch(self) -> bool:
+        return self._batch
+
+    @property
+    def artifact_store(self) -> Optional[ArtifactStore]:
+        return self._artifact_store
+
+    @property
+    def supports_process(self) -> bool:
+        # 生成器任务和在 session 中打开输入文件的任务不能交给进程执行
+        return not (self._plan.is_stream or self._plan.has_file_reader)
+
+    def validate_batch_item(self, value: Any) -> Any:
+        assert self._plan.batch_param is not None, "Task is not a batch task"
+        validator = self._plan.params[self._plan.batch_param].validator
+        if self._metrics is None:
+            return validator(value)
+        with self._metrics.measure("validate"):
+            return validator(value)
+
+    def bulk_validate(
+        self, param_name: str, column: Iterable[Any]
+    ) -> BulkValidationResult:
+        # 批量执行时按列校验参数，校验后的值通过 FuncParam.fill_validated 填入
+        bulk_validator = self._bulk_validators.get(param_name)
+        if bulk_validator is None:
+            param = next((p for p in self._plan.params if p.name == param_name), None)
+            if param is None:
+                raise ValueError(f"Task {self._plan.name} has no param {param_name}")
+            bulk_validator = self._validator_provider.get_bulk_validator(
+                param.annotation.tp
+            )
+            self._bulk_validators[param_name] = bulk_validator
+        return bulk_validator(column)
+
+    def _create_session(
+        self,
+        injector: ParamInjectorCollection,
+        artifact_store: Optional[ArtifactStore],
+    ) -> TaskSession:
+        store = artifact_store or self._artifact_store
+        if store is None and self._shares_output_file:
+            raise TypeError(
+                "Dedupe task returning OutputFilePath requires a cache or artifact store"
+            )
+        return TaskSession(
+            injector,
+            self._plan,
+            self._cache,
+            self._single_flight,
+            self._metrics,
+            self._profiler,
+            self._timeout,
+            store,
+        )
+
+    # artifact_store 为这个 session 保存输出文件的 store（例如 web 前端自己的 store），
+    # 没有传入时使用解析任务时的 artifact_store
+    @contextmanager
+    def enter_session(self, artifact_store: Optional[ArtifactStore] = None):
+        scope = self._injector_collection.scope(self._plan.context_injectors)
+        if self._metrics is None:
+            with scope as injector, self._create_session(
+                injector, artifact_store
+            ) as session:
+                yield session
+            return
+        metrics = self._metrics
+        with metrics.track_session():
+            start = time.perf_counter()
+            entered = False
+            try:
+                with scope as injector, self._create_session(
+                    injector, artifact_store
+                ) as session:
+                    entered = True
+                    metrics.observe("inject", time.perf_counter() - start)
+                    yield session
+            except BaseException:
+                if not entered:
+                    metrics.observe("inject", time.perf_counter() - start, True)
+                raise
+
+    @asynccontextmanager
+    async def enter_async_session(self, artifact_store: Optional[ArtifactStore] = None):
+        scope = self._injector_collection.scope(self._plan.context_injectors)
+        if self._metrics is None:
+            async with scope as injector:
+                with self._create_session(injector, artifact_store) as session:
+                    yield session
+            return
+        metrics = self._metrics
+        with metrics.track_session():
+            start = time.perf_counter()
+            entered = False
+            try:
+                async with scope as injector:
+                    with self._create_session(injector, artifact_store) as session:
+                        entered = True
+                        metrics.observe("inject", time.perf_counter() - start)
+                        yield session
+            except BaseException:
+                if not entered:
+                    metrics.observe("inject", time.perf_counter() - start, True)
+                raise
+
+    @functools.cached_property
+    def _metadata(self) -> FuncMetaData:
+        if any(spec.injected is None for spec in self._plan.params):
+            # 有参数需要由 injector 决定是否提供时，创建一个临时 session 来获取 metadata，不计入统计
+            return self._probe_metadata()
+        # 只由 plan 得到，不进入 injector 的 context；参数对象没有绑定到任何 session，只用于描述参数
+        slots = [_UNFILLED] * len(self._plan.params)
+        non_injected_params = [
+            FuncParam(index, spec, slots)
+            for index, spec in enumerate(
+                (spec for spec in self._plan.params if not spec.injected), 1
+            )
+        ]
+        return FuncMetaData(
+            name=self._plan.name,
+            non_injected_params=non_injected_params,
+            return_type_annotation=self._plan.return_type_annotation,
+        )
+
+    def _probe_metadata(self) -> FuncMetaData:
+        if self._plan.is_async:
+            # 不用 asyncio.run：它会清除当前线程的 event loop，之后创建的 gradio 组件无法取得 loop
+            loop = asyncio.new_event_loop()
+            try:
+                return loop.run_until_complete(self._probe_async_metadata())
+            finally:
+                loop.close()
+        with self._injector_collection.scope(self._plan.context_injectors) as injector:
+            return TaskSession(injector, self._plan).meta_data
+
+    async def _probe_async_metadata(self) -> FuncMetaData:
+        scope = self._injector_collection.scope(self._plan.context_injectors)
+        async with scope as injector:
+            return TaskSession(injector, self._plan).meta_data
+
+    def get_metadata(self) -> FuncMetaData:
+        return self._metadata
 
 
 class FuncParser:
@@ -204,7 +1080,29 @@ class FuncParser:
             validator_provider or get_default_validator_provider()
         )
 
-    def parse(self, func: Callable, override_name: Optional[str] = None) -> ParsedFunc:
+    def parse(
+        self,
+        func: Callable,
+        override_name: Optional[str] = None,
+        *,
+        batch: bool = False,
+        cache: Optional[ResultCache] = None,
+        dedupe: bool = False,
+        metrics: Optional[MetricsRegistry] = None,
+        profile: Union[bool, ProfileConfig, None] = None,
+        timeout: Optional[float] = None,
+        artifact_store: Optional[ArtifactStore] = None,
+    ) -> ParsedFunc:
         return ParsedFunc(
-            self._injector_collection, func, self._validator_provider, override_name
+            self._injector_collection,
+            func,
+            self._validator_provider,
+            override_name,
+            batch,
+            cache,
+            dedupe,
+            metrics,
+            profile,
+            timeout,
+            artifact_store,
         )
@@ -1,10 +1,36 @@
-from contextlib import AbstractContextManager, contextmanager
+from contextlib import (
+    AbstractAsyncContextManager,
+    AbstractContextManager,
+    AsyncExitStack,
+    ExitStack,
+    contextmanager,
+)
+from contextvars import ContextVar
+from dataclasses import dataclass
+import os
 from pathlib import Path
 import tempfile
+import threading
 from types import NotImplementedType
-from typing import Callable, Dict, List, Type, TypeVar, Union, cast
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Literal,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    cast,
+)
 
 from kirei.types.function._param_annotation import ParamAnnotation
+from kirei.types.function._cancel import CancellationToken, cancellation_injector
+from kirei.types.function._progress import JobProgress, progress_injector
 from kirei.types.basic_types import PathType
 
 _T = TypeVar("_T")
@@ -27,57 +53,363 @@ class ParamInjectorCollection:
 
 
 ContextManagerCreator = Callable[[], AbstractContextManager[ParamInjector[_T]]]
+AsyncContextManagerCreator = Callable[
+    [], AbstractAsyncContextManager[ParamInjector[_T]]
+]
+InjectorMatcher = Callable[[ParamAnnotation], bool]
+# session：每个 session 创建一次；app：整个应用共享一个实例；
+# process：每个进程各自创建一个实例，在进程池中执行的任务使用 worker 进程自己的实例
+InjectorLifetime = Literal["session", "app", "process"]
+
+
+class SharedInjector:
+    # app、process 作用域的 injector，第一次被需要（或 start）时创建，close 时销毁
+    def __init__(
+        self,
+        creator: ContextManagerCreator,
+        tp: Type,
+        match: Optional[InjectorMatcher],
+        lifetime: InjectorLifetime,
+        lazy: bool = True,
+    ):
+        self._creator = creator
+        self._tp = tp
+        self._match = match
+        self._lifetime = lifetime
+        self._lazy = lazy
+        self._lock = threading.Lock()
+        self._injector: Optional[ParamInjector] = None
+        self._exit_stack: Optional[ExitStack] = None
+        self._pid: Optional[int] = None
+
+    @property
+    def lifetime(self) -> InjectorLifetime:
+        return self._lifetime
+
+    @property
+    def lazy(self) -> bool:
+        return self._lazy
+
+    def is_required_by(self, annotation: ParamAnnotation) -> bool:
+        if annotation.real_source_type is not self._tp:
+            return False
+        return self._match is None or self._match(annotation)
+
+    def get(self) -> ParamInjector:
+        injector = self._injector
+        pid = os.getpid()
+        if injector is not None and self._pid == pid:
+            return injector
+        with self._lock:
+            # fork 出的子进程不能使用父进程创建的资源，需要重新创建
+            if self._injector is None or self._pid != pid:
+                with ExitStack() as stack:
+                    self._injector = stack.enter_context(self._creator())
+                    self._exit_stack = stack.pop_all()
+                self._pid = pid
+            return self._injector
+
+    def close(self):
+        with self._lock:
+            # 只关闭当前进程创建的资源
+            if self._exit_stack is not None and self._pid == os.getpid():
+                self._exit_stack.close()
+            self._injector = self._exit_stack = self._pid = None
+
+    def __call__(self, annotation: ParamAnnotation) -> Any:
+        if not self.is_required_by(annotation):
+            return NotImplemented
+        if self._lifetime == "process":
+            # 执行任务时才在执行任务的进程中取得实例
+            return ProcessLocal(self, annotation)
+        return self.get()(annotation)
+
+
+class ProcessLocal:
+    # process 作用域注入的占位值；被 pickle 到 worker 进程时，反序列化得到 worker 自己的实例
+    # 因此 creator 和 match 需要能被 pickle（模块级函数）
+    __slots__ = ("_shared", "_annotation")
+
+    def __init__(self, shared: SharedInjector, annotation: ParamAnnotation):
+        self._shared = shared
+        self._annotation = annotation
+
+    def resolve(self) -> Any:
+        res = self._shared.get()(self._annotation)
+        if res is NotImplemented:
+            raise TypeError(f"Process injector can not provide {self._annotation}")
+        return res
+
+    def __reduce__(self):
+        shared = self._shared
+        return (
+            _resolve_in_process,
+            (shared._creator, shared._tp, shared._match, self._annotation),
+        )
+
+
+# worker 进程中 process 作用域 injector 的实例，进程退出前关闭
+_process_injectors: Dict[Tuple[Any, ...], SharedInjector] = {}
+_process_injectors_lock = threading.Lock()
+
+
+def _resolve_in_process(
+    creator: ContextManagerCreator,
+    tp: Type,
+    match: Optional[InjectorMatcher],
+    annotation: ParamAnnotation,
+) -> Any:
+    with _process_injectors_lock:
+        shared = _process_injectors.get((creator, tp, match))
+        if shared is None:
+            shared = SharedInjector(creator, tp, match, "process")
+            _process_injectors[(creator, tp, match)] = shared
+    return ProcessLocal(shared, annotation).resolve()
+
+
+def close_process_injectors():
+    with _process_injectors_lock:
+        shared_injectors = list(_process_injectors.values())
+        _process_injectors.clear()
+    for shared in shared_injectors:
+        shared.close()
+
+
+@dataclass(frozen=True)
+class ContextInjectorEntry:
+    creator: Union[ContextManagerCreator, AsyncContextManagerCreator]
+    tp: Type
+    match: Optional[InjectorMatcher] = None
+    is_async: bool = False
+
+    def is_required_by(self, annotation: ParamAnnotation) -> bool:
+        if annotation.real_source_type is not self.tp:
+            return False
+        return self.match is None or self.match(annotation)
+
+
+class InjectorScope(
+    AbstractContextManager[ParamInjectorCollection],
+    AbstractAsyncContextManager[ParamInjectorCollection],
+):
+    def __init__(
+        self,
+        injectors: Dict[Type, List[ParamInjector]],
+        context_injectors: Sequence[ContextInjectorEntry],
+    ):
+        self._injectors = injectors
+        self._context_injectors = context_injectors
+        self._exit_stack: Optional[ExitStack] = None
+        self._async_exit_stack: Optional[AsyncExitStack] = None
+
+    @property
+    def is_async(self) -> bool:
+        return any(entry.is_async for entry in self._context_injectors)
+
+    def __enter__(self):
+        assert self._exit_stack is None, "InjectorScope is not reusable"
+        if self.is_async:
+            raise TypeError("Scope with async context injectors must use `async with`")
+        if not self._context_injectors:
+            self._exit_stack = ExitStack()
+            return ParamInjectorCollection(self._injectors)
+        injectors = dict(self._injectors)
+        with ExitStack() as stack:
+            for entry in self._context_injectors:
+                injector = stack.enter_context(entry.creator())
+                injectors[entry.tp] = [*injectors.get(entry.tp, []), injector]
+            self._exit_stack = stack.pop_all()
+        return ParamInjectorCollection(injectors)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        assert self._exit_stack is not None
+        return self._exit_stack.__exit__(exc_type, exc_value, traceback)
+
+    async def __aenter__(self):
+        assert self._async_exit_stack is None, "InjectorScope is not reusable"
+        injectors = dict(self._injectors)
+        async with AsyncExitStack() as stack:
+            for entry in self._context_injectors:
+                if entry.is_async:
+                    injector = await stack.enter_async_context(entry.creator())
+                else:
+                    injector = stack.enter_context(entry.creator())
+                injectors[entry.tp] = [*injectors.get(entry.tp, []), injector]
+            self._async_exit_stack = stack.pop_all()
+        return ParamInjectorCollection(injectors)
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        assert self._async_exit_stack is not None
+        return await self._async_exit_stack.__aexit__(exc_type, exc_value, traceback)
+
+
+_active_scopes: ContextVar[
+    Tuple[Tuple["ContextInjectorCollection", InjectorScope], ...]
+] = ContextVar("kirei_active_injector_scopes", default=())
 
 
 class ContextInjectorCollection(AbstractContextManager[ParamInjector]):
     def __init__(self):
         self._injectors: Dict[Type, List[ParamInjector]] = {}
-        self._context_injectors: Dict[Type, List[ContextManagerCreator]] = {}
-        self._pending_exit_contexts: List[AbstractContextManager] = []
-        self._in_context = False
+        # 和 _injectors 一一对应的 match，只用于在解析时判断参数是否由 injector 提供
+        self._matchers: Dict[Type, List[Optional[InjectorMatcher]]] = {}
+        self._context_injectors: Tuple[ContextInjectorEntry, ...] = ()
+        self._shared_injectors: Tuple[SharedInjector, ...] = ()
+
+    def resolve(
+        self, annotations: Iterable[ParamAnnotation]
+    ) -> Tuple[ContextInjectorEntry, ...]:
+        annotations = list(annotations)
+        return tuple(
+            entry
+            for entry in self._context_injectors
+            if any(entry.is_required_by(annotation) for annotation in annotations)
+        )
+
+    def provides(self, annotation: ParamAnnotation) -> Optional[bool]:
+        # 只根据注册信息判断参数是否由 injector 提供，不调用 injector，也不进入 context、创建共享的实例
+        # 有 match 的注册匹配时为 True；该类型只有没有 match 的注册时为 None，
+        # 需要由 injector 自己决定（返回 NotImplemented 时参数由用户输入）；没有注册时为 False
+        tp = annotation.real_source_type
+        matchers = [
+            entry.match for entry in self._context_injectors if entry.tp is tp
+        ] + self._matchers.get(tp, [])
+        if any(match is not None and match(annotation) for match in matchers):
+            return True
+        if any(match is None for match in matchers):
+            return None
+        return False
+
+    def requires_process_resource(self, annotations: Iterable[ParamAnnotation]) -> bool:
+        annotations = list(annotations)
+        return any(
+            shared.is_required_by(annotation)
+            for shared in self._shared_injectors
+            if shared.lifetime == "process"
+            for annotation in annotations
+        )
+
+    def start(self):
+        # 创建 lazy=False 的 app、process 作用域 injector
+        for shared in self._shared_injectors:
+            if not shared.lazy:
+                shared.get()
+        return self
+
+    def close(self):
+        for shared in reversed(self._shared_injectors):
+            shared.close()
+
+    def scope(
+        self, context_injectors: Optional[Sequence[ContextInjectorEntry]] = None
+    ) -> InjectorScope:
+        if context_injectors is None:
+            context_injectors = self._context_injectors
+        return InjectorScope(self._injectors, context_injectors)
 
     def __enter__(self):
-        assert not self._in_context
-        # FIXME: 异常的情况下，可能会导致未退出的context manager
-        self._in_context = True
-        injectors: Dict[Type, List[ParamInjector]] = self._injectors.copy()
-        for tp, inner_injectors in self._context_injectors.items():
-            for injector_creator in inner_injectors:
-                injector = injector_creator()
-                self._pending_exit_contexts.append(injector)
-                injectors.setdefault(tp, []).append(injector.__enter__())
-        return ParamInjectorCollection(injectors)
+        scope = self.scope()
+        injector = scope.__enter__()
+        _active_scopes.set((*_active_scopes.get(), (self, scope)))
+        return injector
 
     def __exit__(self, exc_type, exc_value, traceback):
-        for context in self._pending_exit_contexts:
-            context.__exit__(exc_type, exc_value, traceback)
-        self._pending_exit_contexts.clear()
-        self._in_context = False
-        return False
+        return self._pop_active_scope().__exit__(exc_type, exc_value, traceback)
+
+    async def __aenter__(self):
+        scope = self.scope()
+        injector = await scope.__aenter__()
+        _active_scopes.set((*_active_scopes.get(), (self, scope)))
+        return injector
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        scope = self._pop_active_scope()
+        return await scope.__aexit__(exc_type, exc_value, traceback)
+
+    def _pop_active_scope(self) -> InjectorScope:
+        scopes = _active_scopes.get()
+        assert scopes and scopes[-1][0] is self, "Unbalanced injector scope exit"
+        _active_scopes.set(scopes[:-1])
+        return scopes[-1][1]
 
-    def register_context_injector(self, injector: ContextManagerCreator, tp: Type[_T]):
-        self._context_injectors.setdefault(tp, []).append(injector)
+    # 注册时整体替换映射而不是原地修改，保证并发的 session 读到的总是一致的快照
+    def register_context_injector(
+        self,
+        injector: ContextManagerCreator,
+        tp: Type[_T],
+        match: Optional[InjectorMatcher] = None,
+        *,
+        lifetime: InjectorLifetime = "session",
+        lazy: bool = True,
+    ):
+        # match 为空时，任何 tp 类型的参数都会让该 injector 在 session 中被创建
+        # app、process 作用域的 injector 被多个线程中的 session 共享，注入的对象需要是线程安全的；
+        # lazy=False 时在应用启动时创建，而不是第一次被需要时
+        if lifetime != "session":
+            shared = SharedInjector(injector, tp, match, lifetime, lazy)
+            self._shared_injectors = (*self._shared_injectors, shared)
+            return self.register(shared, tp, match)
+        self._context_injectors = (
+            *self._context_injectors,
+            ContextInjectorEntry(injector, tp, match),
+        )
         return self
 
-    def register(self, injector: ParamInjector[_T], tp: Type[_T]):
-        self._injectors.setdefault(tp, []).append(injector)
+    def register_async_context_injector(
+        self,
+        injector: AsyncContextManagerCreator,
+        tp: Type[_T],
+        match: Optional[InjectorMatcher] = None,
+    ):
+        self._context_injectors = (
+            *self._context_injectors,
+            ContextInjectorEntry(injector, tp, match, is_async=True),
+        )
         return self
 
+    def register(
+        self,
+        injector: ParamInjector[_T],
+        tp: Type[_T],
+        match: Optional[InjectorMatcher] = None,
+    ):
+        # match 表示 injector 一定会提供匹配的参数，任务解析时不需要调用 injector 就能确定参数不由用户输入
+        self._matchers = {
+            **self._matchers,
+            tp: [*self._matchers.get(tp, []), match],
+        }
+        self._injectors = {
+            **self._injectors,
+            tp: [*self._injectors.get(tp, []), injector],
+        }
+        return self
+
+
+def _is_temp_dir(param: ParamAnnotation) -> bool:
+    path_type = param.get_tp_info(PathType)
+    return bool(path_type and path_type.type == "temp_dir")
+
 
 @contextmanager
 def _temp_dir_injector():
     with tempfile.TemporaryDirectory() as temp_dir:
 
         def injector(param: ParamAnnotation):
-            path_type = param.get_tp_info(PathType)
-            if path_type and path_type.type == "temp_dir":
-                return temp_dir
+            if _is_temp_dir(param):
+                return Path(temp_dir)
             return NotImplemented
 
         yield injector
 
 
+def _match_any(param: ParamAnnotation) -> bool:
+    return True
+
+
 def get_default_context_collection():
-    return ContextInjectorCollection().register_context_injector(
-        _temp_dir_injector, Path
+    return (
+        ContextInjectorCollection()
+        .register_context_injector(_temp_dir_injector, Path, _is_temp_dir)
+        .register(progress_injector, JobProgress, _match_any)
+        .register(cancellation_injector, CancellationToken, _match_any)
     )
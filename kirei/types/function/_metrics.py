@@ -0,0 +1,232 @@
+import bisect
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+import threading
+import time
+from typing import ContextManager, Dict, Iterator, List, Literal, Optional, Tuple
+
+# inject: 进入 session（创建 context injector、注入参数）
+# validate: 单个参数的校验（FuncParam.fill）
+# execute: 执行任务函数（包括缓存和合并请求的处理）
+# reply: 处理任务结果（cli 的 replier、web 的输出转换）
+# session: 整个 session 从进入到退出
+# queue: web 任务等待执行额度（admission）的时间，被拒绝的请求记为失败
+Phase = Literal["inject", "validate", "execute", "reply", "session", "queue"]
+
+# 单位为秒，和 prometheus 客户端的默认 bucket 相近，补充了长时间任务的区间
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    300,
+)
+
+
+@dataclass(frozen=True)
+class HistogramSnapshot:
+    # buckets 为累计值，即耗时不超过 le 的次数，不包含 +Inf
+    buckets: Tuple[Tuple[float, int], ...]
+    count: int
+    sum: float
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+
+@dataclass(frozen=True)
+class TaskMetricsSnapshot:
+    phases: Dict[str, HistogramSnapshot]
+    failures: Dict[str, int]
+    in_flight: int
+    queued: int = 0
+
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self._bounds = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+
+    def observe(self, value: float):
+        self._counts[bisect.bisect_left(self._bounds, value)] += 1
+        self._sum += value
+
+    def snapshot(self) -> HistogramSnapshot:
+        cumulative: List[Tuple[float, int]] = []
+        total = 0
+        for bound, count in zip(self._bounds, self._counts):
+            total += count
+            cumulative.append((bound, total))
+        return HistogramSnapshot(tuple(cumulative), sum(self._counts), self._sum)
+
+
+class _PhaseTimer:
+    # 比 contextmanager 生成器的开销小，会话中的每个阶段都会创建一个
+    __slots__ = ("_metrics", "_phase", "_start")
+
+    def __init__(self, metrics: "TaskMetrics", phase: Phase):
+        self._metrics = metrics
+        self._phase = phase
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # 生成器被提前关闭（GeneratorExit）不算失败
+        failed = exc_type is not None and not issubclass(exc_type, GeneratorExit)
+        self._metrics.observe(self._phase, time.perf_counter() - self._start, failed)
+
+
+class TaskMetrics:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self._buckets = buckets
+        self._lock = threading.Lock()
+        self._phases: Dict[str, _Histogram] = {}
+        self._failures: Dict[str, int] = {}
+        self._in_flight = 0
+        self._queued = 0
+
+    def observe(self, phase: Phase, seconds: float, failed: bool = False):
+        with self._lock:
+            histogram = self._phases.get(phase)
+            if histogram is None:
+                histogram = self._phases[phase] = _Histogram(self._buckets)
+            histogram.observe(seconds)
+            if failed:
+                self._failures[phase] = self._failures.get(phase, 0) + 1
+
+    def measure(self, phase: Phase) -> "_PhaseTimer":
+        return _PhaseTimer(self, phase)
+
+    @contextmanager
+    def track_session(self) -> Iterator[None]:
+        with self._lock:
+            self._in_flight += 1
+        try:
+            with self.measure("session"):
+                yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    @contextmanager
+    def track_queue(self) -> Iterator[None]:
+        with self._lock:
+            self._queued += 1
+        try:
+            with self.measure("queue"):
+                yield
+        finally:
+            with self._lock:
+                self._queued -= 1
+
+    def snapshot(self) -> TaskMetricsSnapshot:
+        with self._lock:
+            return TaskMetricsSnapshot(
+                {phase: h.snapshot() for phase, h in self._phases.items()},
+                dict(self._failures),
+                self._in_flight,
+                self._queued,
+            )
+
+
+def measure(metrics: Optional[TaskMetrics], phase: Phase) -> ContextManager[None]:
+    # 未开启统计时没有额外开销
+    if metrics is None:
+        return nullcontext()
+    return metrics.measure(phase)
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_bound(bound: float) -> str:
+    return repr(float(bound))
+
+
+class MetricsRegistry:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self._buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._tasks: Dict[str, TaskMetrics] = {}
+
+    def task(self, name: str) -> TaskMetrics:
+        with self._lock:
+            metrics = self._tasks.get(name)
+            if metrics is None:
+                metrics = self._tasks[name] = TaskMetrics(self._buckets)
+            return metrics
+
+    def snapshot(self) -> Dict[str, TaskMetricsSnapshot]:
+        with self._lock:
+            tasks = list(self._tasks.items())
+        return {name: metrics.snapshot() for name, metrics in tasks}
+
+    def to_prometheus(self) -> str:
+        snapshot = self.snapshot()
+        lines = [
+            "# HELP kirei_task_phase_seconds Time spent in each phase of task sessions.",
+            "# TYPE kirei_task_phase_seconds histogram",
+        ]
+        for task, task_snapshot in snapshot.items():
+            for phase, histogram in task_snapshot.phases.items():
+                labels = f'task="{_escape_label(task)}",phase="{phase}"'
+                for bound, count in histogram.buckets:
+                    lines.append(
+                        f"kirei_task_phase_seconds_bucket{{{labels},"
+                        f'le="{_format_bound(bound)}"}} {count}'
+                    )
+                lines.append(
+                    f'kirei_task_phase_seconds_bucket{{{labels},le="+Inf"}} '
+                    f"{histogram.count}"
+                )
+                lines.append(
+                    f"kirei_task_phase_seconds_sum{{{labels}}} {histogram.sum}"
+                )
+                lines.append(
+                    f"kirei_task_phase_seconds_count{{{labels}}} {histogram.count}"
+                )
+        lines += [
+            "# HELP kirei_task_failures_total Failed task session phases.",
+            "# TYPE kirei_task_failures_total counter",
+        ]
+        for task, task_snapshot in snapshot.items():
+            for phase, count in task_snapshot.failures.items():
+                lines.append(
+                    f'kirei_task_failures_total{{task="{_escape_label(task)}",'
+                    f'phase="{phase}"}} {count}'
+                )
+        lines += [
+            "# HELP kirei_task_sessions_in_flight Task sessions currently open.",
+            "# TYPE kirei_task_sessions_in_flight gauge",
+        ]
+        for task, task_snapshot in snapshot.items():
+            lines.append(
+                f'kirei_task_sessions_in_flight{{task="{_escape_label(task)}"}} '
+                f"{task_snapshot.in_flight}"
+            )
+        lines += [
+            "# HELP kirei_task_queued Requests waiting for an execution slot.",
+            "# TYPE kirei_task_queued gauge",
+        ]
+        for task, task_snapshot in snapshot.items():
+            lines.append(
+                f'kirei_task_queued{{task="{_escape_label(task)}"}} '
+                f"{task_snapshot.queued}"
+            )
+        return "\n".join(lines) + "\n"
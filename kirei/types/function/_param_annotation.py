@@ -19,26 +19,38 @@ class ParamAnnotation(Generic[_T]):
     def __init__(self, tp: Type[_T]):
         assert tp is not inspect.Parameter.empty
         self._tp = tp
+        self._unsupported_origin = None
+        origin = get_origin(tp)
+        if origin is None:
+            self._real_source_type = tp
+            self._annotated_params: Sequence[Any] = ()
+        elif origin is Annotated:
+            args = get_args(tp)
+            self._real_source_type = args[0]
+            self._annotated_params = args[1:]
+        else:
+            self._unsupported_origin = origin
+
+    def _check_origin(self):
+        if self._unsupported_origin is not None:
+            raise NotImplementedError(f"Unsupported origin {self._unsupported_origin}")
+
+    def __repr__(self) -> str:
+        return f"ParamAnnotation({self._tp})"
+
+    @property
+    def tp(self) -> Type[_T]:
+        return self._tp
 
     @property
     def iter_annotated_params(self) -> Sequence[Any]:
-        origin = get_origin(self._tp)
-        if not origin:
-            return []
-        elif origin is Annotated:
-            return get_args(self._tp)[1:]
-        else:
-            raise NotImplementedError(f"Unsupported origin {origin}")
+        self._check_origin()
+        return self._annotated_params
 
     @property
     def real_source_type(self) -> Type[_T]:
-        origin = get_origin(self._tp)
-        if origin is None:
-            return self._tp
-        elif origin is Annotated:
-            return get_args(self._tp)[0]
-        else:
-            raise NotImplementedError(f"Unsupported origin {origin}")
+        self._check_origin()
+        return self._real_source_type
 
     def get_tp_info(self, info_t: Type[_InfoT]) -> Optional[_InfoT]:
         for annotation in self.iter_annotated_params:
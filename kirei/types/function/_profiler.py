@@ -0,0 +1,239 @@
+import cProfile
+from dataclasses import dataclass
+import io
+import itertools
+import marshal
+import os
+from pathlib import Path
+import pstats
+import re
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+_ENV_PROFILE = "KIREI_PROFILE"
+_ENV_PROFILE_MEMORY = "KIREI_PROFILE_MEMORY"
+_ENV_PROFILE_DIR = "KIREI_PROFILE_DIR"
+
+# 折叠栈只展开到这个深度，耗时小于 1 微秒的调用路径会被忽略
+_MAX_STACK_DEPTH = 64
+_MIN_STACK_SECONDS = 1e-6
+
+# cProfile 在同一进程中同时只能有一个生效的 profiler，采样冲突时这次执行不采样
+_profile_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class ProfileConfig:
+    # 每 every 次执行采样一次，为 1 时每次执行都采样
+    every: int = 1
+    # 同时使用 tracemalloc 统计内存峰值，开销较大
+    memory: bool = False
+    top: int = 20
+    output_dir: Optional[Path] = None
+
+    def __post_init__(self):
+        if self.every < 1:
+            raise ValueError("every must be positive")
+
+    @classmethod
+    def from_env(cls) -> Optional["ProfileConfig"]:
+        # KIREI_PROFILE=1 每次执行都采样，KIREI_PROFILE=N 每 N 次执行采样一次
+        value = os.environ.get(_ENV_PROFILE, "").strip()
+        if not value or value == "0":
+            return None
+        output_dir = os.environ.get(_ENV_PROFILE_DIR)
+        return cls(
+            every=int(value),
+            memory=os.environ.get(_ENV_PROFILE_MEMORY, "") not in ("", "0"),
+            output_dir=Path(output_dir) if output_dir else None,
+        )
+
+
+@dataclass(frozen=True)
+class ProfileCapture:
+    # 在执行任务的进程中采集，可以被 pickle 传回主进程
+    stats: Dict[Any, Any]
+    wall_time: float
+    peak_memory: Optional[int]
+
+
+@dataclass(frozen=True)
+class ProfileReport:
+    task_name: str
+    wall_time: float
+    peak_memory: Optional[int]
+    top_functions: str
+    prof_path: Path
+    collapsed_path: Path
+
+    def format(self) -> str:
+        lines = [f"wall time: {self.wall_time:.6f}s"]
+        if self.peak_memory is not None:
+            lines.append(f"peak memory: {self.peak_memory / 1024 / 1024:.2f} MiB")
+        lines.append(f"profile: {self.prof_path}")
+        lines.append(f"collapsed stacks: {self.collapsed_path}")
+        lines.append(self.top_functions)
+        return "\n".join(lines)
+
+
+def _start_memory_trace(memory: bool) -> bool:
+    if not memory:
+        return False
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+        return False
+    tracemalloc.start()
+    return True
+
+
+def _stop_memory_trace(memory: bool, started: bool) -> Optional[int]:
+    if not memory:
+        return None
+    _, peak = tracemalloc.get_traced_memory()
+    if started:
+        tracemalloc.stop()
+    return peak
+
+
+def _capture(
+    profiler: cProfile.Profile, start: float, memory: bool, started: bool
+) -> ProfileCapture:
+    peak = _stop_memory_trace(memory, started)
+    wall_time = time.perf_counter() - start
+    profiler.create_stats()
+    return ProfileCapture(profiler.stats, wall_time, peak)  # type: ignore
+
+
+def run_profiled(
+    func: Callable, memory: bool, args: Sequence[Any]
+) -> Tuple[Any, Optional[ProfileCapture]]:
+    # 模块级函数，可以直接交给进程池在子进程中执行
+    if not _profile_lock.acquire(blocking=False):
+        return func(*args), None
+    try:
+        profiler = cProfile.Profile()
+        started = _start_memory_trace(memory)
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            res = func(*args)
+        finally:
+            profiler.disable()
+            capture = _capture(profiler, start, memory, started)
+        return res, capture
+    finally:
+        _profile_lock.release()
+
+
+async def arun_profiled(
+    func: Callable[..., Awaitable[Any]], memory: bool, args: Sequence[Any]
+) -> Tuple[Any, Optional[ProfileCapture]]:
+    # 异步任务的 profile 会包含 await 期间同一 event loop 上其他协程的调用
+    if not _profile_lock.acquire(blocking=False):
+        return await func(*args), None
+    try:
+        profiler = cProfile.Profile()
+        started = _start_memory_trace(memory)
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            res = await func(*args)
+        finally:
+            profiler.disable()
+            capture = _capture(profiler, start, memory, started)
+        return res, capture
+    finally:
+        _profile_lock.release()
+
+
+def _label(func: Tuple[str, int, str]) -> str:
+    filename, lineno, name = func
+    if filename == "~":
+        return name.replace(";", ":")
+    return f"{name} ({os.path.basename(filename)}:{lineno})".replace(";", ":")
+
+
+def _collapse(stats: Dict[Any, Any]) -> str:
+    # cProfile 只记录调用关系而没有完整的调用栈，按调用边上的耗时比例把每个函数的时间
+    # 分摊到调用它的路径上，生成 flamegraph.pl / speedscope 可以读取的折叠栈
+    children: Dict[Any, List[Tuple[Any, float]]] = {}
+    roots = []
+    for func, (_, _, _, _, callers) in stats.items():
+        known_callers = [caller for caller in callers if caller in stats]
+        if not known_callers:
+            roots.append(func)
+        for caller in known_callers:
+            children.setdefault(caller, []).append((func, callers[caller][3]))
+    weights: Dict[str, float] = {}
+
+    def walk(func: Any, stack: List[Any], scale: float):
+        _, _, tottime, _, _ = stats[func]
+        stack.append(func)
+        path = ";".join(_label(f) for f in stack)
+        weights[path] = weights.get(path, 0) + tottime * scale
+        if len(stack) < _MAX_STACK_DEPTH:
+            for callee, edge_time in children.get(func, []):
+                callee_time = stats[callee][3]
+                if callee in stack or callee_time <= 0:
+                    continue
+                share = edge_time * scale
+                if share >= _MIN_STACK_SECONDS:
+                    walk(callee, stack, share / callee_time)
+        stack.pop()
+
+    for root in roots:
+        walk(root, [], 1.0)
+    return "".join(
+        f"{path} {round(seconds * 1e6)}\n"
+        for path, seconds in weights.items()
+        if round(seconds * 1e6) > 0
+    )
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r"[^\w.-]", "_", name)
+
+
+class TaskProfiler:
+    def __init__(self, task_name: str, config: ProfileConfig):
+        self._task_name = task_name
+        self._config = config
+        self._counter = itertools.count()
+        self._output_dir = config.output_dir or Path(tempfile.gettempdir()) / (
+            "kirei-profiles"
+        )
+
+    @property
+    def config(self) -> ProfileConfig:
+        return self._config
+
+    def sample(self) -> bool:
+        return next(self._counter) % self._config.every == 0
+
+    def save(self, capture: ProfileCapture) -> ProfileReport:
+        self._output_dir.mkdir(parents=True, exist_ok=True)
+        fd, name = tempfile.mkstemp(
+            prefix=f"{_safe_name(self._task_name)}-{time.strftime('%Y%m%d-%H%M%S')}-",
+            suffix=".prof",
+            dir=self._output_dir,
+        )
+        prof_path = Path(name)
+        with os.fdopen(fd, "wb") as f:
+            marshal.dump(capture.stats, f)
+        collapsed_path = prof_path.with_suffix(".collapsed")
+        collapsed_path.write_text(_collapse(capture.stats))
+        buf = io.StringIO()
+        pstats.Stats(str(prof_path), stream=buf).sort_stats(
+            pstats.SortKey.CUMULATIVE
+        ).print_stats(self._config.top)
+        return ProfileReport(
+            self._task_name,
+            capture.wall_time,
+            capture.peak_memory,
+            buf.getvalue().strip(),
+            prof_path,
+            collapsed_path,
+        )
@@ -0,0 +1,39 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator, Optional
+
+from kirei.types.function._param_annotation import ParamAnnotation
+
+ProgressReporter = Callable[[Optional[float], Optional[str]], None]
+
+
+class JobProgress:
+    # 任务函数声明 JobProgress 类型的参数即可汇报进度；不是作为后台 job 执行时汇报会被忽略
+    # reporter 需要能被 pickle，executor="process" 的任务在子进程中汇报进度
+    def __init__(self, reporter: Optional[ProgressReporter] = None):
+        self._reporter = reporter
+
+    def update(self, fraction: Optional[float] = None, message: Optional[str] = None):
+        if fraction is not None and not 0 <= fraction <= 1:
+            raise ValueError("fraction must be between 0 and 1")
+        if self._reporter is not None:
+            self._reporter(fraction, message)
+
+
+_current_progress: ContextVar[Optional[JobProgress]] = ContextVar(
+    "kirei_job_progress", default=None
+)
+
+
+@contextmanager
+def report_progress(progress: JobProgress) -> Iterator[None]:
+    # 在这个范围内进入的 session 中，JobProgress 参数会被注入为 progress
+    token = _current_progress.set(progress)
+    try:
+        yield
+    finally:
+        _current_progress.reset(token)
+
+
+def progress_injector(param: ParamAnnotation) -> JobProgress:
+    return _current_progress.get() or JobProgress()
@@ -0,0 +1,142 @@
+import threading
+from typing import Callable, Dict, Iterator, Optional, Tuple, Type, Union
+
+from kirei.types.annotated._validator import ValidatorProvider
+from kirei.types.function._artifact import ArtifactStore
+from kirei.types.function._cache import ResultCache
+from kirei.types.function._func_parser import FuncParser, ParsedFunc
+from kirei.types.function._injector import (
+    ContextInjectorCollection,
+    ContextManagerCreator,
+    InjectorLifetime,
+    InjectorMatcher,
+    get_default_context_collection,
+)
+from kirei.types.function._metrics import MetricsRegistry
+from kirei.types.function._profiler import ProfileConfig
+
+
+class TaskRegistry:
+    # 保存解析后的任务以及它们共享的 injector、缓存和统计；
+    # 多个前端（命令行、web）使用同一个 registry 时，同一个函数只解析一次，统计也合并在一起
+    def __init__(
+        self,
+        *,
+        metrics: Optional[MetricsRegistry] = None,
+        artifact_store: Optional[ArtifactStore] = None,
+        validator_provider: Optional[ValidatorProvider] = None,
+    ):
+        self._metrics = metrics
+        self._artifact_store = artifact_store
+        self._context_collection = get_default_context_collection()
+        self._func_parser = FuncParser(self._context_collection, validator_provider)
+        self._tasks: Dict[str, ParsedFunc] = {}
+        # 注册时的选项，同一个函数被多个前端注册时需要一致
+        self._options: Dict[str, Tuple] = {}
+        self._lock = threading.Lock()
+        self._users = 0
+
+    @property
+    def metrics(self) -> Optional[MetricsRegistry]:
+        return self._metrics
+
+    @property
+    def artifact_store(self) -> Optional[ArtifactStore]:
+        return self._artifact_store
+
+    @property
+    def context_collection(self) -> ContextInjectorCollection:
+        return self._context_collection
+
+    def register_injector(
+        self,
+        tp: Type,
+        match: Optional[InjectorMatcher] = None,
+        *,
+        lifetime: InjectorLifetime = "session",
+        lazy: bool = True,
+    ) -> Callable[[ContextManagerCreator], ContextManagerCreator]:
+        # 被装饰的函数返回一个 context manager，进入后得到 ParamInjector；需要在使用它的任务之前注册
+        # lifetime="app" 时所有任务共享同一个实例，最后一个前端退出时销毁；
+        # lifetime="process" 时 web 中 executor="process" 的任务使用 worker 进程自己的实例
+        def decorator(creator: ContextManagerCreator) -> ContextManagerCreator:
+            self._context_collection.register_context_injector(
+                creator, tp, match, lifetime=lifetime, lazy=lazy
+            )
+            return creator
+
+        return decorator
+
+    def add(
+        self,
+        func: Callable,
+        override_name: Optional[str] = None,
+        *,
+        batch: bool = False,
+        cache: Optional[ResultCache] = None,
+        dedupe: bool = False,
+        profile: Union[bool, ProfileConfig, None] = None,
+        timeout: Optional[float] = None,
+    ) -> ParsedFunc:
+        # 同一个函数以相同的选项再次注册时返回已有的任务
+        name = override_name or func.__name__
+        options = (func, batch, cache, dedupe, profile, timeout)
+        with self._lock:
+            parsed_func = self._tasks.get(name)
+            if parsed_func is not None:
+                if parsed_func.func is not func:
+                    raise TypeError(f"Multiple task can not have same name: {name}")
+                if self._options[name] != options:
+                    raise TypeError(
+                        f"Task {name} is already registered with different options"
+                    )
+                return parsed_func
+            parsed_func = self._func_parser.parse(
+                func,
+                override_name,
+                batch=batch,
+                cache=cache,
+                dedupe=dedupe,
+                metrics=self._metrics,
+                profile=profile,
+                timeout=timeout,
+                artifact_store=self._artifact_store,
+            )
+            self._tasks[name] = parsed_func
+            self._options[name] = options
+            return parsed_func
+
+    def get(self, task: Union[str, Callable]) -> ParsedFunc:
+        if isinstance(task, str):
+            if task not in self._tasks:
+                raise ValueError(f"Task {task} is not registered")
+            return self._tasks[task]
+        for parsed_func in self._tasks.values():
+            if parsed_func.func is task:
+                return parsed_func
+        raise ValueError(f"Task {task} is not registered")
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tasks
+
+    def __iter__(self) -> Iterator[ParsedFunc]:
+        return iter(list(self._tasks.values()))
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def start(self):
+        # 每个运行中的前端调用一次 start 和 close，最后一个前端退出时才销毁 app 作用域的 injector
+        with self._lock:
+            self._users += 1
+            first = self._users == 1
+        if first:
+            self._context_collection.start()
+        return self
+
+    def close(self):
+        with self._lock:
+            self._users -= 1
+            last = self._users == 0
+        if last:
+            self._context_collection.close()
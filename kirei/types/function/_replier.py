@@ -1,12 +1,16 @@
 from collections import defaultdict
-from typing import Any, Callable, Dict, List, Type, TypeVar, Union
+import inspect
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Type, TypeVar, Union
 from types import NoneType, NotImplementedType
 
 from kirei.types.function._param_annotation import ParamAnnotation
 
 
 _T = TypeVar("_T")
-OutputReplier = Callable[[ParamAnnotation[_T], _T], Union[None, NotImplementedType]]
+OutputReplier = Callable[
+    [ParamAnnotation[_T], _T],
+    Union[None, NotImplementedType, Awaitable[Union[None, NotImplementedType]]],
+]
 
 
 class ReplierCollection:
@@ -24,10 +28,39 @@ class ReplierCollection:
             self._repliers.setdefault(tp, []).append(replier)
         return self
 
-    def __call__(self, annotation: ParamAnnotation, value: Any):
-        repliers = self._repliers.get(annotation.real_source_type, [])
-        for replier in repliers:
+    def __call__(
+        self, annotation: ParamAnnotation, value: Any
+    ) -> Optional[Awaitable[None]]:
+        # 同步的 replier 直接执行；遇到异步 replier 时返回 awaitable，由调用方负责 await
+        return self._reply(
+            self._repliers.get(annotation.real_source_type, []), annotation, value
+        )
+
+    def _reply(
+        self, repliers: List[OutputReplier], annotation: ParamAnnotation, value: Any
+    ) -> Optional[Awaitable[None]]:
+        for i, replier in enumerate(repliers):
             res = replier(annotation, value)
+            if inspect.isawaitable(res):
+                return self._reply_async(res, repliers[i + 1 :], annotation, value)
             if res is not NotImplemented:
                 return None
         raise TypeError(f"Unsupported output type {type(value)}")
+
+    async def _reply_async(
+        self,
+        pending: Awaitable,
+        repliers: List[OutputReplier],
+        annotation: ParamAnnotation,
+        value: Any,
+    ) -> None:
+        if await pending is not NotImplemented:
+            return None
+        res = self._reply(repliers, annotation, value)
+        if res is not None:
+            await res
+
+    async def acall(self, annotation: ParamAnnotation, value: Any) -> None:
+        res = self(annotation, value)
+        if res is not None:
+            await res
@@ -0,0 +1,100 @@
+import asyncio
+from concurrent.futures import Future
+from dataclasses import dataclass
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+_T = TypeVar("_T")
+
+
+@dataclass(frozen=True)
+class SingleFlightStats:
+    executions: int
+    coalesced: int
+    in_flight: int
+
+
+class SingleFlight:
+    # 相同 key 的调用在执行期间只会真正执行一次，其他调用者等待并共享第一次执行的结果或异常
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[str, Future] = {}
+        self._executions = 0
+        self._coalesced = 0
+
+    @property
+    def stats(self) -> SingleFlightStats:
+        with self._lock:
+            return SingleFlightStats(
+                self._executions, self._coalesced, len(self._flights)
+            )
+
+    def _join(self, key: str) -> Tuple[Future, bool]:
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self._coalesced += 1
+                return flight, False
+            flight = Future()
+            flight.set_running_or_notify_cancel()
+            self._flights[key] = flight
+            self._executions += 1
+            return flight, True
+
+    def _land(
+        self,
+        key: str,
+        flight: Future,
+        res: Any = None,
+        err: Optional[BaseException] = None,
+    ):
+        # 先移除再设置结果，结果就绪之后的新调用会重新执行
+        with self._lock:
+            self._flights.pop(key, None)
+        if err is not None:
+            flight.set_exception(err)
+        else:
+            flight.set_result(res)
+
+    def do(self, key: str, fn: Callable[[], _T]) -> _T:
+        flight, is_leader = self._join(key)
+        if not is_leader:
+            return flight.result()
+        try:
+            res = fn()
+        except BaseException as err:
+            self._land(key, flight, err=err)
+            raise
+        self._land(key, flight, res)
+        return res
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[_T]]) -> _T:
+        flight, is_leader = self._join(key)
+        if not is_leader:
+            return await asyncio.wrap_future(flight)
+        try:
+            res = await fn()
+        except BaseException as err:
+            self._land(key, flight, err=err)
+            raise
+        self._land(key, flight, res)
+        return res
+
+    def submit(self, key: str, fn: Callable[[], "Future[_T]"]) -> "Future[_T]":
+        flight, is_leader = self._join(key)
+        if not is_leader:
+            return flight
+        try:
+            source = fn()
+        except BaseException as err:
+            self._land(key, flight, err=err)
+            raise
+
+        def _on_done(future: Future):
+            try:
+                self._land(key, flight, future.result())
+            except BaseException as err:
+                self._land(key, flight, err=err)
+
+        source.add_done_callback(_on_done)
+        return flight